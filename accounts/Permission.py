@@ -1,5 +1,6 @@
 from rest_framework.permissions import BasePermission
-from .utils import is_super_admin, is_area_manager
+from .utils import is_super_admin, is_area_manager, has_entity_permission, reviewable_entity_types
+from . import rbac
 
 class CanManageAccounts(BasePermission):
    
@@ -10,3 +11,48 @@ class CanManageAccounts(BasePermission):
      if not user or not user.is_authenticated:
             return False
      return is_super_admin(user) or is_area_manager(user)
+
+
+class HasEntityPermission(BasePermission):
+   """
+   صلاحية عامة مبنية على مصفوفة الأدوار (rbac.permission_matrix).
+   الواجهة تحدد الكيان عبر permission_entity (قيم ModificationRequest.EntityType)،
+   ويمكنها ربط أفعال الـ viewset بأفعال الصلاحيات عبر permission_actions.
+   """
+
+   message = "غير مصرح: لا تملك صلاحية تنفيذ هذه العملية على هذا الكيان."
+
+   method_actions = {
+      "GET": rbac.VIEW,
+      "HEAD": rbac.VIEW,
+      "OPTIONS": rbac.VIEW,
+      "POST": rbac.CREATE,
+      "PUT": rbac.UPDATE,
+      "PATCH": rbac.UPDATE,
+      "DELETE": rbac.DELETE,
+   }
+
+   def has_permission(self, request, view):
+     user = request.user
+     if not user or not user.is_authenticated:
+            return False
+
+     entity = getattr(view, "permission_entity", None)
+     if not entity:
+            return False
+
+     view_actions = getattr(view, "permission_actions", {})
+     action = view_actions.get(getattr(view, "action", None)) or self.method_actions.get(request.method)
+     return has_entity_permission(user, action, entity)
+
+
+class CanReviewModificationRequests(BasePermission):
+   """يملك صلاحية review على نوع كيان واحد على الأقل"""
+
+   message = "غير مصرح: لا تملك صلاحية مراجعة طلبات التعديل."
+
+   def has_permission(self, request, view):
+     user = request.user
+     if not user or not user.is_authenticated:
+            return False
+     return bool(reviewable_entity_types(user))
@@ -17,6 +17,7 @@ MODELS = [
     ArchaeologicalSite, CommercialActivity,
     DemographicData, AgriculturalStatus,
     Crop, AgriculturalCrop,
+    PersonDuplicateCandidate, DedupRun,
 ]
 
 admin.site.register(MODELS)
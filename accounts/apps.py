@@ -4,3 +4,5 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     name = 'accounts'
 
+    def ready(self):
+        from . import signals  # noqa: F401
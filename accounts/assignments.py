@@ -0,0 +1,126 @@
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .entities import entity_model , scoped_entities
+from .models import UserHistory
+from .utils import is_super_admin
+
+# عدد الكيانات في استعلام واحد (حد عدد المتغيرات في SQLite)
+RESOLVE_CHUNK = 500
+
+INTERVAL_FIELDS = ( "entity_type" , "entity_id" , "start_date" , "end_date" , "user_id" )
+
+
+def overlapping( rows , start , end ) :
+    """
+    الفترات التي تتقاطع مع [start, end). كل فترة [start_date, end_date) و end_date = None تعني مفتوحة.
+    start أو end بقيمة None تعني بلا حد.
+    """
+    if end is not None :
+        rows = rows.filter( start_date__lt = end )
+    if start is not None :
+        rows = rows.filter( Q( end_date__isnull = True ) | Q( end_date__gt = start ) )
+    return rows
+
+
+def covering( rows , moment ) :
+    """الفترات التي تحتوي اللحظة moment"""
+    return rows.filter( start_date__lte = moment ).filter( Q( end_date__isnull = True ) | Q( end_date__gt = moment ) )
+
+
+def entity_intervals( entity_type , entity_id , start = None , end = None ) :
+    rows = UserHistory.objects.filter( entity_type = entity_type , entity_id = entity_id )
+    return overlapping( rows , start , end ).order_by( "start_date" , "id" )
+
+
+def user_intervals( user_id , start = None , end = None ) :
+    rows = UserHistory.objects.filter( user_id = user_id )
+    return overlapping( rows , start , end ).order_by( "start_date" , "id" )
+
+
+def current_users( entity_type , entity_id ) -> list :
+    """المسؤولون حالياً (الفترات المفتوحة، عبر الفهرس الجزئي user_history_open_idx)"""
+    return list(
+        UserHistory.objects.filter( entity_type = entity_type , entity_id = entity_id , end_date__isnull = True )
+        .values_list( "user_id" , flat = True ).distinct()
+    )
+
+
+def resolve( lookups ) -> list :
+    """
+    حل دفعة من (entity_type, entity_id, moment) إلى قائمة user_id المسؤولين لكل عنصر، بنفس الترتيب.
+    فترات كل الكيانات المطلوبة تُقرأ باستعلام واحد (لكل RESOLVE_CHUNK كيان) محصور بين أصغر وأكبر لحظة،
+    ثم تُطابق اللحظات في الذاكرة.
+    """
+    lookups = list( lookups )
+    if not lookups :
+        return []
+
+    entities = sorted( { ( entity_type , entity_id ) for entity_type , entity_id , _ in lookups } )
+    earliest = min( moment for _ , _ , moment in lookups )
+    latest = max( moment for _ , _ , moment in lookups )
+
+    intervals = defaultdict( list )
+    for offset in range( 0 , len( entities ) , RESOLVE_CHUNK ) :
+        by_type = defaultdict( list )
+        for entity_type , entity_id in entities[offset:offset + RESOLVE_CHUNK] :
+            by_type[entity_type].append( entity_id )
+
+        condition = Q()
+        for entity_type , entity_ids in by_type.items() :
+            condition |= Q( entity_type = entity_type , entity_id__in = entity_ids )
+
+        rows = UserHistory.objects.filter( condition , start_date__lte = latest ).filter(
+            Q( end_date__isnull = True ) | Q( end_date__gt = earliest )
+        ).order_by( "start_date" , "id" ).values_list( *INTERVAL_FIELDS )
+
+        for entity_type , entity_id , start_date , end_date , user_id in rows :
+            intervals[( entity_type , entity_id )].append( ( start_date , end_date , user_id ) )
+
+    results = []
+    for entity_type , entity_id , moment in lookups :
+        users = []
+        for start_date , end_date , user_id in intervals.get( ( entity_type , entity_id ) , () ) :
+            if start_date > moment :
+                break
+            if ( end_date is None or end_date > moment ) and user_id not in users :
+                users.append( user_id )
+        results.append( users )
+    return results
+
+
+def scoped_pairs( user , entities ) -> set :
+    """
+    من مجموعة (entity_type, entity_id) ما يقع ضمن النطاق الجغرافي للمستخدم (استعلام لكل نوع ولكل RESOLVE_CHUNK).
+    نوع غير معروف أو كيان محذوف لا نطاق له، فلا يظهر إلا لمدير النظام.
+    """
+    entities = set( entities )
+    if is_super_admin( user ) :
+        return entities
+
+    by_type = defaultdict( list )
+    for entity_type , entity_id in entities :
+        by_type[entity_type].append( entity_id )
+
+    allowed = set()
+    for entity_type , entity_ids in by_type.items() :
+        model = entity_model( entity_type )
+        if model is None :
+            continue
+        for offset in range( 0 , len( entity_ids ) , RESOLVE_CHUNK ) :
+            rows = scoped_entities( model , user ).filter( pk__in = entity_ids[offset:offset + RESOLVE_CHUNK] )
+            allowed.update( ( entity_type , entity_id ) for entity_id in rows.values_list( "pk" , flat = True ) )
+    return allowed
+
+
+def interval_payload( row ) -> dict :
+    return {
+        "id" : row.id ,
+        "user_id" : row.user_id ,
+        "entity_type" : row.entity_type ,
+        "entity_id" : row.entity_id ,
+        "active" : row.active ,
+        "start_date" : row.start_date ,
+        "end_date" : row.end_date ,
+    }
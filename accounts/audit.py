@@ -0,0 +1,155 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import AuditLog
+
+logger = logging.getLogger( __name__ )
+
+# أقصى عدد سجلات بانتظار الكتابة، بعده نكتب مباشرة داخل الطلب
+QUEUE_SIZE = getattr( settings , "AUDIT_QUEUE_SIZE" , 10000 )
+# نكتب عند تجمع هذا العدد أو مرور هذه الثواني، أيهما أسبق
+FLUSH_SIZE = getattr( settings , "AUDIT_FLUSH_SIZE" , 500 )
+FLUSH_INTERVAL = getattr( settings , "AUDIT_FLUSH_INTERVAL" , 2.0 )
+# False = كتابة مباشرة دائماً داخل الطلب (لا فقدان عند قتل العملية، انظر AuditWriter)
+ASYNC_ENABLED = getattr( settings , "AUDIT_ASYNC" , True )
+
+
+class AuditWriter :
+    """
+    كاتب AuditLog غير متزامن داخل العملية:
+    السجلات تدخل طابوراً محدوداً بعد نجاح المعاملة، وخيط خلفي يكتبها بـ bulk_create
+    عند امتلاء الدفعة أو انتهاء المهلة. إذا امتلأ الطابور نكتب مباشرة بدل إسقاط السجل.
+
+    الطابور في ذاكرة العملية: الإغلاق العادي يكتب الباقي (atexit)، أما SIGKILL أو قتل العملية
+    لنفاد الذاكرة فيُفقد معه ما لم يُكتب بعد (حتى FLUSH_INTERVAL ثانية / QUEUE_SIZE سجل) رغم نجاح التعديل نفسه.
+    عندما لا يُقبل هذا لسجل التدقيق نضبط AUDIT_ASYNC = False فيُكتب السجل داخل الطلب بعد الـ commit.
+    """
+
+    def __init__( self , queue_size = QUEUE_SIZE , flush_size = FLUSH_SIZE , flush_interval = FLUSH_INTERVAL ) :
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue( maxsize = queue_size )
+        self._lock = threading.Lock()
+        self._thread = None
+        self.counters = {
+            "enqueued" : 0 ,
+            "written" : 0 ,
+            "sync_fallbacks" : 0 ,
+            "failed" : 0 ,
+            "flushes" : 0 ,
+        }
+
+    def _ensure_thread( self ) :
+        if self._thread is not None and self._thread.is_alive() :
+            return
+        with self._lock :
+            if self._thread is None or not self._thread.is_alive() :
+                self._thread = threading.Thread( target = self._run , name = "audit-writer" , daemon = True )
+                self._thread.start()
+
+    def _enqueue( self , entries ) :
+        if not ASYNC_ENABLED :
+            self._write( entries )
+            return
+
+        self._ensure_thread()
+        overflow = []
+        for entry in entries :
+            try :
+                self._queue.put_nowait( entry )
+                self.counters["enqueued"] += 1
+            except queue.Full :
+                overflow.append( entry )
+
+        if overflow :
+            self.counters["sync_fallbacks"] += len( overflow )
+            self._write( overflow )
+
+    def log( self , *entries ) :
+        """
+        تسجيل AuditLog (غير محفوظة). داخل معاملة تُرسل بعد الـ commit فقط،
+        فالتعديل الذي يُلغى لا يترك سجلاً.
+        """
+        entries = list( entries )
+        if entries :
+            transaction.on_commit( lambda : self._enqueue( entries ) )
+
+    def _write( self , entries ) :
+        from . import payloads
+
+        try :
+            AuditLog.objects.bulk_create( payloads.prepare( AuditLog , entries ) , batch_size = 1000 )
+            self.counters["written"] += len( entries )
+            return
+        except Exception :
+            logger.exception( "audit bulk write failed, retrying row by row" )
+
+        for entry in entries :
+            try :
+                entry.pk = None
+                entry.save()
+                self.counters["written"] += 1
+            except Exception :
+                self.counters["failed"] += 1
+                logger.exception( "audit row dropped: %s %s" , entry.entity_type , entry.entity_id )
+
+    def _drain( self , limit ) :
+        batch = []
+        while len( batch ) < limit :
+            try :
+                batch.append( self._queue.get_nowait() )
+            except queue.Empty :
+                break
+        return batch
+
+    def _run( self ) :
+        while True :
+            try :
+                first = self._queue.get( timeout = self.flush_interval )
+            except queue.Empty :
+                continue
+
+            # ننتظر حتى تكتمل الدفعة أو تنتهي المهلة
+            deadline = time.monotonic() + self.flush_interval
+            batch = [first]
+            while len( batch ) < self.flush_size :
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 :
+                    break
+                try :
+                    batch.append( self._queue.get( timeout = remaining ) )
+                except queue.Empty :
+                    break
+
+            self._flush_batch( batch )
+
+    def _flush_batch( self , batch ) :
+        try :
+            self._write( batch )
+            self.counters["flushes"] += 1
+        finally :
+            close_old_connections()
+
+    def flush( self ) :
+        """كتابة كل ما في الطابور الآن (عند الإغلاق أو في الاختبارات)"""
+        while True :
+            batch = self._drain( self.flush_size )
+            if not batch :
+                return
+            self._write( batch )
+            self.counters["flushes"] += 1
+
+    def stats( self ) -> dict :
+        stats = dict( self.counters )
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+
+audit_writer = AuditWriter()
+atexit.register( audit_writer.flush )
@@ -0,0 +1,114 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# مدة بقاء epoch المستخدم في الكاش (ثواني) قبل إعادة قراءته من قاعدة البيانات.
+# بدون CACHES مشترك (Redis/Memcached) الكاش داخل كل عملية، والعملية التي حفظت التعديل فقط تعرفه فوراً:
+# باقي العمليات تقبل التوكن القديم بعد تعطيل الحساب أو تغيير الدور حتى هذه المدة.
+# مع كاش مشترك يصل الإبطال لكل العمليات فور الـ commit.
+TOKEN_EPOCH_CACHE_TIMEOUT = getattr( settings , "TOKEN_EPOCH_CACHE_SECONDS" , 5 )
+
+TokenRole = namedtuple( "TokenRole" , ["name"] )
+
+
+def token_epoch_cache_key( user_id ) -> str:
+    return f"accounts:token_epoch:{user_id}"
+
+
+def get_token_epoch( user_id ) -> int:
+    key = token_epoch_cache_key( user_id )
+    epoch = cache.get( key )
+    if epoch is None:
+        epoch = (
+            get_user_model().objects.filter( pk = user_id )
+            .values_list( "token_epoch" , flat = True )
+            .first()
+        )
+        if epoch is None:
+            return -1
+        cache.set( key , epoch , TOKEN_EPOCH_CACHE_TIMEOUT )
+    return epoch
+
+
+def set_token_epoch( user_id , epoch : int ) :
+    cache.set( token_epoch_cache_key( user_id ) , epoch , TOKEN_EPOCH_CACHE_TIMEOUT )
+
+
+class TokenPrincipal :
+    """
+    مستخدم خفيف مبني من claims التوكن (الدور + النطاق + الحالة) بدون أي استعلام.
+    أي خاصية غير موجودة بالتوكن (email, set_password, ...) تُحمّل من سجل User عند أول طلب.
+    """
+
+    is_active = True
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__( self , token ) :
+        self.token = token
+        self.id = int( token[api_settings.USER_ID_CLAIM] )
+        self.pk = self.id
+        self.username = token.get( "username" , "" )
+        self.governorate_id = token.get( "governorate_id" )
+        self.area_id = token.get( "area_id" )
+        self.subarea_id = token.get( "subarea_id" )
+        self.status = token.get( "status" )
+        self.epoch = token.get( "epoch" , 0 )
+
+        role_name = token.get( "role" )
+        self.role = TokenRole( role_name ) if role_name else None
+
+    def __str__( self ) :
+        return self.username
+
+    def __eq__( self , other ) :
+        if not isinstance( other , ( TokenPrincipal , get_user_model() ) ) :
+            return NotImplemented
+        return other.pk == self.pk
+
+    def __hash__( self ) :
+        return hash( self.pk )
+
+    def get_username( self ) :
+        return self.username
+
+    @cached_property
+    def instance( self ) :
+        return get_user_model().objects.select_related( "role" ).get( pk = self.pk )
+
+    def __getattr__( self , attr ) :
+        # لا نحمّل السجل لأجل الخصائص الخاصة (pickle, copy, ...)
+        if attr.startswith( "__" ) or attr in ( "token" , "instance" ) :
+            raise AttributeError( attr )
+        return getattr( self.instance , attr )
+
+
+class ScopedJWTAuthentication( JWTAuthentication ) :
+    """
+    يتحقق من التوكن ويعيد TokenPrincipal بدل تحميل User.
+    التوكن يُرفض إذا كان epoch فيه أقدم من epoch المستخدم (تعطيل الحساب، تغيير الدور، تغيير كلمة المرور).
+    """
+
+    def get_user( self , validated_token ) :
+        if api_settings.USER_ID_CLAIM not in validated_token :
+            raise InvalidToken( "Token contained no recognizable user identification" )
+
+        # توكنات قديمة صادرة قبل إضافة claims النطاق: نرجع للسلوك الافتراضي
+        if "epoch" not in validated_token :
+            return super().get_user( validated_token )
+
+        principal = TokenPrincipal( validated_token )
+
+        if principal.status == "deactive" :
+            raise AuthenticationFailed( "هذا الحساب غير مفعل" , code = "user_inactive" )
+
+        if principal.epoch != get_token_epoch( principal.id ) :
+            raise AuthenticationFailed( "انتهت صلاحية الجلسة، الرجاء تسجيل الدخول مجدداً" , code = "token_revoked" )
+
+        return principal
@@ -0,0 +1,41 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from .data_views import (
+    AssignmentResolveView,
+    CropPivotView,
+    DemographicRollupView,
+    EntityAssignmentsView,
+    EntityTimelineView,
+    LivestockTimeSeriesView,
+    ModificationRequestReviewViewSet,
+    PersonKeyFiguresView,
+    PersonSearchView,
+    SyncView,
+    UserAssignmentsView,
+    VillageDataExportView,
+    VillageDataImportView,
+    UserActivityView,
+    VillageKeyFiguresView,
+)
+
+router = DefaultRouter()
+router.register("modification-requests", ModificationRequestReviewViewSet, basename="modification-requests")
+
+urlpatterns = [
+    path("demographics/rollup/", DemographicRollupView.as_view(), name="demographic_rollup"),
+    path("livestock/timeseries/", LivestockTimeSeriesView.as_view(), name="livestock_timeseries"),
+    path("agriculture/crop-pivot/", CropPivotView.as_view(), name="crop_pivot"),
+    path("persons/search/", PersonSearchView.as_view(), name="person_search"),
+    path("persons/<int:person_id>/key-figures/", PersonKeyFiguresView.as_view(), name="person_key_figures"),
+    path("villages/<int:village_id>/key-figures/", VillageKeyFiguresView.as_view(), name="village_key_figures"),
+    path("sync/", SyncView.as_view(), name="sync"),
+    path("exports/<str:entity_type>/", VillageDataExportView.as_view(), name="village_data_export"),
+    path("imports/<str:entity_type>/", VillageDataImportView.as_view(), name="village_data_import"),
+    path("audit/assignments/", EntityAssignmentsView.as_view(), name="entity_assignments"),
+    path("audit/assignments/resolve/", AssignmentResolveView.as_view(), name="assignment_resolve"),
+    path("audit/users/<int:user_id>/assignments/", UserAssignmentsView.as_view(), name="user_assignments"),
+    path("audit/users/<int:user_id>/activity/", UserActivityView.as_view(), name="user_activity"),
+    path("audit/<str:entity_type>/<int:entity_id>/timeline/", EntityTimelineView.as_view(), name="entity_timeline"),
+    path("", include(router.urls)),
+]
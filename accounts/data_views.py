@@ -0,0 +1,630 @@
+from datetime import datetime, time
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.generics import ListAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from locations.closure import descendant_ids, villages_in
+from locations.hierarchy import LEVELS, VILLAGE
+
+from . import assignments, exporter, sync
+from .importer import IMPORT_MODELS, Importer, ImportFailed, detect_format
+from .entities import entity_model, scoped_entities
+from .key_figures import key_figure_payload
+from .models import AgriculturalCrop, AuditLog, DemographicRollup, KeyFigureIndex, ModificationRequest, Person, User
+from . import payloads, rbac, review
+from .pagination import CreatedAtCursorPagination, ReviewQueuePagination
+from .Permission import CanManageAccounts, CanReviewModificationRequests, HasEntityPermission
+from .pivots import GROUP_PATHS, crop_pivot
+from .rollups import rollup_payload
+from .search import search
+from .scope import can_access_node
+from .serializers import AuditLogSerializer, ModificationRequestSerializer
+from .utils import has_entity_permission, is_area_manager, is_super_admin, reviewable_entity_types, user_scope
+from .timeseries import MAX_YEARS, scoped_livestock_series
+
+
+def int_param( params , name ) :
+    value = params.get( name )
+    return int( value ) if value and value.lstrip( "-" ).isdigit() else None
+
+
+def datetime_param( value ) :
+    """تاريخ (2024-07-01) أو تاريخ ووقت ISO كـ datetime مع منطقة زمنية، أو None إذا كان غير صالح"""
+    if not isinstance( value , str ) or not value :
+        return None
+    try :
+        moment = parse_datetime( value )
+        if moment is None :
+            day = parse_date( value )
+            moment = datetime.combine( day , time.min ) if day else None
+    except ValueError :
+        return None
+    if moment is not None and timezone.is_naive( moment ) :
+        moment = timezone.make_aware( moment )
+    return moment
+
+
+def period_params( params ) :
+    """(from, to) اختياريان، و error=True إذا أُرسل أحدهما بصيغة غير صالحة"""
+    start , end = datetime_param( params.get( "from" ) ) , datetime_param( params.get( "to" ) )
+    error = ( params.get( "from" ) and start is None ) or ( params.get( "to" ) and end is None )
+    return start , end , bool( error )
+
+
+def scope_params( request ) :
+    """
+    (level, node_id) من ?level=&node= ، أو (None, None) لاستخدام نطاق المستخدم.
+    ترجع Response خطأ إذا كانت القيم غير صالحة أو خارج نطاق المستخدم.
+    """
+    level = request.query_params.get( "level" )
+    if not level :
+        return None , None , None
+
+    node_id = int_param( request.query_params , "node" )
+    if level not in LEVELS or node_id is None :
+        return None , None , Response( {"error" : "الرجاء تحديد level و node"} , status = status.HTTP_400_BAD_REQUEST )
+
+    if not can_access_node( request.user , level , node_id ) :
+        return None , None , Response( {"error" : "هذه المنطقة خارج نطاقك"} , status = status.HTTP_403_FORBIDDEN )
+
+    return level , node_id , None
+
+
+class DemographicRollupView( APIView ) :
+    """
+    مجاميع البيانات الديموغرافية لعقدة واحدة: ?level=area&node=3&year=2024
+    (بدون year ترجع كل السنوات لهذه العقدة)
+    """
+
+    permission_classes = [ permissions.IsAuthenticated , HasEntityPermission ]
+    permission_entity = ModificationRequest.EntityType.DEMOGRAPHIC_DATA
+
+    def get( self , request ) :
+        level = request.query_params.get( "level" )
+        node_id = int_param( request.query_params , "node" )
+        year = int_param( request.query_params , "year" )
+
+        if level not in DemographicRollup.Level.values or node_id is None :
+            return Response( {"error" : "الرجاء تحديد level و node"} , status = status.HTTP_400_BAD_REQUEST )
+
+        if not can_access_node( request.user , level , node_id ) :
+            return Response( {"error" : "هذه المنطقة خارج نطاقك"} , status = status.HTTP_403_FORBIDDEN )
+
+        rows = DemographicRollup.objects.filter( level = level , node_id = node_id ).order_by( "year" )
+        if year is not None :
+            rows = rows.filter( year = year )
+
+        return Response( [rollup_payload( rollup ) for rollup in rows] , status = status.HTTP_200_OK )
+
+
+class LivestockTimeSeriesView( APIView ) :
+    """
+    تطور الثروة الحيوانية عبر السنوات لنطاق: ?level=area&node=3&from=2015&to=2024
+    الاستجابة مرتبة أعمدةً (سنة لكل عنصر) لتُرسم مباشرة.
+    """
+
+    permission_classes = [ permissions.IsAuthenticated , HasEntityPermission ]
+    permission_entity = ModificationRequest.EntityType.LIVESTOCK
+
+    def get( self , request ) :
+        level , node_id , error = scope_params( request )
+        if error :
+            return error
+
+        start_year = int_param( request.query_params , "from" )
+        end_year = int_param( request.query_params , "to" )
+        if start_year is None or end_year is None or start_year > end_year :
+            return Response( {"error" : "الرجاء تحديد from و to بشكل صحيح"} , status = status.HTTP_400_BAD_REQUEST )
+
+        if end_year - start_year + 1 > MAX_YEARS :
+            return Response( {"error" : f"أقصى مدة {MAX_YEARS} سنة"} , status = status.HTTP_400_BAD_REQUEST )
+
+        data = scoped_livestock_series( request.user , level , node_id , start_year , end_year )
+        return Response( data , status = status.HTTP_200_OK )
+
+
+class CropPivotView( APIView ) :
+    """
+    مساحات المحاصيل (هكتار) لسنة معينة: عقدة × محصول × فصل، مع فصل المحاصيل الاستراتيجية.
+    ?year=2024&group_by=area[&level=governorate&node=1]
+    """
+
+    permission_classes = [ permissions.IsAuthenticated , HasEntityPermission ]
+    permission_entity = ModificationRequest.EntityType.AGRICULTURAL_CROPS
+
+    def get( self , request ) :
+        level , node_id , error = scope_params( request )
+        if error :
+            return error
+
+        year = int_param( request.query_params , "year" )
+        group_by = request.query_params.get( "group_by" , "area" )
+        if year is None or group_by not in GROUP_PATHS :
+            return Response( {"error" : "الرجاء تحديد year و group_by بشكل صحيح"} , status = status.HTTP_400_BAD_REQUEST )
+
+        if level :
+            crops = AgriculturalCrop.objects.in_scope( level , node_id )
+            scope_key = f"{level}:{node_id}"
+        else :
+            crops = AgriculturalCrop.objects.for_user( request.user )
+            scope_key = "all" if is_super_admin( request.user ) else "%s:%s" % user_scope( request.user )
+
+        return Response( crop_pivot( crops , scope_key , year , group_by ) , status = status.HTTP_200_OK )
+
+
+class PersonSearchView( APIView ) :
+    """
+    بحث في الأشخاص عبر الفهرس PersonSearchToken: ?q=محمد الحمصي&page=1&page_size=20[&level=area&node=3]
+    النتائج مرتبة حسب الصلة ومحصورة بنطاق المستخدم.
+    """
+
+    permission_classes = [ permissions.IsAuthenticated , HasEntityPermission ]
+    permission_entity = ModificationRequest.EntityType.PERSONS
+
+    page_size = 20
+    max_page_size = 100
+
+    def get( self , request ) :
+        level , node_id , error = scope_params( request )
+        if error :
+            return error
+
+        query = ( request.query_params.get( "q" ) or "" ).strip()
+        if not query :
+            return Response( {"error" : "الرجاء إدخال نص البحث"} , status = status.HTTP_400_BAD_REQUEST )
+
+        page = max( int_param( request.query_params , "page" ) or 1 , 1 )
+        page_size = min( max( int_param( request.query_params , "page_size" ) or self.page_size , 1 ) , self.max_page_size )
+
+        if level :
+            village_ids = descendant_ids( level , node_id , VILLAGE )
+        elif is_super_admin( request.user ) :
+            village_ids = None
+        else :
+            user_level , user_node_id = user_scope( request.user )
+            village_ids = descendant_ids( user_level , user_node_id , VILLAGE ) if user_node_id else []
+
+        # نطلب عنصراً إضافياً لمعرفة وجود صفحة تالية بدون COUNT
+        ranked = search( query , village_ids , offset = ( page - 1 ) * page_size , limit = page_size + 1 )
+        has_next = len( ranked ) > page_size
+        ranked = ranked[:page_size]
+
+        persons = Person.objects.select_related( "village" ).in_bulk( [person_id for person_id , _ in ranked] )
+        results = [
+            {
+                "id" : person.id ,
+                "name" : person.name ,
+                "village_id" : person.village_id ,
+                "village" : person.village.name ,
+                "work" : person.work ,
+                "educational_qualifications" : person.educational_qualifications ,
+                "score" : score ,
+            }
+            for person_id , score in ranked
+            if ( person := persons.get( person_id ) ) is not None
+        ]
+
+        return Response( {
+            "page" : page ,
+            "page_size" : page_size ,
+            "has_next" : has_next ,
+            "results" : results ,
+        } , status = status.HTTP_200_OK )
+
+
+class VillageKeyFiguresView( APIView ) :
+    """
+    كل الشخصيات المؤثرة في قرية (طائفة، عرق، عشيرة) من KeyFigureIndex: ?dimension=tribe&year=2024
+    """
+
+    permission_classes = [ permissions.IsAuthenticated , HasEntityPermission ]
+    permission_entity = ModificationRequest.EntityType.PERSONS
+
+    def get( self , request , village_id ) :
+        if not can_access_node( request.user , VILLAGE , village_id ) :
+            return Response( {"error" : "هذه القرية خارج نطاقك"} , status = status.HTTP_403_FORBIDDEN )
+
+        rows = KeyFigureIndex.objects.filter( village_id = village_id )
+
+        dimension = request.query_params.get( "dimension" )
+        if dimension :
+            if dimension not in KeyFigureIndex.Dimension.values :
+                return Response( {"error" : "dimension غير صالح"} , status = status.HTTP_400_BAD_REQUEST )
+            rows = rows.filter( dimension = dimension )
+
+        year = int_param( request.query_params , "year" )
+        if year is not None :
+            rows = rows.filter( year = year )
+
+        rows = rows.select_related( "person" , "village" ).order_by( "dimension" , "dimension_id" , "person_id" )
+        return Response( [key_figure_payload( row ) for row in rows] , status = status.HTTP_200_OK )
+
+
+class PersonKeyFiguresView( APIView ) :
+    """
+    كل القرى التي يظهر فيها الشخص كشخصية مؤثرة (ضمن نطاق المستخدم)
+    """
+
+    permission_classes = [ permissions.IsAuthenticated , HasEntityPermission ]
+    permission_entity = ModificationRequest.EntityType.PERSONS
+
+    def get( self , request , person_id ) :
+        rows = KeyFigureIndex.objects.filter( person_id = person_id )
+
+        if not is_super_admin( request.user ) :
+            level , node_id = user_scope( request.user )
+            rows = rows.filter( village_id__in = descendant_ids( level , node_id , VILLAGE ) if node_id else [] )
+
+        rows = rows.select_related( "person" , "village" ).order_by( "village_id" , "dimension" , "year" )
+        return Response( [key_figure_payload( row ) for row in rows] , status = status.HTTP_200_OK )
+
+
+class ModificationRequestReviewViewSet( viewsets.ReadOnlyModelViewSet ) :
+    """
+    طابور مراجعة طلبات التعديل: ?status=pending&entity_type=livestock (الافتراضي: المعلقة، الأقدم أولاً)
+    - approve: اعتماد وتطبيق دفعة {"ids": [...]} أو {"all": true, "entity_type": "..."}
+    - reject: رفض دفعة بنفس الصيغة
+    المراجع يرى فقط أنواع الكيانات التي يملك عليها صلاحية review، ومدير المنطقة طلبات منطقته فقط.
+    """
+
+    serializer_class = ModificationRequestSerializer
+    permission_classes = [ permissions.IsAuthenticated , CanReviewModificationRequests ]
+    pagination_class = ReviewQueuePagination
+
+    def get_queryset( self ) :
+        user = self.request.user
+        requests = ModificationRequest.objects.select_related( "requested_by" ).filter(
+            entity_type__in = reviewable_entity_types( user )
+        )
+
+        if is_area_manager( user ) :
+            requests = requests.filter( requested_by__area_id = user.area_id )
+
+        params = self.request.query_params
+        requests = requests.filter( status = params.get( "status" ) or ModificationRequest.Status.PENDING )
+
+        entity_type = params.get( "entity_type" )
+        if entity_type :
+            requests = requests.filter( entity_type = entity_type )
+        return requests
+
+    def paginate_queryset( self , queryset ) :
+        # old_data / new_data قد تكون مخزنة كفروقات
+        page = super().paginate_queryset( queryset )
+        return payloads.expand( page ) if page is not None else None
+
+    def get_object( self ) :
+        return payloads.expand( [super().get_object()] )[0]
+
+    def batch_ids( self , request ) :
+        """ids المطلوبة بعد حصرها بما يراه المراجع من الطلبات المعلقة، أو Response خطأ"""
+        data = request.data if isinstance( request.data , dict ) else {}
+        pending = self.get_queryset().filter( status = ModificationRequest.Status.PENDING ).order_by( "created_at" , "id" )
+
+        if data.get( "all" ) is True :
+            if data.get( "entity_type" ) :
+                pending = pending.filter( entity_type = data["entity_type"] )
+        else :
+            ids = data.get( "ids" )
+            if not isinstance( ids , list ) or not ids or not all( str( value ).isdigit() for value in ids ) :
+                return None , Response( {"error" : "الرجاء إرسال ids كقائمة أرقام أو all"} , status = status.HTTP_400_BAD_REQUEST )
+            if len( ids ) > review.MAX_BATCH :
+                return None , Response( {"error" : f"أقصى عدد في الدفعة {review.MAX_BATCH}"} , status = status.HTTP_400_BAD_REQUEST )
+            pending = pending.filter( id__in = [int( value ) for value in ids] )
+
+        return list( pending.values_list( "id" , flat = True )[:review.MAX_BATCH] ) , None
+
+    @action( detail = False , methods = ["post"] )
+    def approve( self , request ) :
+        ids , error = self.batch_ids( request )
+        if error :
+            return error
+        if not ids :
+            return Response( {"error" : "لا توجد طلبات معلقة مطابقة"} , status = status.HTTP_400_BAD_REQUEST )
+
+        return Response( review.approve( ids , request.user ) , status = status.HTTP_200_OK )
+
+    @action( detail = False , methods = ["post"] )
+    def reject( self , request ) :
+        ids , error = self.batch_ids( request )
+        if error :
+            return error
+
+        rejected = review.reject( ids , request.user )
+        return Response( {"rejected" : rejected} , status = status.HTTP_200_OK )
+
+
+def can_view_user_activity( viewer , user_id ) -> bool :
+    """المستخدم نفسه، أو الأمن الأساسي، أو مدير المنطقة لمستخدمي منطقته"""
+    if viewer.id == user_id or is_super_admin( viewer ) :
+        return True
+    if is_area_manager( viewer ) :
+        return User.objects.filter(
+            id = user_id , governorate_id = viewer.governorate_id , area_id = viewer.area_id
+        ).exists()
+    return False
+
+
+class AuditLogListView( ListAPIView ) :
+    """
+    أساس واجهات AuditLog: ترقيم بالمؤشر على (created_at, id) الأحدث أولاً،
+    فكل صفحة مسح محدود على الفهرس المركب مهما كبر الجدول.
+    """
+
+    serializer_class = AuditLogSerializer
+    permission_classes = [ permissions.IsAuthenticated ]
+    pagination_class = CreatedAtCursorPagination
+
+    def paginate_queryset( self , queryset ) :
+        # old_data / new_data قد تكون مخزنة كفروقات
+        page = super().paginate_queryset( queryset )
+        return payloads.expand( page ) if page is not None else None
+
+
+class EntityTimelineView( AuditLogListView ) :
+    """
+    سجل تغييرات كيان واحد: /audit/<entity_type>/<entity_id>/timeline/[?action=update]
+    يتطلب صلاحية review على نوع الكيان وأن يكون الكيان ضمن نطاق المستخدم الجغرافي
+    (الكيان المحذوف لا نطاق له فيبقى سجله للأمن الأساسي فقط؛ وللمستخدمين نفس شروط سجل النشاط).
+    """
+
+    def get( self , request , entity_type , entity_id ) :
+        if entity_type == "users" :
+            allowed = can_view_user_activity( request.user , entity_id )
+        else :
+            model = entity_model( entity_type )
+            allowed = has_entity_permission( request.user , rbac.REVIEW , entity_type ) and (
+                is_super_admin( request.user )
+                or ( model is not None and scoped_entities( model , request.user ).filter( pk = entity_id ).exists() )
+            )
+
+        if not allowed :
+            return Response( {"error" : "لا تملك صلاحية عرض سجل هذا الكيان"} , status = status.HTTP_403_FORBIDDEN )
+        return super().get( request )
+
+    def get_queryset( self ) :
+        rows = AuditLog.objects.select_related( "user" ).filter(
+            entity_type = self.kwargs["entity_type"] , entity_id = self.kwargs["entity_id"]
+        )
+        action_param = self.request.query_params.get( "action" )
+        if action_param :
+            rows = rows.filter( action = action_param )
+        return rows
+
+
+class UserActivityView( AuditLogListView ) :
+    """
+    نشاط مستخدم واحد: /audit/users/<user_id>/activity/[?entity_type=livestock]
+    """
+
+    def get( self , request , user_id ) :
+        if not can_view_user_activity( request.user , user_id ) :
+            return Response( {"error" : "لا تملك صلاحية عرض نشاط هذا المستخدم"} , status = status.HTTP_403_FORBIDDEN )
+        return super().get( request )
+
+    def get_queryset( self ) :
+        rows = AuditLog.objects.select_related( "user" ).filter( user_id = self.kwargs["user_id"] )
+        entity_type = self.request.query_params.get( "entity_type" )
+        if entity_type :
+            rows = rows.filter( entity_type = entity_type )
+        return rows
+
+
+class EntityAssignmentsView( APIView ) :
+    """
+    فترات مسؤولية المستخدمين عن كيان (UserHistory):
+    ?entity_type=villages&entity_id=123&at=2024-05-01  -> من كان مسؤولاً في تلك اللحظة
+    ?entity_type=villages&entity_id=123[&from=&to=]    -> الفترات المتقاطعة مع المدة
+    الكيان يجب أن يكون ضمن النطاق الجغرافي للمستخدم.
+    """
+
+    permission_classes = [ permissions.IsAuthenticated , CanManageAccounts ]
+
+    def get( self , request ) :
+        params = request.query_params
+        entity_type = params.get( "entity_type" )
+        entity_id = int_param( params , "entity_id" )
+        if not entity_type or entity_id is None :
+            return Response( {"error" : "الرجاء تحديد entity_type و entity_id"} , status = status.HTTP_400_BAD_REQUEST )
+
+        if not assignments.scoped_pairs( request.user , [( entity_type , entity_id )] ) :
+            return Response( {"error" : "هذا الكيان خارج نطاقك"} , status = status.HTTP_403_FORBIDDEN )
+
+        if params.get( "at" ) :
+            moment = datetime_param( params["at"] )
+            if moment is None :
+                return Response( {"error" : "صيغة at غير صالحة"} , status = status.HTTP_400_BAD_REQUEST )
+            rows = assignments.covering(
+                assignments.entity_intervals( entity_type , entity_id ) , moment
+            )
+        else :
+            start , end , error = period_params( params )
+            if error :
+                return Response( {"error" : "صيغة from أو to غير صالحة"} , status = status.HTTP_400_BAD_REQUEST )
+            rows = assignments.entity_intervals( entity_type , entity_id , start , end )
+
+        return Response( [assignments.interval_payload( row ) for row in rows] , status = status.HTTP_200_OK )
+
+
+class UserAssignmentsView( APIView ) :
+    """ما غطاه مستخدم من كيانات خلال مدة: /audit/users/<user_id>/assignments/?from=2024-07-01&to=2024-10-01"""
+
+    permission_classes = [ permissions.IsAuthenticated ]
+
+    def get( self , request , user_id ) :
+        if not can_view_user_activity( request.user , user_id ) :
+            return Response( {"error" : "لا تملك صلاحية عرض نشاط هذا المستخدم"} , status = status.HTTP_403_FORBIDDEN )
+
+        start , end , error = period_params( request.query_params )
+        if error :
+            return Response( {"error" : "صيغة from أو to غير صالحة"} , status = status.HTTP_400_BAD_REQUEST )
+
+        rows = assignments.user_intervals( user_id , start , end )
+        return Response( [assignments.interval_payload( row ) for row in rows] , status = status.HTTP_200_OK )
+
+
+class AssignmentResolveView( APIView ) :
+    """
+    حل دفعة من الاستعلامات "من كان مسؤولاً عن الكيان في هذه اللحظة":
+    {"lookups": [{"entity_type": "villages", "entity_id": 123, "at": "2024-05-01"}, ...]}
+    كل الكيانات يجب أن تكون ضمن النطاق الجغرافي للمستخدم، وإلا ترفض الدفعة كاملة.
+    """
+
+    permission_classes = [ permissions.IsAuthenticated , CanManageAccounts ]
+    max_lookups = 10000
+
+    def post( self , request ) :
+        lookups = request.data.get( "lookups" ) if isinstance( request.data , dict ) else None
+        if not isinstance( lookups , list ) or not lookups :
+            return Response( {"error" : "الرجاء إرسال lookups كقائمة"} , status = status.HTTP_400_BAD_REQUEST )
+        if len( lookups ) > self.max_lookups :
+            return Response( {"error" : f"أقصى عدد في الدفعة {self.max_lookups}"} , status = status.HTTP_400_BAD_REQUEST )
+
+        parsed = []
+        for index , lookup in enumerate( lookups ) :
+            lookup = lookup if isinstance( lookup , dict ) else {}
+            entity_id = lookup.get( "entity_id" )
+            moment = datetime_param( lookup.get( "at" ) )
+            if not lookup.get( "entity_type" ) or not str( entity_id ).isdigit() or moment is None :
+                return Response( {"error" : f"عنصر غير صالح في lookups رقم {index}"} , status = status.HTTP_400_BAD_REQUEST )
+            parsed.append( ( str( lookup["entity_type"] ) , int( entity_id ) , moment ) )
+
+        allowed = assignments.scoped_pairs( request.user , { ( entity_type , entity_id ) for entity_type , entity_id , _ in parsed } )
+        for index , ( entity_type , entity_id , _ ) in enumerate( parsed ) :
+            if ( entity_type , entity_id ) not in allowed :
+                return Response( {"error" : f"الكيان في lookups رقم {index} خارج نطاقك"} , status = status.HTTP_403_FORBIDDEN )
+
+        results = [
+            { "entity_type" : entity_type , "entity_id" : entity_id , "at" : moment , "user_ids" : user_ids }
+            for ( entity_type , entity_id , moment ) , user_ids in zip( parsed , assignments.resolve( parsed ) )
+        ]
+        return Response( {"results" : results} , status = status.HTTP_200_OK )
+
+
+class VillageDataImportView( APIView ) :
+    """
+    استيراد ملف CSV / XLSX (حقل file) إلى جدول سنوي: /imports/<entity_type>/[?dry_run=1]
+    الأعمدة: village أو village_id (و subarea عند تكرار اسم القرية) ثم أسماء حقول الجدول.
+    الصف الموجود بنفس المفتاح (القرية + السنة ...) يُحدّث بدل إنشاء صف جديد.
+    """
+
+    permission_classes = [ permissions.IsAuthenticated ]
+
+    def post( self , request , entity_type ) :
+        if entity_type not in IMPORT_MODELS :
+            return Response( {"error" : "نوع غير مدعوم للاستيراد"} , status = status.HTTP_400_BAD_REQUEST )
+
+        if not (
+            has_entity_permission( request.user , rbac.CREATE , entity_type )
+            and has_entity_permission( request.user , rbac.UPDATE , entity_type )
+        ) :
+            return Response( {"error" : "لا تملك صلاحية الإنشاء والتعديل على هذا الكيان"} , status = status.HTTP_403_FORBIDDEN )
+
+        upload = request.FILES.get( "file" )
+        if upload is None :
+            return Response( {"error" : "الرجاء إرسال الملف في الحقل file"} , status = status.HTTP_400_BAD_REQUEST )
+
+        allowed_ids = None
+        if not is_super_admin( request.user ) :
+            allowed_ids = villages_in( *user_scope( request.user ) )
+
+        try :
+            importer = Importer(
+                entity_type , user_id = request.user.id , allowed_village_ids = allowed_ids ,
+                dry_run = request.query_params.get( "dry_run" ) in ( "1" , "true" ) ,
+            )
+            result = importer.run( upload.file , detect_format( upload.name , request.query_params.get( "format" ) ) )
+        except ImportFailed as exc :
+            return Response( {"error" : str( exc )} , status = status.HTTP_400_BAD_REQUEST )
+
+        return Response( result , status = status.HTTP_200_OK )
+
+
+class VillageDataExportView( APIView ) :
+    """
+    تصدير جدول مرتبط بالقرى كاملاً كتدفق: /exports/<entity_type>/?output=csv|ndjson[&level=area&node=3]
+    (output بدل format لأن DRF يحجز format لاختيار الـ renderer)
+    """
+
+    permission_classes = [ permissions.IsAuthenticated ]
+
+    def get( self , request , entity_type ) :
+        model = exporter.EXPORT_MODELS.get( entity_type )
+        if model is None :
+            return Response( {"error" : "نوع غير مدعوم للتصدير"} , status = status.HTTP_400_BAD_REQUEST )
+
+        if not has_entity_permission( request.user , rbac.VIEW , entity_type ) :
+            return Response( {"error" : "لا تملك صلاحية عرض هذا الكيان"} , status = status.HTTP_403_FORBIDDEN )
+
+        file_format = request.query_params.get( "output" , "csv" )
+        if file_format not in exporter.FORMATS :
+            return Response( {"error" : "output يجب أن يكون csv أو ndjson"} , status = status.HTTP_400_BAD_REQUEST )
+
+        level , node_id , error = scope_params( request )
+        if error :
+            return error
+
+        rows = model.objects.in_scope( level , node_id ) if level else model.objects.for_user( request.user )
+        response = StreamingHttpResponse(
+            exporter.stream_export( rows , file_format ) , content_type = exporter.CONTENT_TYPES[file_format]
+        )
+        response["Content-Disposition"] = f'attachment; filename="{entity_type}.{file_format}"'
+        return response
+
+
+class SyncView( APIView ) :
+    """
+    مزامنة تدريجية للعملاء دون اتصال دائم:
+    {"watermarks": {"livestock": "<next من المرة السابقة>", "persons": null}, "limit": 500}
+    لكل نوع: الصفوف المتغيرة منذ العلامة ضمن نطاق المستخدم، وأرقام المحذوف، و next للمرة القادمة.
+    بدون watermarks تُرجع كل الأنواع التي يملك المستخدم صلاحية عرضها (أول مزامنة).
+    has_more = true يعني إعادة الطلب بنفس next فوراً، و reset = true يعني حذف البيانات المحلية والبدء من null
+    (علامة قديمة جداً، أو تغير نطاق المستخدم منذ إصدارها).
+    الصفوف المثبتة بمعاملة أطول من SYNC_LAG قد تفوت العميل، انظر sync.SYNC_LAG.
+    """
+
+    permission_classes = [ permissions.IsAuthenticated ]
+
+    def post( self , request ) :
+        data = request.data if isinstance( request.data , dict ) else {}
+        watermarks = data.get( "watermarks" )
+        if watermarks is None :
+            watermarks = dict.fromkeys( sync.SYNC_MODELS )
+        if not isinstance( watermarks , dict ) :
+            return Response( {"error" : "watermarks يجب أن يكون كائناً {نوع: علامة}"} , status = status.HTTP_400_BAD_REQUEST )
+
+        limit = data.get( "limit" , sync.DEFAULT_LIMIT )
+        if not isinstance( limit , int ) or not 0 < limit <= sync.MAX_LIMIT :
+            return Response( {"error" : f"limit بين 1 و {sync.MAX_LIMIT}"} , status = status.HTTP_400_BAD_REQUEST )
+
+        village_ids = scope = None
+        if not is_super_admin( request.user ) :
+            level , node_id = user_scope( request.user )
+            village_ids = descendant_ids( level , node_id , VILLAGE ) if node_id else []
+            scope = f"{level}:{node_id}"
+
+        result = {}
+        for entity_type , token in watermarks.items() :
+            model = sync.SYNC_MODELS.get( entity_type )
+            if model is None :
+                result[entity_type] = { "error" : "نوع غير مدعوم للمزامنة" }
+                continue
+            if not has_entity_permission( request.user , rbac.VIEW , entity_type ) :
+                if "watermarks" in data :
+                    result[entity_type] = { "error" : "لا تملك صلاحية عرض هذا الكيان" }
+                continue
+
+            try :
+                result[entity_type] = sync.changes(
+                    entity_type , model.objects.for_user( request.user ) , village_ids , token , limit , scope
+                )
+            except sync.InvalidToken :
+                result[entity_type] = { "error" : "علامة المزامنة غير صالحة" }
+
+        return Response( {"changes" : result} , status = status.HTTP_200_OK )
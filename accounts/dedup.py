@@ -0,0 +1,250 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DedupRun, Person, PersonBlockKey, PersonDuplicateCandidate
+from .search import normalize, tokenize
+
+# عدد الجيران المقارنين من كل جهة بعد ترتيب أسماء المفتاح الواحد
+NEIGHBOR_WINDOW = 10
+NAME_THRESHOLD = 0.90
+# مع تطابق رقم الهاتف يكفي تشابه أقل في الاسم
+PHONE_NAME_THRESHOLD = 0.75
+NAME_PREFIX_LENGTH = 3
+PHONE_DIGITS = 9
+
+# كلمات لا تميز الاسم
+NAME_STOP_WORDS = frozenset( [ "بن" , "ابن" , "بنت" ] )
+
+PERSON_FIELDS = ( "id" , "name" , "phone" , "village_id" )
+
+
+def jaro_winkler( a : str , b : str , prefix_scale : float = 0.1 ) -> float :
+    if a == b :
+        return 1.0
+    if not a or not b :
+        return 0.0
+
+    window = max( 0 , max( len( a ) , len( b ) ) // 2 - 1 )
+    a_matched = [False] * len( a )
+    b_matched = [False] * len( b )
+
+    matches = 0
+    for i , char in enumerate( a ) :
+        for j in range( max( 0 , i - window ) , min( len( b ) , i + window + 1 ) ) :
+            if not b_matched[j] and b[j] == char :
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches :
+        return 0.0
+
+    transpositions = 0
+    j = 0
+    for i , char in enumerate( a ) :
+        if a_matched[i] :
+            while not b_matched[j] :
+                j += 1
+            if char != b[j] :
+                transpositions += 1
+            j += 1
+
+    jaro = ( matches / len( a ) + matches / len( b ) + ( matches - transpositions / 2 ) / matches ) / 3
+
+    prefix = 0
+    for char_a , char_b in zip( a[:4] , b[:4] ) :
+        if char_a != char_b :
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * ( 1 - jaro )
+
+
+def name_tokens( name ) -> list :
+    return [token for token in tokenize( name ) if token not in NAME_STOP_WORDS]
+
+
+def phone_digits( phone ) -> str :
+    digits = "".join( char for char in normalize( phone ) if char.isdigit() )
+    return digits[-PHONE_DIGITS:] if len( digits ) >= 7 else ""
+
+
+def block_keys( person : dict ) -> set :
+    """
+    المفاتيح: بادئة الاسم الأول ضمن القرية، بادئتا الاسم الأول والكنية ضمن المنطقة (village_area_id)، ورقم الهاتف.
+    """
+    keys = set()
+    tokens = name_tokens( person["name"] )
+    if tokens :
+        first = tokens[0][:NAME_PREFIX_LENGTH]
+        keys.add( f"v:{person['village_id']}:{first}" )
+
+        if len( tokens ) > 1 and person.get( "village_area_id" ) :
+            keys.add( f"a:{person['village_area_id']}:{first}:{tokens[-1][:NAME_PREFIX_LENGTH]}" )
+
+    phone = phone_digits( person["phone"] )
+    if phone :
+        keys.add( f"p:{phone}" )
+    return keys
+
+
+@transaction.atomic
+def refresh_block_keys( person_ids ) :
+    person_ids = list( person_ids )
+    PersonBlockKey.objects.filter( person_id__in = person_ids ).delete()
+    PersonBlockKey.objects.bulk_create(
+        [
+            PersonBlockKey( key = key , person_id = person["id"] )
+            for person in Person.objects.filter( id__in = person_ids ).values(
+                *PERSON_FIELDS , village_area_id = F( "village__subarea__area_id" ) ,
+            )
+            for key in block_keys( person )
+        ] ,
+        batch_size = 2000 ,
+    )
+
+
+def name_similarity( a : list , b : list ) -> float :
+    """
+    متوسط تشابه الاسم كاملاً مع أضعف تطابق بين الكلمات المتقابلة (الأول مع الأول، الكنية مع الكنية، وما بينهما بالترتيب).
+    اختلاف اسم الأب أو الكنية يكفي لخفض النتيجة حتى لو كانت بقية الاسم متطابقة.
+    """
+    if not a or not b :
+        return 0.0
+
+    aligned = [( a[0] , b[0] ) , ( a[-1] , b[-1] )] + list( zip( a[1:-1] , b[1:-1] ) )
+    weakest = min( jaro_winkler( x , y ) for x , y in aligned )
+    return ( jaro_winkler( " ".join( a ) , " ".join( b ) ) + weakest ) / 2
+
+
+def compare( a : dict , b : dict ) :
+    """(score, reasons) إذا كان الشخصان مرشحين للتكرار، وإلا None"""
+    name_score = name_similarity( name_tokens( a["name"] ) , name_tokens( b["name"] ) )
+    phone = phone_digits( a["phone"] )
+    same_phone = bool( phone ) and phone == phone_digits( b["phone"] )
+    same_village = a["village_id"] == b["village_id"]
+
+    if name_score < NAME_THRESHOLD and not ( same_phone and name_score >= PHONE_NAME_THRESHOLD ) :
+        return None
+
+    score = min( 1.0 , name_score + 0.05 * same_phone + 0.02 * same_village )
+    reasons = { "name" : round( name_score , 4 ) , "phone" : same_phone , "same_village" : same_village }
+    return round( score , 4 ) , reasons
+
+
+def _candidate_pairs( batch_ids : list ) :
+    """
+    الأزواج (الأصغر، الأكبر) التي تشترك بمفتاح واحد على الأقل، وأحد طرفيها من الدفعة الحالية.
+    داخل كل مفتاح تُرتب الأسماء المطبّعة ويُقارن كل شخص جديد مع NEIGHBOR_WINDOW جار من كل جهة فقط
+    (sorted neighborhood)، فالكلفة خطية حتى مع مفاتيح كبيرة لأسماء شائعة.
+    """
+    batch = set( batch_ids )
+    batch_max = max( batch_ids )
+
+    keys = set( PersonBlockKey.objects.filter( person_id__in = batch_ids ).values_list( "key" , flat = True ) )
+
+    # الأشخاص بعد الدفعة سيُقارنون في دفعتهم
+    members = defaultdict( list )
+    rows = PersonBlockKey.objects.filter( key__in = keys , person_id__lte = batch_max ).values_list(
+        "key" , "person_id" , "person__name"
+    )
+    for key , person_id , name in rows.iterator( chunk_size = 5000 ) :
+        members[key].append( ( " ".join( name_tokens( name ) ) , person_id ) )
+
+    pairs = set()
+    for block in members.values() :
+        block.sort()
+        for index , ( _ , person_id ) in enumerate( block ) :
+            if person_id not in batch :
+                continue
+            for _ , other_id in block[max( 0 , index - NEIGHBOR_WINDOW ) : index + NEIGHBOR_WINDOW + 1] :
+                if other_id != person_id :
+                    pairs.add( ( min( person_id , other_id ) , max( person_id , other_id ) ) )
+    return pairs
+
+
+def recluster() -> int :
+    """
+    ربط الأزواج غير المرفوضة في مجموعات (union-find)، ورقم المجموعة هو أصغر id فيها.
+    يُحدث فقط الصفوف التي تغير رقم مجموعتها.
+    """
+    parent = {}
+
+    def find( node ) :
+        root = node
+        while parent.get( root , root ) != root :
+            root = parent[root]
+        while parent.get( node , node ) != root :
+            parent[node] , node = root , parent[node]
+        return root
+
+    pairs = PersonDuplicateCandidate.objects.exclude( status = PersonDuplicateCandidate.Status.DISMISSED )
+    rows = list( pairs.values_list( "id" , "person_a_id" , "person_b_id" , "cluster_id" ) )
+    for _ , a , b , _ in rows :
+        root_a , root_b = find( a ) , find( b )
+        if root_a != root_b :
+            parent[max( root_a , root_b )] = min( root_a , root_b )
+
+    changed = defaultdict( list )
+    for row_id , a , _ , cluster_id in rows :
+        root = find( a )
+        if root != cluster_id :
+            changed[root].append( row_id )
+
+    for cluster_id , row_ids in changed.items() :
+        PersonDuplicateCandidate.objects.filter( id__in = row_ids ).update( cluster_id = cluster_id )
+    return len( changed )
+
+
+def run( batch_size : int = 1000 , full : bool = False ) -> DedupRun :
+    """
+    كشف التكرار للأشخاص الجدد فقط (id بعد آخر نقطة توقف)، على دفعات.
+    كل دفعة تحفظ نقطة التوقف، فالتشغيل المنقطع يكمل من حيث توقف.
+    full تعيد المعالجة من البداية وتحذف الأزواج غير المراجعة (المراجعة تبقى).
+    """
+    if full :
+        with transaction.atomic() :
+            PersonBlockKey.objects.all().delete()
+            PersonDuplicateCandidate.objects.filter( status = PersonDuplicateCandidate.Status.PENDING ).delete()
+            DedupRun.objects.all().delete()
+
+    last_person_id = DedupRun.objects.order_by( "-id" ).values_list( "last_person_id" , flat = True ).first() or 0
+    dedup_run = DedupRun.objects.create( last_person_id = last_person_id )
+
+    while True :
+        batch_ids = list(
+            Person.objects.filter( id__gt = dedup_run.last_person_id )
+            .order_by( "id" )
+            .values_list( "id" , flat = True )[:batch_size]
+        )
+        if not batch_ids :
+            break
+
+        with transaction.atomic() :
+            refresh_block_keys( batch_ids )
+            pairs = _candidate_pairs( batch_ids )
+
+            involved = { person_id for pair in pairs for person_id in pair }
+            persons = { row["id"] : row for row in Person.objects.filter( id__in = involved ).values( *PERSON_FIELDS ) }
+
+            candidates = []
+            for a , b in pairs :
+                result = compare( persons[a] , persons[b] )
+                if result :
+                    score , reasons = result
+                    candidates.append( PersonDuplicateCandidate(
+                        person_a_id = a , person_b_id = b , score = score , reasons = reasons , cluster_id = a ,
+                    ) )
+            PersonDuplicateCandidate.objects.bulk_create( candidates , batch_size = 1000 , ignore_conflicts = True )
+
+            dedup_run.last_person_id = batch_ids[-1]
+            dedup_run.processed += len( batch_ids )
+            dedup_run.compared_pairs += len( pairs )
+            dedup_run.candidates += len( candidates )
+            dedup_run.save( update_fields = [ "last_person_id" , "processed" , "compared_pairs" , "candidates" ] )
+
+    recluster()
+    dedup_run.finished_at = timezone.now()
+    dedup_run.save( update_fields = [ "finished_at" ] )
+    return dedup_run
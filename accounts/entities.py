@@ -0,0 +1,182 @@
+import json
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+from .models import (
+    AgriculturalCrop,
+    AgriculturalStatus,
+    ArchaeologicalSite,
+    CommercialActivity,
+    DemographicData,
+    GovernmentDepartment,
+    IndustrialFacility,
+    IndustrialZone,
+    Livestock,
+    ModificationRequest,
+    NaturalAsset,
+    Person,
+    SubArea,
+    TourismFacility,
+    Village,
+    VillageEthnicity,
+    VillageSect,
+    VillageTribe,
+)
+
+EntityType = ModificationRequest.EntityType
+
+# الجدول الذي يشير إليه كل نوع كيان في ModificationRequest / AuditLog
+# (الطوائف والأعراق والعشائر هي سجلاتها ضمن القرية، لا جداول الأسماء)
+ENTITY_MODELS = {
+    EntityType.SUBAREA : SubArea ,
+    EntityType.VILLAGES : Village ,
+    EntityType.SECTS : VillageSect ,
+    EntityType.PERSONS : Person ,
+    EntityType.ETHNICITIES : VillageEthnicity ,
+    EntityType.TRIBES : VillageTribe ,
+    EntityType.LIVESTOCK : Livestock ,
+    EntityType.GOVERNMENT_DEPARTMENTS : GovernmentDepartment ,
+    EntityType.NATURAL_ASSETS : NaturalAsset ,
+    EntityType.INDUSTRIAL_ZONES : IndustrialZone ,
+    EntityType.TOURISM_FACILITIES : TourismFacility ,
+    EntityType.ARCHAEOLOGICAL_SITES : ArchaeologicalSite ,
+    EntityType.COMMERCIAL_ACTIVITIES : CommercialActivity ,
+    EntityType.DEMOGRAPHIC_DATA : DemographicData ,
+    EntityType.AGRICULTURAL_STATUS : AgriculturalStatus ,
+    EntityType.AGRICULTURAL_CROPS : AgriculturalCrop ,
+    EntityType.INDUSTRIAL_FACILITIES : IndustrialFacility ,
+}
+
+# حقول لا تتغير عبر طلبات التعديل
+PROTECTED_FIELDS = frozenset( [ "id" , "created_by" , "created_at" , "updated_at" ] )
+
+
+def entity_model( entity_type : str ) :
+    return ENTITY_MODELS.get( entity_type )
+
+
+def scoped_entities( model , user ) :
+    """
+    QuerySet سجلات الجدول ضمن النطاق الجغرافي للمستخدم.
+    جداول التسلسل نفسها (منطقة/ناحية/قرية) تُحصر عبر جدول الإغلاق، والباقي عبر objects.for_user.
+    """
+    from locations.closure import MODEL_LEVELS , descendant_ids
+
+    from .utils import is_super_admin , user_scope
+
+    if model not in MODEL_LEVELS :
+        return model.objects.for_user( user )
+    if is_super_admin( user ) :
+        return model._base_manager.all()
+
+    level , node_id = user_scope( user )
+    if node_id is None :
+        return model._base_manager.none()
+    return model._base_manager.filter( pk__in = descendant_ids( level , node_id , MODEL_LEVELS[model] ) )
+
+
+def scope_field( model ) :
+    """المفتاح الخارجي الذي يحدد نطاق السجل (village لمعظم الجداول، الأب لجداول التسلسل)"""
+    from locations.closure import MODEL_LEVELS , PARENT_FIELDS
+
+    if model in MODEL_LEVELS :
+        attname = PARENT_FIELDS[MODEL_LEVELS[model]]
+    else :
+        attname = model.objects.get_queryset().village_field.split( "__" )[0] + "_id"
+    return next( field for field in model._meta.concrete_fields if field.attname == attname )
+
+
+def editable_fields( model ) -> dict :
+    """{اسم الحقل أو attname: الحقل} لكل الحقول القابلة للتعديل (village و village_id كلاهما مقبول)"""
+    fields = {}
+    for field in model._meta.concrete_fields :
+        if field.primary_key or field.name in PROTECTED_FIELDS :
+            continue
+        fields[field.name] = field
+        fields[field.attname] = field
+    return fields
+
+
+def snapshot( instance , fields = None ) -> dict :
+    """قيم الحقول (بأسماء attname) بصيغة قابلة للتخزين في JSONField"""
+    fields = fields or [field.attname for field in instance._meta.concrete_fields]
+    data = { name : getattr( instance , name ) for name in fields }
+    return json.loads( json.dumps( data , cls = DjangoJSONEncoder ) )
+
+
+def touch( instance ) -> list :
+    """
+    bulk_update لا يطبق auto_now، فنضبط updated_at يدوياً.
+    IndustrialZone.updated_at رقم (timestamp) وليس تاريخاً.
+    """
+    field = next( ( field for field in instance._meta.concrete_fields if field.name == "updated_at" ) , None )
+    if field is None :
+        return []
+
+    instance.updated_at = timezone.now() if isinstance( field , models.DateTimeField ) else int( time.time() )
+    return [ "updated_at" ]
+
+
+# ما تفعله الإشارات عادة بعد save(): bulk_update لا يرسلها، فتُستدعى هذه بعد كل دفعة.
+# الحذف عبر QuerySet.delete() يرسل post_delete لكل صف فلا يحتاج شيئاً هنا.
+
+def _recompute_rollups( instances , old_rows ) :
+    from . import rollups
+
+    villages = { instance.village_id for instance in instances } | { row["village_id"] for row in old_rows.values() }
+    years = { instance.year for instance in instances } | { row["year"] for row in old_rows.values() }
+    rollups.recompute( villages , years )
+
+
+def _reindex_persons( instances , old_rows ) :
+    from . import dedup , search
+
+    person_ids = [instance.pk for instance in instances]
+    search.reindex( person_ids )
+    dedup.refresh_block_keys( person_ids )
+
+
+def _sync_key_figures( instances , old_rows ) :
+    from . import key_figures
+
+    for instance in instances :
+        key_figures.sync_parent( key_figures.PARENT_DIMENSIONS[type( instance )] , instance )
+
+
+def _sync_hierarchy( instances , old_rows ) :
+    from locations import closure
+    from locations.hierarchy import bump_hierarchy_version
+    from locations.signals import move_and_recompute
+
+    for instance in instances :
+        level = closure.MODEL_LEVELS[type( instance )]
+        field = closure.PARENT_FIELDS[level]
+        parent_id = getattr( instance , field )
+        if parent_id != old_rows[instance.pk].get( field , parent_id ) :
+            move_and_recompute( level , instance.pk , parent_id )
+    bump_hierarchy_version()
+
+
+AFTER_BULK_UPDATE = {
+    DemographicData : _recompute_rollups ,
+    Person : _reindex_persons ,
+    VillageSect : _sync_key_figures ,
+    VillageEthnicity : _sync_key_figures ,
+    VillageTribe : _sync_key_figures ,
+    Village : _sync_hierarchy ,
+    SubArea : _sync_hierarchy ,
+}
+
+
+def after_bulk_update( model , instances , old_rows ) :
+    """old_rows: {pk: snapshot قبل التعديل}"""
+    from . import sync
+
+    hook = AFTER_BULK_UPDATE.get( model )
+    if hook and instances :
+        hook( instances , old_rows )
+    if model in sync.SYNC_ENTITY_TYPES and instances :
+        sync.record_moves( model , instances , sync.old_villages( model , old_rows ) )
@@ -0,0 +1,137 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from .entities import ENTITY_MODELS
+from .models import Area, Crop, Ethnicity, Governorate, Person, Sect, SubArea, Tribe, User, Village
+from .scope import ScopedQuerySet
+
+# كل الجداول المرتبطة بقرية (لها مدير ScopedQuerySet) قابلة للتصدير
+EXPORT_MODELS = {
+    entity_type : model for entity_type , model in ENTITY_MODELS.items()
+    if isinstance( model._default_manager.all() , ScopedQuerySet )
+}
+
+FORMATS = ( "csv" , "ndjson" )
+CONTENT_TYPES = {
+    "csv" : "text/csv; charset=utf-8" ,
+    "ndjson" : "application/x-ndjson; charset=utf-8" ,
+}
+
+CHUNK_SIZE = 2000
+
+# جداول الأسماء الصغيرة: تُحمل كاملة مرة واحدة في dict {id: اسم}
+LABEL_FIELDS = {
+    Governorate : "name" ,
+    Area : "name" ,
+    SubArea : "name" ,
+    Village : "name" ,
+    Sect : "name" ,
+    Ethnicity : "name" ,
+    Tribe : "name" ,
+    Crop : "name" ,
+    User : "username" ,
+}
+# جداول كبيرة: الأسماء تُقرأ لكل دفعة صفوف باستعلام واحد
+CHUNK_LABEL_FIELDS = {
+    Person : "name" ,
+}
+
+
+class _Echo :
+    """csv.writer يكتب إلى هنا ونرجع السطر مباشرة بدل تجميعه"""
+
+    def write( self , value ) :
+        return value
+
+
+class Column :
+    def __init__( self , name , path , related = None , label_model = None ) :
+        self.name = name
+        self.path = path
+        # الجدول المشار إليه إذا كان العمود id لمفتاح خارجي
+        self.related = related
+        # للأعمدة المشتقة <field>_name: الجدول الذي يُقرأ منه الاسم
+        self.label_model = label_model
+
+
+def export_columns( model ) -> list :
+    """
+    أعمدة التصدير: كل الحقول المباشرة (FK بقيمة id)، ولكل FK له اسم عمود <field>_name إضافي.
+    الجداول المرتبطة بالقرية عبر جدول آخر (AgriculturalCrop مثلاً) تأخذ village_id أيضاً.
+    """
+    columns = [
+        Column( field.attname , field.attname , field.related_model if field.is_relation else None )
+        for field in model._meta.concrete_fields
+    ]
+
+    village_field = model._default_manager.all().village_field
+    if village_field != "village" :
+        columns.append( Column( "village_id" , f"{village_field}_id" , Village ) )
+
+    labels = [
+        Column( f"{column.name.removesuffix( '_id' )}_name" , column.path , label_model = column.related )
+        for column in columns
+        if column.related in LABEL_FIELDS or column.related in CHUNK_LABEL_FIELDS
+    ]
+    return columns + labels
+
+
+def stream_export( queryset , file_format : str , chunk_size : int = CHUNK_SIZE ) :
+    """
+    مولّد أسطر التصدير (CSV أو NDJSON) لـ queryset مفلتر مسبقاً على النطاق.
+    الصفوف تُقرأ عبر values_list().iterator() بالترتيب حسب id، فالذاكرة لا تتعلق بحجم الجدول.
+    """
+    model = queryset.model
+    columns = export_columns( model )
+    value_columns = [column for column in columns if column.label_model is None]
+    label_columns = [column for column in columns if column.label_model is not None]
+    positions = { column.path : index for index , column in enumerate( value_columns ) }
+    # حقول JSON تُكتب في CSV كنص JSON لا كـ repr بايثون
+    json_positions = [
+        index for index , column in enumerate( value_columns )
+        if isinstance( model._meta.get_field( column.path.split( "__" )[0] ) , models.JSONField )
+    ]
+
+    labels = {
+        related : dict( related._base_manager.values_list( "pk" , LABEL_FIELDS[related] ) )
+        for related in { column.label_model for column in label_columns } if related in LABEL_FIELDS
+    }
+
+    names = [column.name for column in columns]
+    writer = csv.writer( _Echo() )
+    if file_format == "csv" :
+        # BOM حتى يفتح Excel الأسماء العربية بشكل صحيح
+        yield "\ufeff" + writer.writerow( names )
+
+    rows = queryset.order_by( "pk" ).values_list( *[column.path for column in value_columns] ).iterator( chunk_size = chunk_size )
+    while True :
+        chunk = list( islice( rows , chunk_size ) )
+        if not chunk :
+            return
+
+        chunk_labels = dict( labels )
+        for related , field in CHUNK_LABEL_FIELDS.items() :
+            ids = {
+                row[positions[column.path]] for column in label_columns if column.label_model is related for row in chunk
+            } - { None }
+            if ids :
+                chunk_labels[related] = dict( related._base_manager.filter( pk__in = ids ).values_list( "pk" , field ) )
+
+        lookups = [
+            ( chunk_labels.get( column.label_model , {} ) , positions[column.path] ) for column in label_columns
+        ]
+        lines = []
+        for row in chunk :
+            values = list( row ) + [names_by_id.get( row[position] ) for names_by_id , position in lookups]
+            if file_format == "csv" :
+                for index in json_positions :
+                    if values[index] is not None :
+                        values[index] = json.dumps( values[index] , ensure_ascii = False , cls = DjangoJSONEncoder )
+                lines.append( writer.writerow( values ) )
+            else :
+                lines.append( json.dumps( dict( zip( names , values ) ) , ensure_ascii = False , cls = DjangoJSONEncoder ) + "\n" )
+        yield "".join( lines )
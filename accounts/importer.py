@@ -0,0 +1,305 @@
+import csv
+import io
+import json
+import time
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Q
+
+from .audit import audit_writer
+from .entities import PROTECTED_FIELDS, after_bulk_update, touch
+from .models import (
+    AgriculturalStatus,
+    AuditLog,
+    DemographicData,
+    GovernmentDepartment,
+    IndustrialZone,
+    Livestock,
+    ModificationRequest,
+    Village,
+)
+from .search import normalize
+
+EntityType = ModificationRequest.EntityType
+
+# الجداول السنوية لكل قرية التي تقبل الاستيراد، ومفتاحها الطبيعي هو أول UniqueConstraint فيها
+IMPORT_MODELS = {
+    EntityType.LIVESTOCK : Livestock ,
+    EntityType.DEMOGRAPHIC_DATA : DemographicData ,
+    EntityType.AGRICULTURAL_STATUS : AgriculturalStatus ,
+    EntityType.INDUSTRIAL_ZONES : IndustrialZone ,
+    EntityType.GOVERNMENT_DEPARTMENTS : GovernmentDepartment ,
+}
+
+FORMATS = ( "csv" , "xlsx" )
+
+# عدد الصفوف في كل دفعة تحقق وكتابة
+BATCH_SIZE = 2000
+# أقصى عدد أخطاء تُرجع تفصيلاً (العدد الكلي يُحسب دائماً)
+MAX_REPORTED_ERRORS = 200
+
+
+class ImportFailed( Exception ) :
+    pass
+
+
+def natural_key( model ) -> list :
+    constraint = next( c for c in model._meta.constraints if isinstance( c , models.UniqueConstraint ) )
+    return list( constraint.fields )
+
+
+def detect_format( filename : str , explicit : str = None ) -> str :
+    file_format = explicit or ( filename or "" ).rsplit( "." , 1 )[-1].lower()
+    if file_format not in FORMATS :
+        raise ImportFailed( "صيغة الملف غير مدعومة (csv أو xlsx فقط)" )
+    return file_format
+
+
+def iter_rows( stream , file_format : str ) :
+    """صفوف الملف كـ dict واحداً تلو الآخر (بدون تحميل الملف في الذاكرة)، مع رقم السطر"""
+    if file_format == "csv" :
+        text = stream if isinstance( stream , io.TextIOBase ) else io.TextIOWrapper( stream , encoding = "utf-8-sig" , newline = "" )
+        reader = csv.reader( text )
+        header = next( reader , None )
+        rows = reader
+        first_line = 2
+    else :
+        try :
+            import openpyxl
+        except ImportError :
+            raise ImportFailed( "ملفات xlsx تتطلب تثبيت openpyxl" )
+
+        workbook = openpyxl.load_workbook( stream , read_only = True , data_only = True )
+        rows = workbook.active.iter_rows( values_only = True )
+        header = next( rows , None )
+        first_line = 2
+
+    if not header :
+        raise ImportFailed( "الملف فارغ" )
+
+    columns = [str( name or "" ).strip().lower() for name in header]
+    for line , values in enumerate( rows , start = first_line ) :
+        if not any( value not in ( None , "" ) for value in values ) :
+            continue
+        yield line , dict( zip( columns , values ) )
+
+
+class VillageDirectory :
+    """
+    أسماء القرى -> id محملة مرة واحدة (استعلام واحد)، بعد توحيد الكتابة العربية.
+    الاسم المكرر في أكثر من ناحية يحتاج عمود subarea أو village_id.
+    """
+
+    def __init__( self , allowed_ids = None ) :
+        self.allowed_ids = allowed_ids
+        self.by_name = defaultdict( set )
+        self.by_name_subarea = {}
+        for village_id , name , subarea_name in Village.objects.values_list( "id" , "name" , "subarea__name" ) :
+            self.by_name[normalize( name ).strip()].add( village_id )
+            self.by_name_subarea[( normalize( name ).strip() , normalize( subarea_name ).strip() )] = village_id
+        self.ids = { village_id for ids in self.by_name.values() for village_id in ids }
+
+    def resolve( self , row : dict ) :
+        """(village_id, None) أو (None, رسالة خطأ)"""
+        raw_id = row.get( "village_id" )
+        # openpyxl يقرأ الخلايا الرقمية كـ float (5.0)
+        if isinstance( raw_id , float ) and raw_id.is_integer() :
+            raw_id = int( raw_id )
+        if raw_id not in ( None , "" ) :
+            village_id = int( raw_id ) if str( raw_id ).strip().isdigit() else None
+            if village_id not in self.ids :
+                return None , f"village_id غير موجود: {raw_id}"
+        else :
+            name = normalize( row.get( "village" ) ).strip()
+            if not name :
+                return None , "عمود village أو village_id مطلوب"
+
+            subarea = normalize( row.get( "subarea" ) ).strip()
+            if subarea :
+                village_id = self.by_name_subarea.get( ( name , subarea ) )
+            else :
+                matches = self.by_name.get( name , () )
+                if len( matches ) > 1 :
+                    return None , f"اسم القرية مكرر، حدد subarea: {row.get( 'village' )}"
+                village_id = next( iter( matches ) , None )
+
+            if village_id is None :
+                return None , f"قرية غير معروفة: {row.get( 'village' )}"
+
+        if self.allowed_ids is not None and village_id not in self.allowed_ids :
+            return None , "القرية خارج نطاقك"
+        return village_id , None
+
+
+class Importer :
+    """
+    استيراد ملف CSV / XLSX إلى أحد جداول IMPORT_MODELS مع upsert على المفتاح الطبيعي.
+    الصفوف تُقرأ تدفقاً وتُعالج على دفعات ثابتة الحجم: تحويل القيم، ثم bulk_create(update_conflicts)
+    داخل معاملة لكل دفعة، ثم خطافات ما بعد الكتابة (مجاميع الديموغرافيا مثلاً).
+    الاستيراد يكتب مباشرة دون طلبات تعديل (ModificationRequest) عن قصد: يتطلب صلاحية create و update معاً،
+    ولكل دفعة سجل AuditLog واحد (entity_id = 0) فيه مفاتيح الصفوف والحقول المكتوبة.
+    """
+
+    def __init__( self , entity_type , user_id = None , allowed_village_ids = None , batch_size = BATCH_SIZE , dry_run = False ) :
+        if entity_type not in IMPORT_MODELS :
+            raise ImportFailed( f"نوع غير مدعوم للاستيراد: {entity_type}" )
+
+        self.entity_type = entity_type
+        self.model = IMPORT_MODELS[entity_type]
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.villages = VillageDirectory( allowed_village_ids )
+
+        self.key_fields = natural_key( self.model )
+        self.fields = {
+            field.name : field for field in self.model._meta.concrete_fields
+            if not field.primary_key and field.name not in PROTECTED_FIELDS and field.name != "village"
+        }
+        # تُحدد من أعمدة الملف عند أول صف
+        self.update_fields = None
+
+        self.has_created_by = any( field.name == "created_by" for field in self.model._meta.concrete_fields )
+        if self.has_created_by and user_id is None :
+            raise ImportFailed( "created_by مطلوب لهذا الجدول" )
+        # IndustrialZone.created_at / updated_at أرقام (timestamp) وليست تواريخ
+        self.int_timestamps = isinstance( self.model._meta.get_field( "updated_at" ) , models.IntegerField )
+
+        self.stats = { "rows" : 0 , "written" : 0 , "invalid" : 0 }
+        self.errors = []
+
+    def _error( self , line , message ) :
+        self.stats["invalid"] += 1
+        if len( self.errors ) < MAX_REPORTED_ERRORS :
+            self.errors.append( { "row" : line , "error" : message } )
+
+    def _clean( self , field , value ) :
+        if isinstance( value , str ) :
+            value = value.strip()
+        if value == "" :
+            value = None
+        if isinstance( field , models.JSONField ) and isinstance( value , str ) :
+            value = json.loads( value )
+        if isinstance( value , float ) and value.is_integer() and isinstance( field , models.IntegerField ) :
+            value = int( value )
+        return field.clean( value , None )
+
+    def build( self , line , row ) :
+        """صف الملف -> instance غير محفوظ، أو None بعد تسجيل الخطأ"""
+        village_id , error = self.villages.resolve( row )
+        if error :
+            self._error( line , error )
+            return None
+
+        values = { "village_id" : village_id }
+        for name , field in self.fields.items() :
+            if name not in row :
+                if not field.null and not field.has_default() :
+                    self._error( line , f"العمود {name} مطلوب" )
+                    return None
+                continue
+            try :
+                values[field.attname] = self._clean( field , row[name] )
+            except ( ValidationError , ValueError ) as exc :
+                messages = exc.messages if isinstance( exc , ValidationError ) else [str( exc )]
+                self._error( line , f"{name}: {' '.join( messages )}" )
+                return None
+
+        if self.has_created_by :
+            values["created_by_id"] = self.user_id
+        if self.int_timestamps :
+            values["created_at"] = values["updated_at"] = int( time.time() )
+        return self.model( **values )
+
+    def set_columns( self , columns ) :
+        """الحقول التي يحدثها الـ upsert: أعمدة الملف فقط، فالعمود الغائب لا يمحو القيمة الموجودة"""
+        self.update_fields = [name for name in self.fields if name in columns and name not in self.key_fields]
+        self.update_fields.append( "updated_at" )
+
+    def run( self , stream , file_format ) -> dict :
+        batch = {}
+        for line , row in iter_rows( stream , file_format ) :
+            if self.update_fields is None :
+                self.set_columns( row )
+            self.stats["rows"] += 1
+            instance = self.build( line , row )
+            if instance is None :
+                continue
+
+            # نفس المفتاح مرتين في الدفعة: آخر صف هو المعتمد
+            batch[self.key_of( instance )] = instance
+            if len( batch ) >= self.batch_size :
+                self.write( list( batch.values() ) )
+                batch = {}
+
+        if batch :
+            self.write( list( batch.values() ) )
+        return { **self.stats , "errors" : self.errors }
+
+    def key_of( self , instance ) -> tuple :
+        return tuple( getattr( instance , self.model._meta.get_field( name ).attname ) for name in self.key_fields )
+
+    def write( self , instances ) :
+        if self.dry_run :
+            self.stats["written"] += len( instances )
+            return
+
+        # NULL في المفتاح (موسم AgriculturalStatus السنوي) لا يتعارض في القيد الفريد،
+        # فهذه الصفوف تُطابق يدوياً مع الموجود
+        keyed = [instance for instance in instances if None not in self.key_of( instance )]
+        null_keyed = [instance for instance in instances if None in self.key_of( instance )]
+
+        with transaction.atomic() :
+            if keyed :
+                self.model._base_manager.bulk_create(
+                    keyed , batch_size = 1000 ,
+                    update_conflicts = True , unique_fields = self.key_fields , update_fields = self.update_fields ,
+                )
+            if null_keyed :
+                self.upsert_null_keys( null_keyed )
+            after_bulk_update( self.model , instances , {} )
+            if self.user_id is not None :
+                audit_writer.log( self.audit_entry( instances ) )
+
+        self.stats["written"] += len( instances )
+
+    def audit_entry( self , instances ) :
+        """سجل الدفعة: لا كيان واحد لها، فالمفاتيح الطبيعية للصفوف في new_data"""
+        return AuditLog(
+            user_id = self.user_id , entity_type = self.entity_type , entity_id = 0 , action = AuditLog.Action.UPDATE ,
+            new_data = {
+                "source" : "import" ,
+                "key_fields" : self.key_fields ,
+                "keys" : [list( self.key_of( instance ) ) for instance in instances] ,
+                "fields" : self.update_fields ,
+            } ,
+        )
+
+    def upsert_null_keys( self , instances ) :
+        """upsert يدوي: قراءة الصفوف الموجودة بنفس المفاتيح (مع IS NULL) ثم bulk_update / bulk_create"""
+        condition = Q()
+        for name in self.key_fields :
+            attname = self.model._meta.get_field( name ).attname
+            values = { getattr( instance , attname ) for instance in instances }
+            field_condition = Q( **{ f"{attname}__in" : values - { None } } )
+            if None in values :
+                field_condition |= Q( **{ f"{attname}__isnull" : True } )
+            condition &= field_condition
+
+        existing = {}
+        for row in self.model._base_manager.filter( condition ).order_by( "id" ) :
+            existing.setdefault( self.key_of( row ) , row.pk )
+
+        updated , created = [] , []
+        for instance in instances :
+            instance.pk = existing.get( self.key_of( instance ) )
+            ( created if instance.pk is None else updated ).append( instance )
+
+        if created :
+            self.model._base_manager.bulk_create( created , batch_size = 1000 )
+        if updated :
+            for instance in updated :
+                touch( instance )
+            self.model._base_manager.bulk_update( updated , self.update_fields , batch_size = 500 )
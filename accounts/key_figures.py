@@ -0,0 +1,101 @@
+from collections import namedtuple
+
+from django.apps import apps as global_apps
+from django.db import transaction
+
+from .models import (
+    EthnicityKeyFigure,
+    KeyFigureIndex,
+    VillageEthnicity,
+    VillageSect,
+    VillageSectKeyFigure,
+    VillageTribe,
+    VillageTribeKeyFigure,
+)
+
+Source = namedtuple( "Source" , [ "link_model" , "parent_field" , "parent_model" , "dimension_field" , "has_year" ] )
+
+SOURCES = {
+    KeyFigureIndex.Dimension.SECT : Source( VillageSectKeyFigure , "village_sect" , VillageSect , "sect" , False ) ,
+    KeyFigureIndex.Dimension.ETHNICITY : Source( EthnicityKeyFigure , "village_ethnicity" , VillageEthnicity , "ethnicity" , True ) ,
+    KeyFigureIndex.Dimension.TRIBE : Source( VillageTribeKeyFigure , "village_tribe" , VillageTribe , "tribe" , True ) ,
+}
+
+LINK_DIMENSIONS = { source.link_model : dimension for dimension , source in SOURCES.items() }
+PARENT_DIMENSIONS = { source.parent_model : dimension for dimension , source in SOURCES.items() }
+
+
+def _parent_values( source , parent ) -> dict :
+    return {
+        "village_id" : parent["village_id"] ,
+        "dimension_id" : parent[f"{source.dimension_field}_id"] ,
+        "year" : parent["year"] if source.has_year else None ,
+    }
+
+
+def _parent_fields( source ) :
+    return ( "id" , "village_id" , f"{source.dimension_field}_id" ) + ( ( "year" , ) if source.has_year else () )
+
+
+def _link_rows( dimension , links , model = KeyFigureIndex ) :
+    """صفوف KeyFigureIndex من QuerySet لجدول الربط، باستعلام واحد عبر الأب"""
+    source = SOURCES[dimension]
+    prefix = source.parent_field
+    fields = [f"{prefix}__{field}" for field in _parent_fields( source )]
+
+    for row in links.values( "id" , "person_id" , *fields ).iterator( chunk_size = 2000 ) :
+        parent = { field : row[f"{prefix}__{field}"] for field in _parent_fields( source ) }
+        yield model(
+            person_id = row["person_id"] ,
+            dimension = dimension ,
+            source_id = row["id"] ,
+            parent_id = parent["id"] ,
+            **_parent_values( source , parent ) ,
+        )
+
+
+@transaction.atomic
+def sync_links( dimension , link_ids ) :
+    """إعادة كتابة صفوف الفهرس لروابط معينة (بعد الحفظ، أو بعد bulk_create التي لا ترسل إشارات)"""
+    link_ids = list( link_ids )
+    KeyFigureIndex.objects.filter( dimension = dimension , source_id__in = link_ids ).delete()
+    links = SOURCES[dimension].link_model.objects.filter( id__in = link_ids )
+    KeyFigureIndex.objects.bulk_create( list( _link_rows( dimension , links ) ) , batch_size = 2000 )
+
+
+def remove_links( dimension , link_ids ) :
+    KeyFigureIndex.objects.filter( dimension = dimension , source_id__in = list( link_ids ) ).delete()
+
+
+def sync_parent( dimension , parent ) :
+    """تغيير القرية/السنة/الطائفة في الأب ينعكس على كل روابطه بتحديث واحد"""
+    source = SOURCES[dimension]
+    values = { field : getattr( parent , field ) for field in _parent_fields( source ) }
+    KeyFigureIndex.objects.filter( dimension = dimension , parent_id = parent.pk ).update( **_parent_values( source , values ) )
+
+
+@transaction.atomic
+def rebuild( apps = global_apps ) -> int :
+    """إعادة بناء الفهرس كاملاً. apps: سجل النماذج التاريخي عند الاستدعاء من migration"""
+    index_model = apps.get_model( "accounts" , "KeyFigureIndex" )
+    index_model.objects.all().delete()
+
+    total = 0
+    for dimension , source in SOURCES.items() :
+        links = apps.get_model( "accounts" , source.link_model.__name__ ).objects.all()
+        rows = list( _link_rows( dimension , links , index_model ) )
+        index_model.objects.bulk_create( rows , batch_size = 2000 )
+        total += len( rows )
+    return total
+
+
+def key_figure_payload( row ) -> dict :
+    return {
+        "person_id" : row.person_id ,
+        "person" : row.person.name ,
+        "village_id" : row.village_id ,
+        "village" : row.village.name ,
+        "dimension" : row.dimension ,
+        "dimension_id" : row.dimension_id ,
+        "year" : row.year ,
+    }
@@ -0,0 +1,126 @@
+import gzip
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from accounts import payloads
+from accounts.models import AuditLog, PayloadFormat
+
+ARCHIVE_DIR = getattr( settings , "AUDIT_ARCHIVE_DIR" , settings.BASE_DIR / "archive" / "audit" )
+
+MATERIALIZE_FIELDS = [ "payload_format" , "base" , "snapshot_depth" , "old_data" , "new_data" ]
+
+
+def months_ago( now , months : int ) :
+    """بداية الشهر قبل months شهراً (كل شهر يؤرشف كاملاً)"""
+    month_index = now.year * 12 + now.month - 1 - months
+    return now.replace(
+        year = month_index // 12 , month = month_index % 12 + 1 , day = 1 ,
+        hour = 0 , minute = 0 , second = 0 , microsecond = 0 ,
+    )
+
+
+def archive_row( row ) -> dict :
+    return {
+        "id" : row.id ,
+        "user_id" : row.user_id ,
+        "entity_type" : row.entity_type ,
+        "entity_id" : row.entity_id ,
+        "action" : row.action ,
+        "old_data" : row.old_data ,
+        "new_data" : row.new_data ,
+        "created_at" : row.created_at ,
+    }
+
+
+class Command( BaseCommand ) :
+    help = "نقل سجلات AuditLog الأقدم من N شهراً إلى ملفات JSONL مضغوطة لكل شهر ثم حذفها على دفعات"
+
+    def add_arguments( self , parser ) :
+        parser.add_argument( "--months" , type = int , default = 12 , help = "الاحتفاظ بآخر N شهراً في الجدول" )
+        parser.add_argument( "--output-dir" , default = str( ARCHIVE_DIR ) )
+        parser.add_argument( "--batch-size" , type = int , default = 5000 )
+        parser.add_argument( "--sleep" , type = float , default = 0 , help = "ثواني انتظار بين الدفعات" )
+        parser.add_argument( "--dry-run" , action = "store_true" , help = "عدّ السجلات فقط بدون كتابة أو حذف" )
+
+    def handle( self , *args , **options ) :
+        if options["months"] < 1 :
+            raise CommandError( "--months يجب أن يكون 1 أو أكثر" )
+
+        cutoff = months_ago( timezone.localtime() , options["months"] )
+        old_rows = AuditLog.objects.filter( created_at__lt = cutoff )
+
+        if options["dry_run"] :
+            self.stdout.write( f"{old_rows.count()} audit rows before {cutoff:%Y-%m-%d}" )
+            return
+
+        output_dir = Path( options["output_dir"] )
+        archived = materialized = 0
+        files = set()
+
+        while True :
+            # كل دفعة تُحذف بعد أرشفتها، فنبدأ دائماً من أقدم id متبقٍ
+            rows = list( old_rows.order_by( "id" )[:options["batch_size"]] )
+            if not rows :
+                break
+
+            payloads.expand( rows )
+            files |= self.write_archive( output_dir , rows )
+            materialized += self.delete_rows( rows )
+            archived += len( rows )
+
+            if options["sleep"] :
+                time.sleep( options["sleep"] )
+
+        self.stdout.write( self.style.SUCCESS(
+            f"archived {archived} audit rows before {cutoff:%Y-%m-%d} into {len( files )} files, "
+            f"materialized {materialized} dependent rows"
+        ) )
+
+    def write_archive( self , output_dir , rows ) -> set :
+        """
+        إلحاق الدفعة بملف الشهر: <dir>/<year>/auditlog-<year>-<month>.jsonl.gz
+        (كل دفعة عضو gzip مستقل، و gzip.open يقرأ الملف كاملاً).
+        الكتابة قبل الحذف: التشغيل المنقطع قد يكرر أسطراً، و id يكفي لإزالتها.
+        """
+        by_month = defaultdict( list )
+        for row in rows :
+            created_at = timezone.localtime( row.created_at )
+            by_month[( created_at.year , created_at.month )].append( row )
+
+        paths = set()
+        for ( year , month ) , month_rows in by_month.items() :
+            path = output_dir / f"{year:04d}" / f"auditlog-{year:04d}-{month:02d}.jsonl.gz"
+            path.parent.mkdir( parents = True , exist_ok = True )
+
+            with gzip.open( path , "at" , encoding = "utf-8" ) as archive :
+                for row in month_rows :
+                    archive.write( json.dumps( archive_row( row ) , cls = DjangoJSONEncoder , ensure_ascii = False ) )
+                    archive.write( "\n" )
+            paths.add( path )
+        return paths
+
+    @transaction.atomic
+    def delete_rows( self , rows ) -> int :
+        """
+        الصفوف التي تعتمد (base) على صفوف الدفعة وتبقى في الجدول تتحول إلى نسخ كاملة أولاً،
+        ثم تُحذف الدفعة.
+        """
+        ids = [row.id for row in rows]
+        dependents = list(
+            AuditLog.objects.filter( base_id__in = ids , payload_format = PayloadFormat.DIFF ).exclude( id__in = ids )
+        )
+        payloads.expand( dependents )
+        AuditLog.objects.bulk_update( dependents , MATERIALIZE_FIELDS , batch_size = 500 )
+
+        # base بين صفوف الدفعة نفسها محمي (PROTECT)، نفصله قبل الحذف
+        AuditLog.objects.filter( id__in = ids ).update( base = None )
+        AuditLog.objects.filter( id__in = ids ).delete()
+        return len( dependents )
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from accounts import payloads
+from accounts.models import AuditLog, ModificationRequest, PayloadFormat
+
+MODELS = {
+    "auditlog" : AuditLog ,
+    "modificationrequest" : ModificationRequest ,
+}
+
+UPDATE_FIELDS = [ "payload_format" , "base" , "snapshot_depth" , "old_data" , "new_data" ]
+
+
+class Command( BaseCommand ) :
+    help = (
+        "تحويل old_data / new_data الكاملة في AuditLog و ModificationRequest إلى فروقات فوق أقرب نسخة كاملة، "
+        "وإعادة كتابة سلاسل الفروقات القديمة بنفس الطريقة، على دفعات"
+    )
+
+    def add_arguments( self , parser ) :
+        parser.add_argument( "--model" , choices = [ *MODELS , "all" ] , default = "all" )
+        parser.add_argument( "--chunk-size" , type = int , default = 2000 )
+
+    def handle( self , *args , **options ) :
+        names = MODELS if options["model"] == "all" else [options["model"]]
+        for name in names :
+            converted , total = self.compact( MODELS[name] , options["chunk_size"] )
+            self.stdout.write( self.style.SUCCESS( f"{name}: converted {converted} of {total} rows" ) )
+
+    def compact( self , model , chunk_size ) :
+        """
+        نمشي على الصفوف مرتبة (entity_type, entity_id, id) بمؤشر keyset،
+        ونحتفظ فقط بآخر نسخة كاملة للكيان الحالي وعدد الفروقات فوقها.
+        كل صف يُعاد ترميزه فوق تلك النسخة، فالفروقات القديمة المتسلسلة (base فرق آخر) تصبح قفزة واحدة.
+        """
+        cursor = None
+        current = None  # (entity key, snapshot id, snapshot new_state, depth)
+        converted = total = 0
+
+        while True :
+            rows = model._base_manager.order_by( "entity_type" , "entity_id" , "id" )
+            if cursor :
+                entity_type , entity_id , row_id = cursor
+                rows = rows.filter(
+                    Q( entity_type__gt = entity_type )
+                    | Q( entity_type = entity_type , entity_id__gt = entity_id )
+                    | Q( entity_type = entity_type , entity_id = entity_id , id__gt = row_id )
+                )
+            rows = list( rows[:chunk_size] )
+            if not rows :
+                break
+
+            resolved = payloads.states( model , [row.id for row in rows if row.payload_format == PayloadFormat.DIFF] )
+            changed = []
+            for row in rows :
+                key = ( row.entity_type , row.entity_id )
+                stored = ( row.payload_format , row.base_id , row.snapshot_depth )
+                if row.payload_format == PayloadFormat.DIFF :
+                    row.old_data , row.new_data = resolved[row.id]
+                    row.payload_format , row.base_id , row.snapshot_depth = PayloadFormat.FULL , None , 0
+
+                if not ( current and current[0] == key and payloads.encode( row , current[1] , current[2] , current[3] ) ) :
+                    current = ( key , row.id , row.new_data , 0 )
+                else :
+                    current = ( *current[:3] , row.snapshot_depth )
+
+                if ( row.payload_format , row.base_id , row.snapshot_depth ) != stored :
+                    changed.append( row )
+
+            with transaction.atomic() :
+                model._base_manager.bulk_update( changed , UPDATE_FIELDS , batch_size = 500 )
+
+            converted += len( changed )
+            total += len( rows )
+            last = rows[-1]
+            cursor = ( last.entity_type , last.entity_id , last.id )
+
+        return converted , total
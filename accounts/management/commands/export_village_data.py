@@ -0,0 +1,27 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from accounts.exporter import CHUNK_SIZE, EXPORT_MODELS, FORMATS, stream_export
+
+
+class Command( BaseCommand ) :
+    help = "تصدير جداول القرى كاملة إلى ملفات CSV / NDJSON كتدفق (للتصدير الليلي)"
+
+    def add_arguments( self , parser ) :
+        parser.add_argument( "entity_type" , choices = [ *EXPORT_MODELS , "all" ] )
+        parser.add_argument( "--output-dir" , default = "." )
+        parser.add_argument( "--format" , choices = FORMATS , default = "csv" )
+        parser.add_argument( "--chunk-size" , type = int , default = CHUNK_SIZE )
+
+    def handle( self , *args , **options ) :
+        names = EXPORT_MODELS if options["entity_type"] == "all" else [options["entity_type"]]
+        output_dir = Path( options["output_dir"] )
+        output_dir.mkdir( parents = True , exist_ok = True )
+
+        for name in names :
+            path = output_dir / f"{name}.{options['format']}"
+            with open( path , "w" , encoding = "utf-8" , newline = "" ) as output :
+                for part in stream_export( EXPORT_MODELS[name].objects.all() , options["format"] , options["chunk_size"] ) :
+                    output.write( part )
+            self.stdout.write( self.style.SUCCESS( f"{name}: {path}" ) )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from accounts import dedup
+
+
+class Command( BaseCommand ) :
+    help = "كشف الأشخاص المكررين (الجدد منذ آخر تشغيل فقط) وكتابة الأزواج المرشحة في PersonDuplicateCandidate"
+
+    def add_arguments( self , parser ) :
+        parser.add_argument( "--batch-size" , type = int , default = 1000 )
+        parser.add_argument( "--full" , action = "store_true" , help = "إعادة المعالجة من البداية (الأزواج المراجعة تبقى)" )
+
+    def handle( self , *args , **options ) :
+        dedup_run = dedup.run( batch_size = options["batch_size"] , full = options["full"] )
+        self.stdout.write( self.style.SUCCESS(
+            f"processed {dedup_run.processed} persons, compared {dedup_run.compared_pairs} pairs, "
+            f"found {dedup_run.candidates} candidates"
+        ) )
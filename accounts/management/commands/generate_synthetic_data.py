@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.synthetic import GenerationFailed, SyntheticDataGenerator, rebuild_derived
+
+
+class Command( BaseCommand ) :
+    help = (
+        "توليد بيانات تجريبية لكل الجداول بحجم قابل للتعديل لاختبار الأداء "
+        "(مثلاً --villages 20000 --persons 1000000 --years 10). نفس --seed ونفس الخيارات تعطي نفس البيانات"
+    )
+
+    def add_arguments( self , parser ) :
+        parser.add_argument( "--seed" , type = int , default = 1 )
+        parser.add_argument( "--villages" , type = int , default = 200 )
+        parser.add_argument( "--persons" , type = int , default = 10000 )
+        parser.add_argument( "--years" , type = int , default = 3 )
+        parser.add_argument( "--end-year" , type = int , help = "آخر سنة في البيانات السنوية (الافتراضي السنة الحالية)" )
+        parser.add_argument( "--users" , type = int , default = 20 )
+        parser.add_argument( "--audit-logs" , type = int , help = "الافتراضي بعدد الأشخاص" )
+        parser.add_argument( "--modification-requests" , type = int , help = "الافتراضي عُشر عدد الأشخاص" )
+        parser.add_argument( "--batch-size" , type = int , default = 5000 )
+        parser.add_argument(
+            "--skip-derived" , action = "store_true" ,
+            help = "بدون إعادة بناء الجداول المشتقة (المجاميع، فهرس البحث، الشخصيات المؤثرة، كشف التكرار)" ,
+        )
+
+    def handle( self , *args , **options ) :
+        if options["villages"] < 1 or options["years"] < 1 :
+            raise CommandError( "--villages و --years يجب أن تكون 1 على الأقل" )
+
+        started = time.monotonic()
+        log = lambda message : self.stdout.write( f"[{time.monotonic() - started:7.1f}s] {message}" )
+
+        generator = SyntheticDataGenerator(
+            seed = options["seed"] , villages = options["villages"] , persons = options["persons"] ,
+            years = options["years"] , end_year = options["end_year"] , users = options["users"] ,
+            audit_logs = options["audit_logs"] , modification_requests = options["modification_requests"] ,
+            batch_size = options["batch_size"] , log = log ,
+        )
+        try :
+            counts = generator.run()
+        except GenerationFailed as exc :
+            raise CommandError( str( exc ) )
+
+        if not options["skip_derived"] :
+            counts.update( rebuild_derived( log ) )
+
+        self.stdout.write( self.style.SUCCESS(
+            f"generated {sum( counts.values() )} rows in {time.monotonic() - started:.1f}s"
+        ) )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.importer import BATCH_SIZE, FORMATS, IMPORT_MODELS, Importer, ImportFailed, detect_format
+from accounts.models import User
+
+
+class Command( BaseCommand ) :
+    help = "استيراد ملف CSV / XLSX سنوي لكل قرية (ثروة حيوانية، ديموغرافيا، ...) مع تحديث الصفوف الموجودة بنفس المفتاح"
+
+    def add_arguments( self , parser ) :
+        parser.add_argument( "entity_type" , choices = list( IMPORT_MODELS ) )
+        parser.add_argument( "path" )
+        parser.add_argument( "--user" , required = True , help = "اسم المستخدم الذي يسجل كـ created_by" )
+        parser.add_argument( "--format" , choices = FORMATS , help = "الافتراضي حسب امتداد الملف" )
+        parser.add_argument( "--batch-size" , type = int , default = BATCH_SIZE )
+        parser.add_argument( "--dry-run" , action = "store_true" , help = "تحقق فقط بدون كتابة" )
+
+    def handle( self , *args , **options ) :
+        user = User.objects.filter( username = options["user"] ).first()
+        if user is None :
+            raise CommandError( f"المستخدم غير موجود: {options['user']}" )
+
+        try :
+            file_format = detect_format( options["path"] , options["format"] )
+            importer = Importer(
+                options["entity_type"] , user_id = user.id ,
+                batch_size = options["batch_size"] , dry_run = options["dry_run"] ,
+            )
+            with open( options["path"] , "rb" ) as stream :
+                result = importer.run( stream , file_format )
+        except ( ImportFailed , OSError ) as exc :
+            raise CommandError( str( exc ) )
+
+        for error in result["errors"] :
+            self.stderr.write( f"row {error['row']}: {error['error']}" )
+        self.stdout.write( self.style.SUCCESS(
+            f"{result['rows']} rows, {result['written']} written, {result['invalid']} invalid"
+            + ( " (dry run)" if options["dry_run"] else "" )
+        ) )
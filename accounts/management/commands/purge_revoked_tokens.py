@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command( BaseCommand ) :
+    help = "حذف التوكنات المنتهية (Outstanding + Blacklisted) على دفعات"
+
+    def add_arguments( self , parser ) :
+        parser.add_argument( "--batch-size" , type = int , default = 5000 )
+        parser.add_argument( "--sleep" , type = float , default = 0 , help = "ثواني انتظار بين الدفعات لتخفيف الضغط" )
+
+    def handle( self , *args , **options ) :
+        batch_size = options["batch_size"]
+        now = timezone.now()
+        last_id = 0
+        deleted_outstanding = deleted_blacklisted = 0
+
+        while True :
+            # نمشي على المفتاح الأساسي حتى لا نعيد مسح الجدول من البداية بكل دفعة
+            ids = list(
+                OutstandingToken.objects.filter( id__gt = last_id , expires_at__lt = now )
+                .order_by( "id" )
+                .values_list( "id" , flat = True )[:batch_size]
+            )
+            if not ids :
+                break
+
+            with transaction.atomic() :
+                deleted_blacklisted += BlacklistedToken.objects.filter( token_id__in = ids ).delete()[0]
+                deleted_outstanding += OutstandingToken.objects.filter( id__in = ids ).delete()[0]
+
+            last_id = ids[-1]
+            if options["sleep"] :
+                time.sleep( options["sleep"] )
+
+        self.stdout.write( self.style.SUCCESS(
+            f"deleted {deleted_outstanding} outstanding and {deleted_blacklisted} blacklisted tokens"
+        ) )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import SyncTombstone
+from accounts.sync import TOMBSTONE_RETENTION
+
+
+class Command( BaseCommand ) :
+    help = "حذف سجلات الحذف (SyncTombstone) الأقدم من مدة الاحتفاظ؛ العملاء الأقدم منها يعيدون التحميل كاملاً"
+
+    def add_arguments( self , parser ) :
+        parser.add_argument( "--batch-size" , type = int , default = 5000 )
+
+    def handle( self , *args , **options ) :
+        cutoff = timezone.now() - TOMBSTONE_RETENTION
+        deleted = 0
+
+        while True :
+            ids = list(
+                SyncTombstone.objects.filter( deleted_at__lt = cutoff )
+                .order_by( "id" ).values_list( "id" , flat = True )[:options["batch_size"]]
+            )
+            if not ids :
+                break
+            deleted += SyncTombstone.objects.filter( id__in = ids ).delete()[0]
+
+        self.stdout.write( self.style.SUCCESS( f"deleted {deleted} sync tombstones" ) )
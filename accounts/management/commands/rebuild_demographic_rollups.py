@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts import rollups
+
+
+class Command( BaseCommand ) :
+    help = "إعادة حساب جدول DemographicRollup بالكامل من DemographicData"
+
+    def handle( self , *args , **options ) :
+        total = rollups.rebuild()
+        self.stdout.write( self.style.SUCCESS( f"rebuilt {total} demographic rollups" ) )
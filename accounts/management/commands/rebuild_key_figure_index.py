@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts import key_figures
+
+
+class Command( BaseCommand ) :
+    help = "إعادة بناء جدول KeyFigureIndex بالكامل من جداول ربط الطوائف والأعراق والعشائر"
+
+    def handle( self , *args , **options ) :
+        total = key_figures.rebuild()
+        self.stdout.write( self.style.SUCCESS( f"indexed {total} key figures" ) )
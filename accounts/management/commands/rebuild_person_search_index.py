@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts import search
+
+
+class Command( BaseCommand ) :
+    help = "إعادة بناء فهرس البحث PersonSearchToken بالكامل من Person"
+
+    def add_arguments( self , parser ) :
+        parser.add_argument( "--chunk-size" , type = int , default = 2000 )
+
+    def handle( self , *args , **options ) :
+        total = search.rebuild( chunk_size = options["chunk_size"] )
+        self.stdout.write( self.style.SUCCESS( f"indexed {total} person search tokens" ) )
@@ -0,0 +1,155 @@
+import threading
+import time
+
+from django.conf import settings
+
+# حدود مدرج زمن الاستجابة بالثواني
+LATENCY_BUCKETS = ( 0.005 , 0.01 , 0.025 , 0.05 , 0.1 , 0.25 , 0.5 , 1.0 , 2.5 , 5.0 , 10.0 )
+
+# نسبة الطلبات المقاسة: 0 يعطل القياس كلياً، 1 يقيس كل الطلبات
+SAMPLE_RATE = getattr( settings , "METRICS_SAMPLE_RATE" , 1.0 )
+# ترويسة Server-Timing على الطلبات المقاسة (تكشف زمن وعدد استعلامات القاعدة لكل عميل، للتطوير فقط)
+SERVER_TIMING = getattr( settings , "METRICS_SERVER_TIMING" , False )
+# من يمكنه قراءة /metrics بدون توكن (فارغ افتراضياً: خلف reverse proxy على نفس الجهاز
+# كل الطلبات الخارجية تصل بـ REMOTE_ADDR=127.0.0.1، فلا تُضاف إلا لعناوين لا يمر منها الـ proxy)
+ALLOWED_IPS = frozenset( getattr( settings , "METRICS_ALLOWED_IPS" , [] ) )
+# Authorization: Bearer <token> لقراءة /metrics من خارج ALLOWED_IPS (None = معطل)
+TOKEN = getattr( settings , "METRICS_TOKEN" , None )
+
+
+class QueryTimer :
+    """connection.execute_wrapper: عدد الاستعلامات ومجموع زمنها داخل الطلب"""
+
+    __slots__ = ( "count" , "duration" )
+
+    def __init__( self ) :
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__( self , execute , sql , params , many , context ) :
+        start = time.perf_counter()
+        try :
+            return execute( sql , params , many , context )
+        finally :
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class Series :
+    __slots__ = ( "buckets" , "count" , "duration" , "queries" , "db_time" , "response_bytes" , "statuses" )
+
+    def __init__( self ) :
+        self.buckets = [0] * len( LATENCY_BUCKETS )
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.response_bytes = 0
+        self.statuses = {}
+
+    def copy( self ) :
+        other = Series()
+        for name in self.__slots__ :
+            value = getattr( self , name )
+            setattr( other , name , value.copy() if isinstance( value , ( list , dict ) ) else value )
+        return other
+
+
+class MetricsRegistry :
+    """
+    مقاييس الطلبات مجمعة داخل العملية لكل (اسم المسار، الطريقة).
+    التسجيل تحت قفل واحد وبعمليات جمع فقط، والتحويل لصيغة Prometheus عند القراءة.
+    """
+
+    def __init__( self ) :
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe( self , view , method , status , duration , queries , db_time , response_bytes ) :
+        status_class = f"{status // 100}xx"
+        with self._lock :
+            series = self._series.get( ( view , method ) )
+            if series is None :
+                series = self._series[( view , method )] = Series()
+
+            for index , bound in enumerate( LATENCY_BUCKETS ) :
+                if duration <= bound :
+                    series.buckets[index] += 1
+                    break
+            series.count += 1
+            series.duration += duration
+            series.queries += queries
+            series.db_time += db_time
+            series.response_bytes += response_bytes
+            series.statuses[status_class] = series.statuses.get( status_class , 0 ) + 1
+
+    def snapshot( self ) -> dict :
+        with self._lock :
+            return { key : series.copy() for key , series in self._series.items() }
+
+    def reset( self ) :
+        with self._lock :
+            self._series = {}
+
+
+registry = MetricsRegistry()
+
+
+def _escape( value ) -> str :
+    return str( value ).replace( "\\" , "\\\\" ).replace( "\n" , "\\n" ).replace( '"' , '\\"' )
+
+
+def _labels( **labels ) -> str :
+    return "{" + ",".join( f'{name}="{_escape( value )}"' for name , value in labels.items() ) + "}"
+
+
+def _gauges( lines , prefix , stats ) :
+    for name , value in sorted( stats.items() ) :
+        if isinstance( value , ( int , float ) ) and not isinstance( value , bool ) :
+            lines.append( f"# TYPE {prefix}_{name} gauge" )
+            lines.append( f"{prefix}_{name} {value}" )
+
+
+def render() -> str :
+    """نص Prometheus (text exposition format 0.0.4)"""
+    from .audit import audit_writer
+    from .revocation import revocation_index
+
+    lines = [
+        "# HELP http_request_duration_seconds Request wall time per view",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    snapshot = sorted( registry.snapshot().items() )
+    for ( view , method ) , series in snapshot :
+        cumulative = 0
+        for bound , bucket in zip( LATENCY_BUCKETS , series.buckets ) :
+            cumulative += bucket
+            lines.append( f"http_request_duration_seconds_bucket{_labels( view = view , method = method , le = bound )} {cumulative}" )
+        lines.append( f"http_request_duration_seconds_bucket{_labels( view = view , method = method , le = '+Inf' )} {series.count}" )
+        lines.append( f"http_request_duration_seconds_sum{_labels( view = view , method = method )} {series.duration}" )
+        lines.append( f"http_request_duration_seconds_count{_labels( view = view , method = method )} {series.count}" )
+
+    lines += [ "# HELP http_requests_total Requests per view and status class" , "# TYPE http_requests_total counter" ]
+    for ( view , method ) , series in snapshot :
+        for status_class , total in sorted( series.statuses.items() ) :
+            lines.append( f"http_requests_total{_labels( view = view , method = method , status = status_class )} {total}" )
+
+    counters = (
+        ( "http_db_queries_total" , "DB queries executed per view" , "queries" ) ,
+        ( "http_db_duration_seconds_total" , "DB time per view" , "db_time" ) ,
+        ( "http_response_bytes_total" , "Response body bytes per view" , "response_bytes" ) ,
+    )
+    for name , help_text , attribute in counters :
+        lines += [ f"# HELP {name} {help_text}" , f"# TYPE {name} counter" ]
+        for ( view , method ) , series in snapshot :
+            lines.append( f"{name}{_labels( view = view , method = method )} {getattr( series , attribute )}" )
+
+    _gauges( lines , "token_revocation" , revocation_index.stats() )
+    _gauges( lines , "audit_writer" , audit_writer.stats() )
+    return "\n".join( lines ) + "\n"
+
+
+def is_authorized( request ) -> bool :
+    if request.META.get( "REMOTE_ADDR" ) in ALLOWED_IPS :
+        return True
+    return bool( TOKEN ) and request.META.get( "HTTP_AUTHORIZATION" ) == f"Bearer {TOKEN}"
@@ -0,0 +1,99 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+
+from . import metrics
+
+
+class MetricsMiddleware :
+    """
+    قياس كل طلب (أو عينة منه حسب METRICS_SAMPLE_RATE): الزمن، عدد استعلامات قاعدة البيانات وزمنها،
+    وحجم الاستجابة، مجمعة حسب اسم المسار (resolver_match.view_name) والطريقة.
+    بنسبة 0 يمرر الطلب مباشرة بدون أي عمل إضافي.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__( self , get_response ) :
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction( get_response )
+        if self.is_async :
+            markcoroutinefunction( self )
+
+    def sampled( self ) -> bool :
+        rate = metrics.SAMPLE_RATE
+        return rate >= 1 or ( rate > 0 and random.random() < rate )
+
+    def __call__( self , request ) :
+        if self.is_async :
+            return self.__acall__( request )
+        if not self.sampled() :
+            return self.get_response( request )
+
+        timer = metrics.QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper( timer ) :
+            response = self.get_response( request )
+        return self.finish( request , response , start , timer )
+
+    async def __acall__( self , request ) :
+        if not self.sampled() :
+            return await self.get_response( request )
+
+        # استعلامات الـ ORM غير المتزامنة تعمل في خيط آخر باتصال مختلف، فنقيس الزمن فقط
+        start = time.perf_counter()
+        response = await self.get_response( request )
+        return self.finish( request , response , start , None )
+
+    def finish( self , request , response , start , timer ) :
+        if not response.streaming :
+            self.record( request , response , time.perf_counter() - start , timer , len( response.content ) )
+            if metrics.SERVER_TIMING :
+                response["Server-Timing"] = self.server_timing( time.perf_counter() - start , timer )
+            return response
+
+        # الاستجابة المتدفقة (التصدير) تُنتج جسمها بعد خروجها من هنا: القياس عند انتهاء التكرار،
+        # والاستعلامات أثناء التكرار تُحسب على نفس الطلب. لا Server-Timing لأن الترويسات أُرسلت قبلها
+        content = response.streaming_content
+        if response.is_async :
+            response.streaming_content = self.measure_async( request , response , start , content )
+        else :
+            response.streaming_content = self.measure( request , response , start , timer , content )
+        return response
+
+    def measure( self , request , response , start , timer , content ) :
+        size = 0
+        try :
+            with connection.execute_wrapper( timer ) :
+                for chunk in content :
+                    size += len( chunk )
+                    yield chunk
+        finally :
+            self.record( request , response , time.perf_counter() - start , timer , size )
+
+    async def measure_async( self , request , response , start , content ) :
+        size = 0
+        try :
+            async for chunk in content :
+                size += len( chunk )
+                yield chunk
+        finally :
+            self.record( request , response , time.perf_counter() - start , None , size )
+
+    def record( self , request , response , duration , timer , size ) :
+        match = request.resolver_match
+        # اسم المسار وليس الرابط نفسه، حتى لا يتضخم عدد السلاسل بالأرقام في الروابط
+        view = match.view_name if match else "unmatched"
+
+        queries = timer.count if timer else 0
+        db_time = timer.duration if timer else 0.0
+        metrics.registry.observe( view , request.method , response.status_code , duration , queries , db_time , size )
+
+    def server_timing( self , duration , timer ) -> str :
+        parts = [f"app;dur={duration * 1000:.1f}"]
+        if timer :
+            parts.append( f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} queries"' )
+        return ", ".join( parts )
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_rename_area_subarea_area_rename_tybe_village_type_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_epoch',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
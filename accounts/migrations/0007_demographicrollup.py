@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+def populate_rollups(apps, schema_editor):
+    # بدون هذا أول تحديث تدريجي يكتب مجاميع جزئية للقرى/السنوات المعدلة فقط
+    from accounts import rollups
+
+    rollups.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_user_login_lookup_indexes'),
+        # ancestor_keys يقرأ جدول الإغلاق
+        ('locations', '0003_locationclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemographicRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('governorate', 'Governorate'), ('area', 'Area'), ('subarea', 'SubArea')], max_length=16)),
+                ('node_id', models.BigIntegerField()),
+                ('year', models.PositiveSmallIntegerField()),
+                ('village_count', models.IntegerField(default=0)),
+                ('population', models.BigIntegerField(default=0)),
+                ('number_of_families', models.BigIntegerField(default=0)),
+                ('totals', models.JSONField(default=dict)),
+                ('weighted', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('level', 'node_id', 'year'), name='uniq_demographic_rollup_node_year')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
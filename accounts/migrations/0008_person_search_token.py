@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_search_index(apps, schema_editor):
+    # بدون هذا البحث الجديد لا يجد أي شخص موجود قبل النشر
+    from accounts import search
+
+    search.rebuild(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_demographicrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('village_id', models.BigIntegerField()),
+                ('field', models.CharField(max_length=32)),
+                ('position', models.PositiveSmallIntegerField()),
+                ('weight', models.PositiveSmallIntegerField()),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='accounts.person')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'village_id'], name='person_search_token_idx')],
+            },
+        ),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_person_search_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DedupRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_person_id', models.BigIntegerField(default=0)),
+                ('processed', models.IntegerField(default=0)),
+                ('compared_pairs', models.BigIntegerField(default=0)),
+                ('candidates', models.IntegerField(default=0)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PersonBlockKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=96)),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='block_keys', to='accounts.person')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PersonDuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('reasons', models.JSONField(default=dict)),
+                ('cluster_id', models.BigIntegerField(db_index=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('dismissed', 'Dismissed')], default='pending', max_length=10)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('person_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_candidates_a', to='accounts.person')),
+                ('person_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_candidates_b', to='accounts.person')),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reviewed_duplicate_candidates', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'cluster_id'], name='person_dup_status_cluster_idx')],
+                'constraints': [models.UniqueConstraint(fields=('person_a', 'person_b'), name='uniq_person_duplicate_pair')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_key_figure_index(apps, schema_editor):
+    # بدون هذا لا تظهر الشخصيات المؤثرة الموجودة قبل النشر
+    from accounts import key_figures
+
+    key_figures.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_person_dedup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeyFigureIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('sect', 'Sect'), ('ethnicity', 'Ethnicity'), ('tribe', 'Tribe')], max_length=16)),
+                ('dimension_id', models.BigIntegerField()),
+                ('year', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('source_id', models.BigIntegerField()),
+                ('parent_id', models.BigIntegerField()),
+                ('person', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='key_figure_index', to='accounts.person')),
+                ('village', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='key_figure_index', to='accounts.village')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['village', 'dimension', 'year'], name='key_figure_village_idx'), models.Index(fields=['person', 'dimension'], name='key_figure_person_idx'), models.Index(fields=['dimension', 'parent_id'], name='key_figure_parent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'source_id'), name='uniq_key_figure_index_source')],
+            },
+        ),
+        migrations.RunPython(populate_key_figure_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_key_figure_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='modificationrequest',
+            index=models.Index(fields=['status', 'entity_type', 'created_at'], name='mod_request_queue_idx'),
+        ),
+    ]
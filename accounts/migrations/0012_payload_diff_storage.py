@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_modification_request_queue_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='base',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='dependents', to='accounts.auditlog'),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='payload_format',
+            field=models.CharField(choices=[('full', 'Full'), ('diff', 'Diff')], default='full', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='snapshot_depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='modificationrequest',
+            name='base',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='dependents', to='accounts.modificationrequest'),
+        ),
+        migrations.AddField(
+            model_name='modificationrequest',
+            name='payload_format',
+            field=models.CharField(choices=[('full', 'Full'), ('diff', 'Diff')], default='full', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='modificationrequest',
+            name='snapshot_depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
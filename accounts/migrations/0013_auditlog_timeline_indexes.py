@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_payload_diff_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['entity_type', 'entity_id', '-created_at', '-id'], name='audit_entity_timeline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='audit_user_activity_idx'),
+        ),
+    ]
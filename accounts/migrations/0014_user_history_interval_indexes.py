@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_auditlog_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userhistory',
+            index=models.Index(fields=['entity_type', 'entity_id', 'start_date', 'end_date', 'user'], name='user_history_entity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userhistory',
+            index=models.Index(condition=models.Q(('end_date__isnull', True)), fields=['entity_type', 'entity_id', 'user'], name='user_history_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userhistory',
+            index=models.Index(fields=['user', 'start_date', 'end_date'], name='user_history_user_idx'),
+        ),
+    ]
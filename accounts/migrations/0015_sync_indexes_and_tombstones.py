@@ -0,0 +1,97 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_user_history_interval_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(max_length=100)),
+                ('entity_id', models.BigIntegerField()),
+                ('village_id', models.BigIntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='agriculturalcrop',
+            index=models.Index(fields=['updated_at', 'id'], name='agri_crop_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agriculturalstatus',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='agri_status_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archaeologicalsite',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='arch_site_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commercialactivity',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='commercial_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='demographicdata',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='demographic_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='governmentdepartment',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='gov_dept_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='industrialfacility',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='ind_facility_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='industrialzone',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='ind_zone_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livestock',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='livestock_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='naturalasset',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='natural_asset_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='person',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='person_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tourismfacility',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='tourism_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='villageethnicity',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='village_eth_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='villagesect',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='village_sect_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='villagetribe',
+            index=models.Index(fields=['village', 'updated_at', 'id'], name='village_tribe_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['entity_type', 'village_id', 'id'], name='sync_tombstone_scope_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['deleted_at'], name='sync_tombstone_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_cache_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='modificationrequest',
+            index=models.Index(fields=['entity_type', 'entity_id', 'id'], name='mod_request_entity_idx'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser 
+from django.db.models.functions import Upper
 from django.utils import timezone 
 
+from .scope import scoped_manager
+
 # المدينة مثل حمص
 class Governorate( models.Model ) : 
     name = models.CharField( max_length = 100 ) 
@@ -93,9 +96,19 @@ class User ( AbstractUser ) :
     
     status = models.CharField( max_length = 100 , choices = Status.choices , default = Status.ACTIVE ) 
 
+    # يزداد عند تعطيل الحساب أو تغيير الدور أو كلمة المرور، فتُرفض التوكنات الصادرة قبله
+    token_epoch = models.PositiveIntegerField( default = 0 )
+
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True) 
 
+    class Meta ( AbstractUser.Meta ) :
+        # تسجيل الدخول يبحث بـ UPPER(username) / UPPER(email)
+        indexes = [
+            models.Index( Upper( "username" ) , name = "user_username_upper_idx" ) ,
+            models.Index( Upper( "email" ) , name = "user_email_upper_idx" ) ,
+        ]
+
 # الطائفة
 class Sect(models.Model):
     name = models.CharField(max_length=255)
@@ -140,6 +153,15 @@ class Person(models.Model):
     locked = models.BooleanField(default=False)
     created_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name="created_persons")
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = scoped_manager()
+
+    class Meta:
+        indexes = [
+            # المزامنة: التغييرات بعد علامة (updated_at, id) ضمن قرى النطاق
+            models.Index(fields=["village", "updated_at", "id"], name="person_sync_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -155,10 +177,15 @@ class VillageSect(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village", "sect"], name="uniq_village_sect")
         ]
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="village_sect_sync_idx"),
+        ]
 
 #الاشخاص المهمين في القرية حسب الطائفة
 class VillageSectKeyFigure(models.Model):
@@ -169,6 +196,8 @@ class VillageSectKeyFigure(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager("village_sect__village")
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village_sect", "person"], name="uniq_village_sect_person")
@@ -186,10 +215,15 @@ class VillageEthnicity(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village", "ethnicity", "year"], name="uniq_village_ethnicity_year")
         ]
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="village_eth_sync_idx"),
+        ]
 #الاشخاص المهمين حسب العرق
 class EthnicityKeyFigure(models.Model):
     village_ethnicity = models.ForeignKey(VillageEthnicity, on_delete=models.CASCADE, related_name="key_figures")
@@ -199,6 +233,8 @@ class EthnicityKeyFigure(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager("village_ethnicity__village")
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village_ethnicity", "person"], name="uniq_village_ethnicity_person")
@@ -215,10 +251,15 @@ class VillageTribe(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village", "tribe", "year"], name="uniq_village_tribe_year")
         ]
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="village_tribe_sync_idx"),
+        ]
 
 # الاشخاص المهمين حسب القبيلة
 class VillageTribeKeyFigure(models.Model):
@@ -229,12 +270,19 @@ class VillageTribeKeyFigure(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager("village_tribe__village")
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village_tribe", "person"], name="uniq_village_tribe_person")
         ]
 
 
+# طريقة تخزين old_data / new_data في ModificationRequest و AuditLog (انظر accounts/payloads.py)
+class PayloadFormat(models.TextChoices):
+    FULL = "full", "Full"
+    DIFF = "diff", "Diff"
+
 class ModificationRequest(models.Model):
     class EntityType(models.TextChoices):
         SUBAREA = "subarea", "SubArea"
@@ -273,6 +321,12 @@ class ModificationRequest(models.Model):
     old_data = models.JSONField()
     new_data = models.JSONField()
 
+    # diff: old_data / new_data عبارة عن patch فوق الحالة الجديدة للطلب base (أقرب نسخة كاملة للكيان)
+    payload_format = models.CharField(max_length=8, choices=PayloadFormat.choices, default=PayloadFormat.FULL)
+    base = models.ForeignKey("self", on_delete=models.PROTECT, related_name="dependents", blank=True, null=True)
+    # عدد الفروقات المحفوظة فوق base حتى هذا الصف
+    snapshot_depth = models.PositiveSmallIntegerField(default=0)
+
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
 
     reviewed_by = models.ForeignKey(
@@ -282,6 +336,14 @@ class ModificationRequest(models.Model):
 
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # طابور المراجعة: الطلبات المعلقة لنوع كيان بترتيب الإنشاء
+            models.Index(fields=["status", "entity_type", "created_at"], name="mod_request_queue_idx"),
+            # آخر طلب لكل كيان (payloads.prepare عند كل إدخال)
+            models.Index(fields=["entity_type", "entity_id", "id"], name="mod_request_entity_idx"),
+        ]
+
 class AuditLog(models.Model):
     class Action(models.TextChoices):
         CREATE = "create", "Create"
@@ -296,8 +358,21 @@ class AuditLog(models.Model):
     old_data = models.JSONField(blank=True, null=True)
     new_data = models.JSONField(blank=True, null=True)
 
+    payload_format = models.CharField(max_length=8, choices=PayloadFormat.choices, default=PayloadFormat.FULL)
+    base = models.ForeignKey("self", on_delete=models.PROTECT, related_name="dependents", blank=True, null=True)
+    # عدد الفروقات المحفوظة فوق base (أقرب نسخة كاملة للكيان)
+    snapshot_depth = models.PositiveSmallIntegerField(default=0)
+
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # سجل تغييرات كيان واحد (الأحدث أولاً)، و id يحسم التساوي في created_at
+            models.Index(fields=["entity_type", "entity_id", "-created_at", "-id"], name="audit_entity_timeline_idx"),
+            # نشاط مستخدم واحد
+            models.Index(fields=["user", "-created_at", "-id"], name="audit_user_activity_idx"),
+        ]
+
 
 class UserHistory(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="history")
@@ -310,6 +385,20 @@ class UserHistory(models.Model):
 
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # من كان مسؤولاً عن كيان في تاريخ معين؛ user في آخر الفهرس ليغطي الاستعلام بدون قراءة الجدول
+            models.Index(fields=["entity_type", "entity_id", "start_date", "end_date", "user"], name="user_history_entity_idx"),
+            # الفترات المفتوحة (المسؤول الحالي) فقط
+            models.Index(
+                fields=["entity_type", "entity_id", "user"],
+                condition=models.Q(end_date__isnull=True),
+                name="user_history_open_idx",
+            ),
+            # ما غطاه مستخدم خلال فترة
+            models.Index(fields=["user", "start_date", "end_date"], name="user_history_user_idx"),
+        ]
+
 #بيانات الثروة الحيوانية لقرية ضمن سنة.
 class Livestock(models.Model):
     village = models.ForeignKey(Village, on_delete=models.CASCADE, related_name="livestock_records")
@@ -336,10 +425,15 @@ class Livestock(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village", "year"], name="uniq_livestock_village_year")
         ]
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="livestock_sync_idx"),
+        ]
 
 #أي دائرة حكومية موجودة بأي قرية، بأي سنة، وتحت أي وزارة، مع تفاصيل التواصل والإدارة.
 class GovernmentDepartment(models.Model):
@@ -360,10 +454,15 @@ class GovernmentDepartment(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village", "year", "department_name"], name="uniq_dept_village_year_name")
         ]
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="gov_dept_sync_idx"),
+        ]
 
 """
 
@@ -427,6 +526,13 @@ class NaturalAsset(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="natural_asset_sync_idx"),
+        ]
+
 
 #مناطق صناعية
 class IndustrialFacility(models.Model):
@@ -466,10 +572,15 @@ class IndustrialFacility(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name="created_industrial_facilities")
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = scoped_manager()
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village", "year", "name"], name="uniq_ind_facility_village_year_name")
         ]
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="ind_facility_sync_idx"),
+        ]
 
 class IndustrialZone(models.Model):
     village = models.ForeignKey(Village, on_delete=models.CASCADE, related_name="industrial_zones")
@@ -484,10 +595,15 @@ class IndustrialZone(models.Model):
     created_at = models.IntegerField()  # TODO: غالباً timestamp
     updated_at = models.IntegerField()  # TODO: غالباً timestamp
 
+    objects = scoped_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village", "year"], name="uniq_industrial_zone_village_year")
         ]
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="ind_zone_sync_idx"),
+        ]
 
 
 #منشات أثرية
@@ -510,6 +626,13 @@ class ArchaeologicalSite(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="arch_site_sync_idx"),
+        ]
+
 class TourismFacility(models.Model):
     class FacilityType(models.TextChoices):
         HOTEL = "HOTEL", "Hotel"
@@ -549,6 +672,13 @@ class TourismFacility(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="tourism_sync_idx"),
+        ]
+
 
 #نشاطات تجارية
 class CommercialActivity(models.Model):
@@ -590,6 +720,13 @@ class CommercialActivity(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="commercial_sync_idx"),
+        ]
+
 
 #ديموغرايفية
 class DemographicData(models.Model):
@@ -629,10 +766,15 @@ class DemographicData(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village", "year"], name="uniq_demographic_village_year")
         ]
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="demographic_sync_idx"),
+        ]
 
 class AgriculturalStatus(models.Model):
     class Season(models.TextChoices):
@@ -659,10 +801,15 @@ class AgriculturalStatus(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["village", "year", "season"], name="uniq_agri_status_village_year_season")
         ]
+        indexes = [
+            models.Index(fields=["village", "updated_at", "id"], name="agri_status_sync_idx"),
+        ]
 
 class Crop(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -686,7 +833,149 @@ class AgriculturalCrop(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = scoped_manager("agricultural_status__village")
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["agricultural_status", "crop"], name="uniq_ag_status_crop")
-        ]
\ No newline at end of file
+        ]
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="agri_crop_sync_idx"),
+        ]
+
+# مجاميع البيانات الديموغرافية لكل ناحية/منطقة/محافظة ولكل سنة، تُحدث تدريجياً مع كل تعديل على DemographicData
+class DemographicRollup(models.Model):
+    class Level(models.TextChoices):
+        GOVERNORATE = "governorate", "Governorate"
+        AREA = "area", "Area"
+        SUBAREA = "subarea", "SubArea"
+
+    level = models.CharField(max_length=16, choices=Level.choices)
+    node_id = models.BigIntegerField()
+    year = models.PositiveSmallIntegerField()
+
+    village_count = models.IntegerField(default=0)
+    population = models.BigIntegerField(default=0)
+    number_of_families = models.BigIntegerField(default=0)
+
+    # باقي الأعداد: {"number_of_martyrs": 12, "area": 340.5, ...}
+    totals = models.JSONField(default=dict)
+    # النسب الموزونة بعدد السكان: {"poverty_percentage": [sum(pct * population), sum(population)], ...}
+    weighted = models.JSONField(default=dict)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["level", "node_id", "year"], name="uniq_demographic_rollup_node_year")
+        ]
+
+# فهرس البحث في الأشخاص: كلمة مطبّعة -> شخص، مع القرية لفلترة النطاق داخل الفهرس نفسه
+class PersonSearchToken(models.Model):
+    token = models.CharField(max_length=64)
+    person = models.ForeignKey(Person, on_delete=models.CASCADE, related_name="search_tokens")
+    village_id = models.BigIntegerField()
+
+    field = models.CharField(max_length=32)
+    position = models.PositiveSmallIntegerField()
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["token", "village_id"], name="person_search_token_idx"),
+        ]
+
+# مفاتيح التجميع (blocking) لكشف الأشخاص المكررين: فقط الأشخاص الذين يشتركون بمفتاح تتم مقارنتهم
+class PersonBlockKey(models.Model):
+    key = models.CharField(max_length=96, db_index=True)
+    person = models.ForeignKey(Person, on_delete=models.CASCADE, related_name="block_keys")
+
+# زوج مرشح للتكرار بانتظار المراجعة، person_a دائماً أصغر id
+class PersonDuplicateCandidate(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        CONFIRMED = "confirmed", "Confirmed"
+        DISMISSED = "dismissed", "Dismissed"
+
+    person_a = models.ForeignKey(Person, on_delete=models.CASCADE, related_name="duplicate_candidates_a")
+    person_b = models.ForeignKey(Person, on_delete=models.CASCADE, related_name="duplicate_candidates_b")
+
+    score = models.FloatField()
+    # أسباب المطابقة: {"name": 0.94, "phone": true, "same_village": false}
+    reasons = models.JSONField(default=dict)
+    # أصغر id في المجموعة المترابطة من الأزواج
+    cluster_id = models.BigIntegerField(db_index=True)
+
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    reviewed_by = models.ForeignKey(
+        User, on_delete=models.PROTECT, related_name="reviewed_duplicate_candidates", blank=True, null=True
+    )
+    reviewed_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["person_a", "person_b"], name="uniq_person_duplicate_pair")
+        ]
+        indexes = [
+            models.Index(fields=["status", "cluster_id"], name="person_dup_status_cluster_idx"),
+        ]
+
+# نقطة التوقف لتشغيل كشف التكرار: التشغيل التالي يعالج فقط الأشخاص بعد last_person_id
+class DedupRun(models.Model):
+    last_person_id = models.BigIntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    compared_pairs = models.BigIntegerField(default=0)
+    candidates = models.IntegerField(default=0)
+
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+# فهرس موحد للشخصيات المؤثرة عبر الطائفة/العرق/العشيرة، يُحدث مع كل تعديل على جداول الربط وآبائها
+class KeyFigureIndex(models.Model):
+    class Dimension(models.TextChoices):
+        SECT = "sect", "Sect"
+        ETHNICITY = "ethnicity", "Ethnicity"
+        TRIBE = "tribe", "Tribe"
+
+    person = models.ForeignKey(Person, on_delete=models.CASCADE, related_name="key_figure_index", db_index=False)
+    village = models.ForeignKey(Village, on_delete=models.CASCADE, related_name="key_figure_index", db_index=False)
+    dimension = models.CharField(max_length=16, choices=Dimension.choices)
+    # sect_id / ethnicity_id / tribe_id
+    dimension_id = models.BigIntegerField()
+    # الطوائف بدون سنة
+    year = models.PositiveSmallIntegerField(blank=True, null=True)
+
+    # صف الربط (VillageSectKeyFigure ...) وأبوه (VillageSect ...)
+    source_id = models.BigIntegerField()
+    parent_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["dimension", "source_id"], name="uniq_key_figure_index_source")
+        ]
+        indexes = [
+            models.Index(fields=["village", "dimension", "year"], name="key_figure_village_idx"),
+            models.Index(fields=["person", "dimension"], name="key_figure_person_idx"),
+            models.Index(fields=["dimension", "parent_id"], name="key_figure_parent_idx"),
+        ]
+
+# سجل الحذف للمزامنة: العميل الذي زامن قبل الحذف يعرف منه ما يجب إزالته محلياً
+class SyncTombstone(models.Model):
+    entity_type = models.CharField(max_length=100)
+    entity_id = models.BigIntegerField()
+    # رقم وليس FK: السجل يبقى بعد حذف القرية نفسها
+    village_id = models.BigIntegerField(blank=True, null=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["entity_type", "village_id", "id"], name="sync_tombstone_scope_idx"),
+            models.Index(fields=["deleted_at"], name="sync_tombstone_deleted_idx"),
+        ]
+
+# أرقام نسخ مشتركة بين كل العمليات (مصفوفة الصلاحيات، شجرة المواقع ...)، انظر accounts/versions.py
+class CacheVersion(models.Model):
+    key = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(default=0)
@@ -0,0 +1,21 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination( CursorPagination ) :
+    """
+    ترقيم بالمؤشر (keyset) على (created_at, id): كلفة كل صفحة ثابتة مهما كان رقمها.
+    """
+
+    ordering = ( "-created_at" , "-id" )
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
+class ReviewQueuePagination( CursorPagination ) :
+    """طابور المراجعة: الأقدم أولاً"""
+
+    ordering = ( "created_at" , "id" )
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
@@ -0,0 +1,43 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+# عدد الخيوط المخصصة لحساب PBKDF2، يحدد أقصى عدد عمليات hash متزامنة في العملية
+# (تسجيل الدخول غير المتزامن وإنشاء المستخدمين دفعة واحدة)
+LOGIN_HASH_WORKERS = getattr( settings , "LOGIN_HASH_WORKERS" , 4 )
+
+# دون هذا العدد نحسب مباشرة في خيط الطلب
+BULK_HASH_MIN_BATCH = 8
+
+_executor = ThreadPoolExecutor( max_workers = LOGIN_HASH_WORKERS , thread_name_prefix = "password-hash" )
+
+
+async def acheck_user_password( user , raw_password : str ) -> bool :
+    """
+    مثل user.check_password لكن حساب الـ hash يتم في pool محدود بدل حلقة الأحداث،
+    فموجة تسجيل دخول لا توقف باقي الطلبات غير المتزامنة.
+    """
+    loop = asyncio.get_running_loop()
+    is_correct , must_update = await loop.run_in_executor(
+        _executor , verify_password , raw_password , user.password
+    )
+
+    if is_correct and must_update :
+        await loop.run_in_executor( _executor , user.set_password , raw_password )
+        user._password = None
+        await user.asave( update_fields = ["password"] )
+
+    return is_correct
+
+
+def hash_passwords( raw_passwords : list ) -> list :
+    """
+    make_password لقائمة كلمات مرور، موزعة على نفس pool الخيوط المحدود.
+    hashlib.pbkdf2_hmac يحرر الـ GIL أثناء الحساب، فالخيوط تعمل فعلياً على عدة أنوية
+    دون تشغيل عمليات جديدة داخل عامل الويب.
+    """
+    if len( raw_passwords ) < BULK_HASH_MIN_BATCH :
+        return [make_password( raw ) for raw in raw_passwords]
+    return list( _executor.map( make_password , raw_passwords ) )
@@ -0,0 +1,192 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+
+from .models import PayloadFormat
+
+# "diff" يخزن الفروقات فقط، "full" يعيد السلوك القديم (نسخة كاملة في كل صف)
+STORAGE_MODE = getattr( settings , "PAYLOAD_STORAGE_MODE" , PayloadFormat.DIFF )
+# الفرق يُحسب دائماً فوق أقرب نسخة كاملة للكيان (قفزة واحدة عند إعادة البناء)،
+# وبعد هذا العدد من الفروقات نخزن نسخة كاملة جديدة حتى لا يكبر الفرق عنها
+SNAPSHOT_INTERVAL = getattr( settings , "PAYLOAD_SNAPSHOT_INTERVAL" , 20 )
+
+PAYLOAD_FIELDS = ( "id" , "payload_format" , "base_id" , "old_data" , "new_data" , "snapshot_depth" )
+
+
+def _escape( key ) -> str :
+    return str( key ).replace( "~" , "~0" ).replace( "/" , "~1" )
+
+
+def _unescape( token : str ) -> str :
+    return token.replace( "~1" , "/" ).replace( "~0" , "~" )
+
+
+def make_patch( old : dict , new : dict ) -> list :
+    """
+    فروقات على مستوى الحقول بصيغة JSON Patch (RFC 6902: add / remove / replace).
+    قيم JSON المتداخلة (feeds مثلاً) تُستبدل كاملة.
+    """
+    patch = []
+    for key in old :
+        if key not in new :
+            patch.append( { "op" : "remove" , "path" : f"/{_escape( key )}" } )
+        elif old[key] != new[key] :
+            patch.append( { "op" : "replace" , "path" : f"/{_escape( key )}" , "value" : new[key] } )
+    for key in new :
+        if key not in old :
+            patch.append( { "op" : "add" , "path" : f"/{_escape( key )}" , "value" : new[key] } )
+    return patch
+
+
+def apply_patch( base : dict , patch : list ) -> dict :
+    result = dict( base )
+    for operation in patch :
+        key = _unescape( operation["path"][1:] )
+        if operation["op"] == "remove" :
+            result.pop( key , None )
+        else :
+            result[key] = operation["value"]
+    return result
+
+
+def _size( value ) -> int :
+    return len( json.dumps( value , cls = DjangoJSONEncoder , ensure_ascii = False ) )
+
+
+def states( model , row_ids ) -> dict :
+    """
+    {id: (old_state, new_state)} للصفوف المطلوبة بعد إعادة بنائها.
+    base كل فرق نسخة كاملة، فيكفي استعلامان (الصفوف ثم نسخها). الحلقة تبقى لصفوف قديمة
+    كُتبت قبل ذلك كسلسلة فروقات (compact_audit_payloads يعيد كتابتها).
+    """
+    rows = {}
+    pending = set( row_ids ) - { None }
+    while pending :
+        fetched = list( model._base_manager.filter( id__in = pending ).values( *PAYLOAD_FIELDS ) )
+        for row in fetched :
+            rows[row["id"]] = row
+        pending = {
+            row["base_id"] for row in fetched
+            if row["payload_format"] == PayloadFormat.DIFF and row["base_id"] not in rows
+        }
+
+    resolved = {}
+
+    def resolve( row_id ) :
+        if row_id in resolved :
+            return resolved[row_id]
+        row = rows[row_id]
+        if row["payload_format"] == PayloadFormat.DIFF :
+            _ , base_new = resolve( row["base_id"] )
+            old = apply_patch( base_new , row["old_data"] )
+            resolved[row_id] = ( old , apply_patch( old , row["new_data"] ) )
+        else :
+            resolved[row_id] = ( row["old_data"] , row["new_data"] )
+        return resolved[row_id]
+
+    return { row_id : resolve( row_id ) for row_id in row_ids if row_id in rows }
+
+
+def expand( rows ) :
+    """
+    تحويل الصفوف المخزنة كفروقات إلى نسخ كاملة في الذاكرة (للقراءة والعرض).
+    الصف بعد التحويل يصبح full، فحفظه لاحقاً يبقى صحيحاً.
+    """
+    rows = list( rows )
+    diff_rows = [row for row in rows if row.payload_format == PayloadFormat.DIFF]
+    if not diff_rows :
+        return rows
+
+    resolved = states( type( diff_rows[0] ) , { row.base_id for row in diff_rows } )
+    for row in diff_rows :
+        _ , base_new = resolved[row.base_id]
+        row.old_data = apply_patch( base_new , row.old_data )
+        row.new_data = apply_patch( row.old_data , row.new_data )
+        row.payload_format = PayloadFormat.FULL
+        row.base_id = None
+        row.snapshot_depth = 0
+    return rows
+
+
+def encode( row , base_id , base_new , base_depth ) -> bool :
+    """
+    يحول صفاً كاملاً إلى فرق فوق النسخة الكاملة base_id إذا كان ذلك أصغر فعلاً، ويرجع True عند التحويل.
+    base_depth: عدد الفروقات المحفوظة فوق هذه النسخة حتى الآن.
+    """
+    if (
+        not all( isinstance( value , dict ) for value in ( row.old_data , row.new_data , base_new ) )
+        or base_depth + 1 >= SNAPSHOT_INTERVAL
+    ) :
+        return False
+
+    old_patch = make_patch( base_new , row.old_data )
+    new_patch = make_patch( row.old_data , row.new_data )
+    if _size( old_patch ) + _size( new_patch ) >= _size( row.old_data ) + _size( row.new_data ) :
+        return False
+
+    row.payload_format = PayloadFormat.DIFF
+    row.base_id = base_id
+    row.snapshot_depth = base_depth + 1
+    row.old_data = old_patch
+    row.new_data = new_patch
+    return True
+
+
+def prepare( model , rows ) :
+    """
+    قبل الحفظ (save أو bulk_create): كل صف كامل يصبح فرقاً فوق أقرب نسخة كاملة لنفس الكيان.
+    ثلاثة استعلامات للدفعة كلها مهما طالت السلاسل: آخر id لكل كيان (فهرس entity_type, entity_id, id)،
+    ثم صفوفها لمعرفة نسختها الكاملة وعمقها، ثم new_data لتلك النسخ.
+    إذا تكرر الكيان ضمن نفس الدفعة يبقى الصف الثاني كاملاً (لا id للأول بعد).
+    """
+    if STORAGE_MODE != PayloadFormat.DIFF :
+        return rows
+
+    candidates = [
+        row for row in rows
+        if row.payload_format == PayloadFormat.FULL and row.old_data is not None and row.new_data is not None
+    ]
+    if not candidates :
+        return rows
+
+    latest_ids = {}
+    by_type = {}
+    for row in candidates :
+        by_type.setdefault( row.entity_type , set() ).add( row.entity_id )
+    for entity_type , entity_ids in by_type.items() :
+        stored = (
+            model._base_manager.filter( entity_type = entity_type , entity_id__in = entity_ids )
+            .values( "entity_id" ).annotate( last_id = Max( "id" ) )
+        )
+        for row in stored :
+            latest_ids[( entity_type , row["entity_id"] )] = row["last_id"]
+    if not latest_ids :
+        return rows
+
+    # (id النسخة الكاملة، عدد الفروقات فوقها) لكل كيان
+    snapshot_of = {}
+    latest = model._base_manager.filter( id__in = latest_ids.values() ).values_list(
+        "id" , "payload_format" , "base_id" , "snapshot_depth"
+    )
+    for row_id , payload_format , base_id , depth in latest :
+        if payload_format == PayloadFormat.DIFF :
+            snapshot_of[row_id] = ( base_id , depth )
+        else :
+            snapshot_of[row_id] = ( row_id , 0 )
+    snapshots = dict( model._base_manager.filter(
+        id__in = { snapshot_id for snapshot_id , _ in snapshot_of.values() } ,
+        payload_format = PayloadFormat.FULL ,
+    ).values_list( "id" , "new_data" ) )
+
+    seen = set()
+    for row in candidates :
+        key = ( row.entity_type , row.entity_id )
+        if key not in seen and key in latest_ids :
+            snapshot_id , depth = snapshot_of[latest_ids[key]]
+            # صف قديم من سلسلة فروقات: base ليس نسخة كاملة، فيبقى هذا الصف كاملاً ويبدأ سلسلة جديدة
+            if snapshot_id in snapshots :
+                encode( row , snapshot_id , snapshots[snapshot_id] , depth )
+        seen.add( key )
+    return rows
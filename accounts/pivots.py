@@ -0,0 +1,98 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Sum
+
+from locations.hierarchy import hierarchy_version
+
+from .models import AgriculturalStatus, Area, Crop, Governorate, SubArea, Village
+
+# مستوى التجميع -> مسار معرف العقدة انطلاقاً من AgriculturalCrop
+GROUP_PATHS = {
+    "village" : ( "agricultural_status__village_id" , Village ) ,
+    "subarea" : ( "agricultural_status__village__subarea_id" , SubArea ) ,
+    "area" : ( "agricultural_status__village__subarea__area_id" , Area ) ,
+    "governorate" : ( "agricultural_status__village__subarea__area__governorate_id" , Governorate ) ,
+}
+
+# season = NULL تعني التقرير السنوي
+ANNUAL = "annual"
+SEASONS = [ANNUAL] + list( AgriculturalStatus.Season.values )
+
+PIVOT_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def fingerprint( crops ) -> str :
+    """
+    بصمة البيانات تحت الجدول المحوري: آخر تعديل على المحاصيل/الحالات/أسماء المحاصيل + عدد الأسطر
+    (العدد يكشف الحذف الذي لا يغير max(updated_at)).
+    """
+    stamp = crops.aggregate(
+        crops_updated = Max( "updated_at" ) ,
+        statuses_updated = Max( "agricultural_status__updated_at" ) ,
+        names_updated = Max( "crop__updated_at" ) ,
+        rows = Count( "id" ) ,
+    )
+    raw = "|".join( str( stamp[key] ) for key in ( "crops_updated" , "statuses_updated" , "names_updated" , "rows" ) )
+    return hashlib.md5( raw.encode() ).hexdigest()
+
+
+def build_pivot( crops , group_by : str ) -> dict :
+    node_path , node_model = GROUP_PATHS[group_by]
+
+    # التجميع كله باستعلام SQL واحد: عقدة × محصول × فصل × استراتيجي
+    cells = list(
+        crops.values( "crop_id" , "is_strategic" , node = F( node_path ) , season = F( "agricultural_status__season" ) )
+        .annotate( total = Sum( "area" ) )
+        .order_by()
+    )
+
+    crop_ids = { cell["crop_id"] for cell in cells }
+    node_ids = { cell["node"] for cell in cells }
+    crops_axis = list( Crop.objects.filter( id__in = crop_ids ).order_by( "name" ).values( "id" , "name" ) )
+    nodes_axis = list( node_model.objects.filter( id__in = node_ids ).order_by( "name" , "id" ).values( "id" , "name" ) )
+
+    crop_index = { crop["id"] : i for i , crop in enumerate( crops_axis ) }
+    node_index = { node["id"] : i for i , node in enumerate( nodes_axis ) }
+    season_index = { season : i for i , season in enumerate( SEASONS ) }
+
+    def empty() :
+        return [[[0.0] * len( SEASONS ) for _ in crops_axis] for _ in nodes_axis]
+
+    area = empty()
+    strategic_area = empty()
+    for cell in cells :
+        value = float( cell["total"] or 0 )
+        n = node_index[cell["node"]]
+        c = crop_index[cell["crop_id"]]
+        s = season_index[cell["season"] or ANNUAL]
+        area[n][c][s] += value
+        if cell["is_strategic"] :
+            strategic_area[n][c][s] += value
+
+    return {
+        "group_by" : group_by ,
+        "axes" : [ "node" , "crop" , "season" ] ,
+        "nodes" : nodes_axis ,
+        "crops" : crops_axis ,
+        "seasons" : SEASONS ,
+        "area" : area ,
+        "strategic_area" : strategic_area ,
+    }
+
+
+def crop_pivot( crops , scope_key : str , year : int , group_by : str ) -> dict :
+    """
+    الجدول المحوري لمساحات المحاصيل لسنة معينة، مخزن بالكاش لكل (نطاق، سنة، مستوى) ومفتاحه بصمة البيانات
+    ونسخة التسلسل الإداري (نقل أو إعادة تسمية قرية/ناحية يغير التجميع والأسماء).
+    crops: AgriculturalCrop QuerySet مفلتر على النطاق.
+    """
+    crops = crops.filter( agricultural_status__year = year )
+    key = f"pivots:crops:{scope_key}:{year}:{group_by}:{hierarchy_version()}:{fingerprint( crops )}"
+
+    pivot = cache.get( key )
+    if pivot is None :
+        pivot = build_pivot( crops , group_by )
+        pivot["year"] = year
+        cache.set( key , pivot , PIVOT_CACHE_TIMEOUT )
+    return pivot
@@ -0,0 +1,75 @@
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import PermissionRole
+from .versions import SharedVersion
+
+# أفعال الصلاحيات كما تُخزن في Permission.action
+VIEW = "view"
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+REVIEW = "review"
+
+# Permission.entity = "*" تعني كل الكيانات لهذا الفعل
+ANY_ENTITY = "*"
+
+_rbac_version = SharedVersion( "accounts:rbac_version" )
+
+
+def permission_key( action : str , entity : str ) -> str :
+    return f"{action.lower()}:{entity.lower()}"
+
+
+class PermissionMatrix :
+    """
+    مصفوفة الصلاحيات مترجمة من Role/Permission/PermissionRole إلى frozenset لكل دور.
+    الفحص عملية عضوية في مجموعة بدون استعلام، وتُعاد الترجمة فقط عند تغيير رقم النسخة المشترك
+    (SharedVersion في القاعدة، يزداد بعد commit أي تعديل على الجداول الثلاثة)،
+    فكل العمليات (workers) ترى التعديل خلال CACHE_VERSION_CHECK_SECONDS.
+    """
+
+    def __init__( self ) :
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._version = None
+
+    def _compile( self ) :
+        matrix = defaultdict( set )
+        links = PermissionRole.objects.values_list( "role__name" , "permission__action" , "permission__entity" )
+        for role_name , action , entity in links :
+            matrix[role_name.lower()].add( permission_key( action , entity ) )
+        return { role : frozenset( perms ) for role , perms in matrix.items() }
+
+    def _current( self ) :
+        version = _rbac_version.get()
+        matrix = self._matrix
+        if matrix is not None and version == self._version :
+            return matrix
+
+        with self._lock :
+            if self._matrix is None or version != self._version :
+                self._matrix = self._compile()
+                self._version = version
+            return self._matrix
+
+    def permissions_for( self , role_name : str ) -> frozenset :
+        return self._current().get( ( role_name or "" ).lower() , frozenset() )
+
+    def has_permission( self , role_name : str , action : str , entity : str ) -> bool :
+        perms = self.permissions_for( role_name )
+        return permission_key( action , entity ) in perms or permission_key( action , ANY_ENTITY ) in perms
+
+    def invalidate( self ) :
+        """يُستدعى داخل معاملة التعديل: الزيادة تتم عند commit فقط، والتراجع لا يغير شيئاً"""
+        _rbac_version.bump()
+        transaction.on_commit( self._reset )
+
+    def _reset( self ) :
+        with self._lock :
+            self._matrix = None
+
+
+permission_matrix = PermissionMatrix()
@@ -0,0 +1,215 @@
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import ProtectedError, RestrictedError
+from django.utils import timezone
+
+from . import payloads, rbac
+from .audit import audit_writer
+from .entities import after_bulk_update, editable_fields, entity_model, scope_field, scoped_entities, snapshot, touch
+from .models import AuditLog, ModificationRequest
+from .utils import has_entity_permission, reviewable_entity_types
+
+# أقصى عدد طلبات في استدعاء واحد
+MAX_BATCH = 5000
+
+
+def _parse_changes( fields , instance , new_data ) :
+    """new_data -> {attname: قيمة محولة}، أو رسالة خطأ"""
+    if not isinstance( new_data , dict ) or not new_data :
+        return None , "new_data فارغ أو غير صالح"
+
+    changes = {}
+    for key , value in new_data.items() :
+        field = fields.get( key )
+        if field is None :
+            return None , f"حقل غير معروف: {key}"
+
+        if field.is_relation :
+            if value is None and not field.null :
+                return None , f"الحقل {field.name} مطلوب"
+            if value is not None and not str( value ).isdigit() :
+                return None , f"قيمة غير صالحة للحقل {field.name}"
+            changes[field.attname] = int( value ) if value is not None else None
+            continue
+
+        try :
+            changes[field.attname] = field.clean( value , instance )
+        except ValidationError as error :
+            return None , f"{field.name}: {' '.join( error.messages )}"
+    return changes , None
+
+
+def _missing_relations( model , parsed ) -> set :
+    """المفاتيح الخارجية المشار إليها وغير الموجودة، كـ (attname, id)؛ استعلام واحد لكل جدول مرتبط"""
+    wanted = defaultdict( set )
+    for changes in parsed.values() :
+        for attname , value in changes.items() :
+            field = model._meta.get_field( attname )
+            if field.is_relation and value is not None :
+                wanted[field].add( value )
+
+    missing = set()
+    for field , ids in wanted.items() :
+        found = set( field.related_model._base_manager.filter( pk__in = ids ).values_list( "pk" , flat = True ) )
+        missing |= { ( field.attname , value ) for value in ids - found }
+    return missing
+
+
+def _out_of_scope_parents( model , parsed , reviewer ) -> set :
+    """قيم حقل النطاق الجديدة (نقل السجل إلى قرية/أب آخر) الواقعة خارج نطاق المراجع"""
+    field = scope_field( model )
+    wanted = { changes[field.attname] for changes in parsed.values() if changes.get( field.attname ) is not None }
+    if not wanted :
+        return set()
+    allowed = scoped_entities( field.related_model , reviewer ).filter( pk__in = wanted ).values_list( "pk" , flat = True )
+    return wanted - set( allowed )
+
+
+def _apply_group( entity_type , model , requests , reviewer , now ) :
+    """
+    تطبيق طلبات نوع كيان واحد: قراءة الأهداف باستعلام واحد، bulk_update للتعديلات، وحذف واحد.
+    الهدف يجب أن يكون ضمن نطاق المراجع (وكذلك القرية/الأب الجديد إن نُقل)، بغض النظر عن منطقة مقدم الطلب.
+    ترجع (الطلبات المطبقة، الأخطاء، سجلات AuditLog غير المحفوظة).
+    """
+    fields = editable_fields( model )
+    entity_ids = { request.entity_id for request in requests }
+    targets = model._base_manager.select_for_update().in_bulk( entity_ids )
+    in_scope = set( scoped_entities( model , reviewer ).filter( pk__in = entity_ids ).values_list( "pk" , flat = True ) )
+    old_rows = { pk : snapshot( instance ) for pk , instance in targets.items() }
+
+    failures = []
+    parsed = {}
+    for request in requests :
+        instance = targets.get( request.entity_id )
+        if instance is None :
+            failures.append( ( request , "السجل المطلوب تعديله غير موجود" ) )
+        elif request.entity_id not in in_scope :
+            failures.append( ( request , "السجل خارج نطاقك الجغرافي" ) )
+        elif request.action == ModificationRequest.Action.UPDATE :
+            changes , error = _parse_changes( fields , instance , request.new_data )
+            if error :
+                failures.append( ( request , error ) )
+            else :
+                parsed[request.id] = changes
+
+    missing = _missing_relations( model , parsed )
+    out_of_scope = _out_of_scope_parents( model , parsed , reviewer )
+    scope_attname = scope_field( model ).attname
+
+    applied = []
+    logs = []
+    deleted = set()
+    touched = set()
+    failed_ids = { request.id for request , _ in failures }
+
+    # بترتيب الإنشاء: طلبان على نفس السجل يطبقان بالتتابع
+    for request in requests :
+        if request.id in failed_ids :
+            continue
+        if request.entity_id in deleted :
+            failures.append( ( request , "السجل محذوف بطلب سابق ضمن نفس الدفعة" ) )
+            continue
+
+        instance = targets[request.entity_id]
+        if request.action == ModificationRequest.Action.DELETE :
+            deleted.add( request.entity_id )
+            applied.append( request )
+            logs.append( AuditLog(
+                user_id = reviewer.id , entity_type = entity_type , entity_id = request.entity_id ,
+                action = AuditLog.Action.HARDDELETE , old_data = old_rows[request.entity_id] , new_data = None ,
+                created_at = now ,
+            ) )
+            continue
+
+        changes = parsed[request.id]
+        if any( ( attname , value ) in missing for attname , value in changes.items() ) :
+            failures.append( ( request , "قيمة مرتبطة غير موجودة" ) )
+            continue
+        if changes.get( scope_attname ) in out_of_scope :
+            failures.append( ( request , "لا يمكن نقل السجل خارج نطاقك الجغرافي" ) )
+            continue
+
+        # نسخة كاملة قبل وبعد، والتخزين يحولها إلى فروقات (payloads.prepare)
+        before = snapshot( instance )
+        for attname , value in changes.items() :
+            setattr( instance , attname , value )
+        touched.update( changes )
+        applied.append( request )
+        logs.append( AuditLog(
+            user_id = reviewer.id , entity_type = entity_type , entity_id = request.entity_id ,
+            action = AuditLog.Action.UPDATE , old_data = before , new_data = snapshot( instance ) ,
+            created_at = now ,
+        ) )
+
+    updated = [targets[pk] for pk in { request.entity_id for request in applied } - deleted]
+    if updated and touched :
+        for instance in updated :
+            stamped = touch( instance )
+        model._base_manager.bulk_update( updated , list( touched ) + stamped , batch_size = 500 )
+        after_bulk_update( model , updated , { instance.pk : old_rows[instance.pk] for instance in updated } )
+
+    if deleted :
+        model._base_manager.filter( pk__in = deleted ).delete()
+
+    return applied , failures , logs
+
+
+def approve( request_ids , reviewer ) -> dict :
+    """
+    اعتماد وتطبيق طلبات تعديل دفعة واحدة.
+    كل نوع كيان يطبق داخل savepoint خاص به (فشل مجموعة لا يلغي الباقي)،
+    ثم يُختم reviewed_by / reviewed_at بتحديث واحد، وسجلات AuditLog تذهب إلى audit_writer بعد الـ commit.
+    """
+    now = timezone.now()
+    applied_ids = []
+    audit_logs = []
+    errors = []
+
+    with transaction.atomic() :
+        requests = list(
+            ModificationRequest.objects.select_for_update()
+            .filter( id__in = request_ids , status = ModificationRequest.Status.PENDING )
+            .order_by( "created_at" , "id" )
+        )
+        payloads.expand( requests )
+        found = { request.id for request in requests }
+        errors += [{ "id" : request_id , "error" : "الطلب غير موجود أو تمت مراجعته" } for request_id in request_ids if request_id not in found]
+
+        groups = defaultdict( list )
+        for request in requests :
+            groups[request.entity_type].append( request )
+
+        for entity_type , group in groups.items() :
+            model = entity_model( entity_type )
+            if model is None or not has_entity_permission( reviewer , rbac.REVIEW , entity_type ) :
+                errors += [{ "id" : request.id , "error" : "لا يمكنك مراجعة هذا النوع من الطلبات" } for request in group]
+                continue
+
+            try :
+                with transaction.atomic() :
+                    applied , failures , logs = _apply_group( entity_type , model , group , reviewer , now )
+            except ( DatabaseError , ProtectedError , RestrictedError ) :
+                errors += [{ "id" : request.id , "error" : "تعذر تطبيق طلبات هذا النوع" } for request in group]
+                continue
+
+            applied_ids += [request.id for request in applied]
+            audit_logs += logs
+            errors += [{ "id" : request.id , "error" : error } for request , error in failures]
+
+        if applied_ids :
+            ModificationRequest.objects.filter( id__in = applied_ids ).update(
+                status = ModificationRequest.Status.APPROVED , reviewed_by_id = reviewer.id , reviewed_at = now ,
+            )
+            audit_writer.log( *audit_logs )
+
+    return { "approved" : len( applied_ids ) , "approved_ids" : applied_ids , "errors" : errors }
+
+
+def reject( request_ids , reviewer ) -> int :
+    return ModificationRequest.objects.filter(
+        id__in = request_ids ,
+        status = ModificationRequest.Status.PENDING ,
+        entity_type__in = reviewable_entity_types( reviewer ) ,
+    ).update( status = ModificationRequest.Status.REJECTED , reviewed_by_id = reviewer.id , reviewed_at = timezone.now() )
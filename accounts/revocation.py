@@ -0,0 +1,186 @@
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+# كل كم ثانية نقرأ التوكنات المحظورة الجديدة من القاعدة (0 = عند كل فحص).
+# توكن حُظر في عملية أخرى قد يُقبل هنا خلال هذه المدة؛ الحظر في نفس العملية يسري فوراً
+SYNC_INTERVAL = getattr( settings , "REVOCATION_SYNC_INTERVAL" , 5 )
+# كل كم ثانية نعيد بناء الفهرس بالكامل ونسقط التوكنات المنتهية
+REBUILD_INTERVAL = getattr( settings , "REVOCATION_REBUILD_INTERVAL" , 60 * 60 )
+# الـ id يُحجز عند الإدخال والصف يظهر عند انتهاء معاملته، فقد يظهر id أصغر بعد id أكبر قرأناه.
+# كل مزامنة تعيد قراءة الصفوف التي أُضيفت خلال هذه المدة؛ معاملة حظر أطول منها تنتظر إعادة البناء
+SYNC_GRACE = getattr( settings , "REVOCATION_SYNC_GRACE" , 60 )
+BLOOM_ERROR_RATE = 0.001
+
+
+class BloomFilter :
+    def __init__( self , capacity : int , error_rate : float = BLOOM_ERROR_RATE ) :
+        self.capacity = max( capacity , 1024 )
+        self.size = int( -self.capacity * math.log( error_rate ) / ( math.log( 2 ) ** 2 ) )
+        self.hash_count = max( 1 , round( self.size / self.capacity * math.log( 2 ) ) )
+        self.bits = bytearray( ( self.size + 7 ) // 8 )
+
+    def _positions( self , item : str ) :
+        digest = hashlib.blake2b( item.encode() , digest_size = 16 ).digest()
+        h1 = int.from_bytes( digest[:8] , "little" )
+        h2 = int.from_bytes( digest[8:] , "little" ) | 1
+        return ( ( h1 + i * h2 ) % self.size for i in range( self.hash_count ) )
+
+    def add( self , item : str ) :
+        for pos in self._positions( item ) :
+            self.bits[pos >> 3] |= 1 << ( pos & 7 )
+
+    def __contains__( self , item : str ) -> bool :
+        return all( self.bits[pos >> 3] & ( 1 << ( pos & 7 ) ) for pos in self._positions( item ) )
+
+
+class RevocationIndex :
+    """
+    فهرس JTI المحظورة داخل العملية:
+    - Bloom filter مبني من قاعدة البيانات (التوكنات غير المنتهية فقط) يجيب "غير محظور" بدون استعلام.
+    - مجموعة دقيقة للتوكنات المحظورة بعد البناء (تُقرأ تدريجياً حسب id، مع إعادة قراءة آخر SYNC_GRACE ثانية).
+    - النتيجة الإيجابية من Bloom فقط تتأكد من قاعدة البيانات.
+    """
+
+    def __init__( self ) :
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._bloom = None
+        self._recent = set()
+        self._last_id = 0
+        # (وقت المزامنة، last_id بعدها): المزامنة تقرأ فوق آخر last_id مر عليه SYNC_GRACE
+        self._checkpoints = deque( [( -math.inf , 0 )] )
+        self._built_at = 0.0
+        self._synced_at = 0.0
+        self.counters = {
+            "checks" : 0 ,
+            "hits" : 0 ,
+            "misses" : 0 ,
+            "bloom_positives" : 0 ,
+            "false_positives" : 0 ,
+            "rebuilds" : 0 ,
+        }
+
+    def _build( self ) :
+        """(bloom, last_id, floor_id) من القاعدة، بدون لمس حالة الفهرس: يعمل خارج القفل"""
+        last_id = BlacklistedToken.objects.aggregate( last = Max( "id" ) )["last"] or 0
+        # ما فوق floor_id حُظر خلال آخر SYNC_GRACE ثانية، وقد تظهر بينه ids أصغر لاحقاً
+        floor_id = BlacklistedToken.objects.filter(
+            id__lte = last_id , blacklisted_at__lt = timezone.now() - timedelta( seconds = SYNC_GRACE ) ,
+        ).aggregate( floor = Max( "id" ) )["floor"] or 0
+        live = BlacklistedToken.objects.filter( id__lte = last_id , token__expires_at__gt = timezone.now() )
+
+        bloom = BloomFilter( live.count() * 2 )
+        for jti in live.values_list( "token__jti" , flat = True ).iterator( chunk_size = 5000 ) :
+            bloom.add( jti )
+        return bloom , last_id , floor_id
+
+    def _rebuild( self ) :
+        bloom , last_id , floor_id = self._build()
+        with self._lock :
+            # المحظور محلياً أثناء البناء قد لا يكون مثبتاً في القاعدة بعد
+            for jti in self._recent :
+                bloom.add( jti )
+            self._bloom = bloom
+            self._recent = set()
+            self._last_id = last_id
+            self._checkpoints = deque( [( -math.inf , floor_id )] )
+            self._built_at = time.monotonic()
+            self.counters["rebuilds"] += 1
+            self._sync()
+
+    def _rebuild_due( self ) -> bool :
+        bloom = self._bloom
+        return (
+            bloom is None
+            or time.monotonic() - self._built_at >= REBUILD_INTERVAL
+            or len( self._recent ) > bloom.capacity // 2
+        )
+
+    def _maybe_rebuild( self ) :
+        """
+        إعادة البناء الكاملة خارج self._lock: الفحوص الأخرى تستمر على الفهرس القديم حتى الاستبدال.
+        عملية بناء واحدة في كل مرة، ولا ينتظرها إلا من لا يملك فهرساً بعد (أول طلب).
+        """
+        if not self._rebuild_due() :
+            return
+        if not self._rebuild_lock.acquire( blocking = self._bloom is None ) :
+            return
+        try :
+            if self._rebuild_due() :
+                self._rebuild()
+        finally :
+            self._rebuild_lock.release()
+
+    def _sync( self ) :
+        """
+        الصفوف الجديدة بعد floor لا بعد _last_id: صف بـ id أصغر ثُبتت معاملته بعد قراءتنا لـ id أكبر
+        يظهر في المزامنة التالية. إعادة قراءة ما قرأناه سابقاً لا تضر (set).
+        """
+        now = time.monotonic()
+        while len( self._checkpoints ) > 1 and now - self._checkpoints[1][0] >= SYNC_GRACE :
+            self._checkpoints.popleft()
+        floor = self._checkpoints[0][1]
+
+        rows = BlacklistedToken.objects.filter( id__gt = floor ).values_list( "id" , "token__jti" )
+        for row_id , jti in rows :
+            self._recent.add( jti )
+            self._bloom.add( jti )
+            self._last_id = max( self._last_id , row_id )
+        if self._last_id > self._checkpoints[-1][1] :
+            self._checkpoints.append( ( now , self._last_id ) )
+        self._synced_at = now
+
+    def is_revoked( self , jti : str ) -> bool :
+        self._maybe_rebuild()
+        with self._lock :
+            if time.monotonic() - self._synced_at >= SYNC_INTERVAL :
+                self._sync()
+            self.counters["checks"] += 1
+
+            if jti in self._recent :
+                self.counters["hits"] += 1
+                return True
+
+            if jti not in self._bloom :
+                self.counters["misses"] += 1
+                return False
+
+            self.counters["bloom_positives"] += 1
+
+        revoked = BlacklistedToken.objects.filter( token__jti = jti ).exists()
+        with self._lock :
+            if revoked :
+                self.counters["hits"] += 1
+            else :
+                self.counters["misses"] += 1
+                self.counters["false_positives"] += 1
+        return revoked
+
+    def add( self , jti : str ) :
+        with self._lock :
+            if self._bloom is not None :
+                self._recent.add( jti )
+                self._bloom.add( jti )
+
+    def stats( self ) -> dict :
+        with self._lock :
+            stats = dict( self.counters )
+            stats["recent_size"] = len( self._recent )
+            stats["bloom_capacity"] = self._bloom.capacity if self._bloom else 0
+        checks = stats["checks"] or 1
+        stats["hit_rate"] = stats["hits"] / checks
+        stats["miss_rate"] = stats["misses"] / checks
+        stats["false_positive_rate"] = stats["false_positives"] / ( stats["bloom_positives"] or 1 )
+        return stats
+
+
+revocation_index = RevocationIndex()
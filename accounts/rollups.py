@@ -0,0 +1,246 @@
+from collections import defaultdict
+
+from django.apps import apps as global_apps
+from django.db import transaction
+
+from .models import DemographicData, DemographicRollup, Village
+
+COUNT_FIELDS = (
+    "population",
+    "number_of_families",
+    "number_of_martyrs",
+    "number_of_injured",
+    "number_of_detainees",
+    "area",
+)
+
+PERCENTAGE_FIELDS = (
+    "male_percentage",
+    "female_percentage",
+    "displaced_percentage",
+    "returned_percentage",
+    "unemployment_percentage",
+    "poverty_percentage",
+    "wealth_percentage",
+    "government_workers_percentage",
+    "private_sector_workers_percentage",
+    "elderly_percentage",
+    "farmers_percentage",
+    "industrial_workers_percentage",
+    "traders_percentage",
+    "craftsmen_percentage",
+    "expatriates_percentage",
+)
+
+ROW_FIELDS = ( "village_id" , "year" ) + COUNT_FIELDS + PERCENTAGE_FIELDS
+
+# الأعمدة المباشرة في DemographicRollup، والباقي يذهب إلى totals
+COLUMN_FIELDS = ( "population" , "number_of_families" )
+
+class Contribution :
+    """مساهمة قرية/سنة (أو مجموعة منها) في المجاميع، قابلة للجمع والطرح"""
+
+    def __init__( self ) :
+        self.village_count = 0
+        self.counts = defaultdict( float )
+        self.weighted = defaultdict( lambda : [0.0 , 0.0] )
+
+    @classmethod
+    def from_row( cls , row : dict , sign : int = 1 ) :
+        contribution = cls()
+        contribution.village_count = sign
+        for field in COUNT_FIELDS :
+            if row.get( field ) is not None :
+                contribution.counts[field] += sign * float( row[field] )
+
+        population = row.get( "population" )
+        if population :
+            for field in PERCENTAGE_FIELDS :
+                if row.get( field ) is not None :
+                    contribution.weighted[field][0] += sign * float( row[field] ) * population
+                    contribution.weighted[field][1] += sign * population
+        return contribution
+
+    def add( self , other ) :
+        self.village_count += other.village_count
+        for field , value in other.counts.items() :
+            self.counts[field] += value
+        for field , ( numerator , denominator ) in other.weighted.items() :
+            self.weighted[field][0] += numerator
+            self.weighted[field][1] += denominator
+
+    def apply_to( self , rollup ) :
+        rollup.village_count += self.village_count
+        totals = dict( rollup.totals )
+        for field , value in self.counts.items() :
+            if field in COLUMN_FIELDS :
+                setattr( rollup , field , getattr( rollup , field ) + int( value ) )
+            else :
+                totals[field] = totals.get( field , 0 ) + value
+        rollup.totals = totals
+
+        weighted = dict( rollup.weighted )
+        for field , ( numerator , denominator ) in self.weighted.items() :
+            current = weighted.get( field , [0 , 0] )
+            weighted[field] = [current[0] + numerator , current[1] + denominator]
+        rollup.weighted = weighted
+
+
+def row_values( instance ) -> dict :
+    return { field : getattr( instance , field ) for field in ROW_FIELDS }
+
+
+def ancestor_keys( village_ids = None , apps = global_apps ) -> dict :
+    """
+    {village_id: [(level, node_id), ...]} لأسلاف القرى (الناحية ثم المنطقة ثم المحافظة) من جدول الإغلاق باستعلام واحد.
+    village_ids: مجموعة أو subquery، و None تعني كل القرى.
+    """
+    from locations.hierarchy import VILLAGE
+
+    LocationClosure = apps.get_model( "locations" , "LocationClosure" )
+    rows = LocationClosure.objects.filter( descendant_level = VILLAGE , depth__gt = 0 )
+    if village_ids is not None :
+        rows = rows.filter( descendant_id__in = village_ids )
+
+    keys = defaultdict( list )
+    for village_id , level , node_id in rows.order_by( "descendant_id" , "depth" ).values_list(
+        "descendant_id" , "ancestor_level" , "ancestor_id"
+    ) :
+        keys[village_id].append( ( level , node_id ) )
+    return keys
+
+
+def node_keys( village_id ) :
+    """
+    [(level, node_id), ...] لأسلاف القرية من جدول الإغلاق، ومن جداول التسلسل نفسها إذا لم تكن فيه بعد.
+    القرية غير الموجودة خطأ: تجاهلها يسقط التغيير من كل المجاميع بصمت.
+    """
+    from locations.hierarchy import AREA , GOVERNORATE , SUBAREA
+
+    keys = ancestor_keys( [village_id] ).get( village_id )
+    if keys :
+        return keys
+
+    scope = Village.objects.filter( pk = village_id ).values_list(
+        "subarea_id" , "subarea__area_id" , "subarea__area__governorate_id"
+    ).first()
+    if scope is None :
+        raise Village.DoesNotExist( f"village {village_id} not found for demographic rollups" )
+    return list( zip( ( SUBAREA , AREA , GOVERNORATE ) , scope ) )
+
+
+def aggregate( rows , keys : dict ) -> dict :
+    """{(level, node_id, year): Contribution} من أسطر DemographicData، keys من ancestor_keys"""
+    result = defaultdict( Contribution )
+    for row in rows :
+        contribution = Contribution.from_row( row )
+        for level , node_id in keys.get( row["village_id"] , () ) :
+            result[( level , node_id , row["year"] )].add( contribution )
+    return result
+
+
+@transaction.atomic
+def apply_change( old_row : dict = None , new_row : dict = None ) :
+    """
+    تحديث المجاميع بفرق سطر واحد (إضافة، تعديل أو حذف): ثلاثة أسطر rollup فقط لكل قرية/سنة.
+    """
+    deltas = defaultdict( Contribution )
+    if old_row :
+        for level , node_id in node_keys( old_row["village_id"] ) :
+            deltas[( level , node_id , old_row["year"] )].add( Contribution.from_row( old_row , sign = -1 ) )
+    if new_row :
+        for level , node_id in node_keys( new_row["village_id"] ) :
+            deltas[( level , node_id , new_row["year"] )].add( Contribution.from_row( new_row ) )
+
+    for ( level , node_id , year ) , delta in deltas.items() :
+        rollup , _ = DemographicRollup.objects.select_for_update().get_or_create(
+            level = level , node_id = node_id , year = year
+        )
+        delta.apply_to( rollup )
+        if rollup.village_count <= 0 :
+            rollup.delete()
+        else :
+            rollup.save()
+
+
+def build_rollups( aggregated : dict , model = DemographicRollup ) -> list :
+    rollups = []
+    for ( level , node_id , year ) , contribution in aggregated.items() :
+        rollup = model( level = level , node_id = node_id , year = year )
+        contribution.apply_to( rollup )
+        rollups.append( rollup )
+    return rollups
+
+
+def recompute( village_ids , years ) :
+    """
+    إعادة حساب المجاميع المتأثرة بقرى/سنوات معينة (بعد bulk_create / bulk_update التي لا ترسل إشارات).
+    تُعاد المحافظات المعنية بالكامل لهذه السنوات.
+    """
+    years = set( years )
+    governorates = { keys[-1][1] for keys in ancestor_keys( set( village_ids ) ).values() if keys }
+    if years :
+        recompute_governorates( governorates , years )
+
+
+@transaction.atomic
+def recompute_governorates( governorate_ids , years = None ) :
+    """
+    إعادة حساب كل مجاميع المحافظات المعطاة وما تحتها (years = None تعني كل السنوات).
+    العقد تُؤخذ من جدول الإغلاق لا من القرى، فالناحية أو المنطقة التي لم يبق فيها قرى تُحذف مجاميعها أيضاً.
+    تُستدعى بعد نقل قرية أو ناحية أو منطقة، مع المحافظة القديمة والجديدة.
+    """
+    from locations.hierarchy import GOVERNORATE , VILLAGE
+    from locations.models import LocationClosure
+
+    governorate_ids = set( governorate_ids ) - { None }
+    if not governorate_ids :
+        return
+
+    below = LocationClosure.objects.filter( ancestor_level = GOVERNORATE , ancestor_id__in = governorate_ids )
+    villages = below.filter( descendant_level = VILLAGE ).values( "descendant_id" )
+
+    rows = DemographicData.objects.filter( village_id__in = villages )
+    if years is not None :
+        rows = rows.filter( year__in = years )
+    aggregated = aggregate( rows.values( *ROW_FIELDS ).iterator( chunk_size = 2000 ) , ancestor_keys( villages ) )
+
+    nodes = defaultdict( set )
+    for level , node_id in below.exclude( descendant_level = VILLAGE ).values_list( "descendant_level" , "descendant_id" ) :
+        nodes[level].add( node_id )
+
+    for level , node_ids in nodes.items() :
+        stale = DemographicRollup.objects.filter( level = level , node_id__in = node_ids )
+        if years is not None :
+            stale = stale.filter( year__in = years )
+        stale.delete()
+    DemographicRollup.objects.bulk_create( build_rollups( aggregated ) , batch_size = 1000 )
+
+
+@transaction.atomic
+def rebuild( apps = global_apps ) -> int :
+    """إعادة بناء كل المجاميع. apps: سجل النماذج التاريخي عند الاستدعاء من migration"""
+    rollup_model = apps.get_model( "accounts" , "DemographicRollup" )
+    rows = apps.get_model( "accounts" , "DemographicData" ).objects.values( *ROW_FIELDS ).iterator( chunk_size = 2000 )
+    rollups = build_rollups( aggregate( rows , ancestor_keys( apps = apps ) ) , rollup_model )
+    rollup_model.objects.all().delete()
+    rollup_model.objects.bulk_create( rollups , batch_size = 1000 )
+    return len( rollups )
+
+
+def rollup_payload( rollup ) -> dict :
+    averages = {
+        field : ( numerator / denominator if denominator else None )
+        for field , ( numerator , denominator ) in rollup.weighted.items()
+    }
+    return {
+        "level" : rollup.level ,
+        "node_id" : rollup.node_id ,
+        "year" : rollup.year ,
+        "village_count" : rollup.village_count ,
+        "population" : rollup.population ,
+        "number_of_families" : rollup.number_of_families ,
+        "totals" : rollup.totals ,
+        "weighted_averages" : averages ,
+        "updated_at" : rollup.updated_at ,
+    }
@@ -0,0 +1,54 @@
+from django.db import models
+
+from .utils import is_super_admin, user_scope
+
+
+class ScopedQuerySet( models.QuerySet ) :
+    """
+    QuerySet مشترك لكل الجداول المرتبطة بقرية.
+    الفلترة حسب النطاق الجغرافي تتحول إلى شرط واحد على village_id مع subquery على جدول الإغلاق
+    (LocationClosure، مفهرس على السلف)، بدل سلسلة Village -> SubArea -> Area -> Governorate
+    أو قائمة ids في الطلب نفسه.
+    """
+
+    # مسار حقل القرية من هذا الجدول
+    village_field = "village"
+
+    def for_user( self , user ) :
+        if is_super_admin( user ) :
+            return self
+
+        level , node_id = user_scope( user )
+        if node_id is None :
+            return self.none()
+        return self.in_scope( level , node_id )
+
+    def in_scope( self , level : str , node_id ) :
+        from locations.closure import descendant_ids
+        from locations.hierarchy import VILLAGE
+
+        return self.filter( **{ f"{self.village_field}_id__in" : descendant_ids( level , node_id , VILLAGE ) } )
+
+
+def scoped_manager( village_field : str = "village" ) :
+    if village_field == ScopedQuerySet.village_field :
+        return ScopedQuerySet.as_manager()
+
+    queryset_class = type( "ScopedQuerySet" , ( ScopedQuerySet , ) , { "village_field" : village_field } )
+    return queryset_class.as_manager()
+
+
+def can_access_node( user , level : str , node_id ) -> bool :
+    """هل العقدة (محافظة/منطقة/ناحية/قرية) ضمن نطاق المستخدم: عقدة المستخدم سلف لها في جدول الإغلاق"""
+    from locations.models import LocationClosure
+
+    if is_super_admin( user ) :
+        return True
+
+    user_level , user_node_id = user_scope( user )
+    if user_node_id is None :
+        return False
+
+    return LocationClosure.objects.filter(
+        ancestor_level = user_level , ancestor_id = user_node_id , descendant_level = level , descendant_id = node_id ,
+    ).exists()
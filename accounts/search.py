@@ -0,0 +1,149 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, Q, Sum, Value, When
+
+from .models import Person, PersonSearchToken
+
+# وزن كل حقل في الترتيب، الاسم أهم بكثير من باقي النصوص
+FIELD_WEIGHTS = {
+    "name" : 10 ,
+    "work" : 3 ,
+    "educational_qualifications" : 2 ,
+    "social_interests" : 1 ,
+    "community_influence" : 1 ,
+    "system_affiliation" : 1 ,
+    "new_leadership" : 1 ,
+    "address" : 1 ,
+}
+# الكلمة الأولى من الاسم (الاسم الأول) تأخذ وزناً إضافياً
+FIRST_NAME_BONUS = 2
+
+MAX_TOKEN_LENGTH = 64
+# آخر كلمة في الاستعلام تُطابق كبادئة إذا كان طولها هذا أو أكثر (بحث أثناء الكتابة)
+MIN_PREFIX_LENGTH = 2
+MAX_QUERY_TERMS = 8
+
+# التشكيل وألف الخنجر والتطويل
+_DIACRITICS = re.compile( "[\u064b-\u065f\u0670\u0640]" )
+_LETTER_MAP = str.maketrans( {
+    "أ" : "ا" , "إ" : "ا" , "آ" : "ا" , "ٱ" : "ا" ,
+    "ة" : "ه" ,
+    "ى" : "ي" , "ی" : "ي" , "ئ" : "ي" ,
+    "ؤ" : "و" ,
+    "ک" : "ك" ,
+    "٠" : "0" , "١" : "1" , "٢" : "2" , "٣" : "3" , "٤" : "4" ,
+    "٥" : "5" , "٦" : "6" , "٧" : "7" , "٨" : "8" , "٩" : "9" ,
+} )
+_WORD = re.compile( r"\w+" )
+
+
+def normalize( text ) -> str :
+    """توحيد أشكال الهمزة والتاء المربوطة والألف المقصورة وحذف التشكيل، حتى تتطابق الكتابات المختلفة لنفس الاسم"""
+    if not text :
+        return ""
+    return _DIACRITICS.sub( "" , str( text ) ).translate( _LETTER_MAP ).lower()
+
+
+def tokenize( text ) -> list :
+    return [word[:MAX_TOKEN_LENGTH] for word in _WORD.findall( normalize( text ) )]
+
+
+def person_tokens( person : dict , model = PersonSearchToken ) -> list :
+    """صفوف الفهرس لشخص واحد (dict من values)، صف واحد لكل كلمة مختلفة في كل حقل"""
+    rows = []
+    for field , weight in FIELD_WEIGHTS.items() :
+        seen = set()
+        for position , token in enumerate( tokenize( person.get( field ) ) ) :
+            if token in seen :
+                continue
+            seen.add( token )
+            rows.append( model(
+                token = token ,
+                person_id = person["id"] ,
+                village_id = person["village_id"] ,
+                field = field ,
+                position = position ,
+                weight = weight + ( FIRST_NAME_BONUS if field == "name" and position == 0 else 0 ) ,
+            ) )
+    return rows
+
+
+def _values( persons ) :
+    return persons.values( "id" , "village_id" , *FIELD_WEIGHTS )
+
+
+@transaction.atomic
+def reindex( person_ids ) :
+    """إعادة فهرسة أشخاص معينين (بعد الحفظ، أو بعد bulk_create / bulk_update التي لا ترسل إشارات)"""
+    person_ids = list( person_ids )
+    PersonSearchToken.objects.filter( person_id__in = person_ids ).delete()
+
+    rows = []
+    for person in _values( Person.objects.filter( id__in = person_ids ) ) :
+        rows.extend( person_tokens( person ) )
+    PersonSearchToken.objects.bulk_create( rows , batch_size = 2000 )
+
+
+@transaction.atomic
+def rebuild( chunk_size : int = 2000 , apps = global_apps ) -> int :
+    """إعادة بناء الفهرس كاملاً. apps: سجل النماذج التاريخي عند الاستدعاء من migration"""
+    token_model = apps.get_model( "accounts" , "PersonSearchToken" )
+    token_model.objects.all().delete()
+
+    total = 0
+    rows = []
+    persons = apps.get_model( "accounts" , "Person" ).objects.order_by( "id" )
+    for person in _values( persons ).iterator( chunk_size = chunk_size ) :
+        rows.extend( person_tokens( person , token_model ) )
+        if len( rows ) >= chunk_size * 4 :
+            token_model.objects.bulk_create( rows , batch_size = chunk_size )
+            total += len( rows )
+            rows = []
+
+    token_model.objects.bulk_create( rows , batch_size = chunk_size )
+    return total + len( rows )
+
+
+def _term_condition( term : str , prefix : bool ) -> Q :
+    if not prefix :
+        return Q( token = term )
+    # مدى بدل LIKE حتى يُستخدم فهرس (token, village_id) على كل قواعد البيانات
+    return Q( token__gte = term , token__lt = term + "\uffff" )
+
+
+def search( query : str , village_ids = None , offset : int = 0 , limit : int = 20 ) -> list :
+    """
+    [(person_id, score), ...] مرتبة حسب مجموع أوزان الكلمات المطابقة.
+    كل كلمات الاستعلام مطلوبة، والأخيرة تُطابق كبادئة.
+    village_ids: مجموعة أو subquery (descendant_ids)، و None تعني بدون فلترة نطاق.
+    """
+    terms = list( dict.fromkeys( tokenize( query ) ) )[:MAX_QUERY_TERMS]
+    if not terms :
+        return []
+
+    conditions = [
+        _term_condition( term , prefix = index == len( terms ) - 1 and len( term ) >= MIN_PREFIX_LENGTH )
+        for index , term in enumerate( terms )
+    ]
+
+    rows = PersonSearchToken.objects.filter( reduce( or_ , conditions ) )
+    if village_ids is not None :
+        rows = rows.filter( village_id__in = village_ids )
+
+    # علامة لكل كلمة: هل طابقت أي صف لهذا الشخص
+    matched = {
+        f"term_{index}" : Max( Case( When( condition , then = Value( 1 ) ) , default = Value( 0 ) , output_field = IntegerField() ) )
+        for index , condition in enumerate( conditions )
+    }
+    rows = (
+        rows.values( "person_id" )
+        .annotate( score = Sum( "weight" ) , **matched )
+        .filter( **{ name : 1 for name in matched } )
+        .order_by( "-score" , "person_id" )
+        .values_list( "person_id" , "score" )
+    )
+    return list( rows[offset : offset + limit] )
@@ -1,4 +1,5 @@
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import get_user_model
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.contrib.auth.password_validation import validate_password
 from django.db.models import Q
 from rest_framework import serializers
@@ -7,6 +8,13 @@ from .utils import is_super_admin, is_area_manager
 
 User = get_user_model()
 
+def login_queryset( identifier ) :
+    # استعلام واحد بالاسم أو الايميل، كلا الشرطين UPPER(...) ومغطى بفهرس وظيفي (user_*_upper_idx)
+    return User.objects.select_related( "role" ).filter(
+        Q( username__iexact = identifier ) | Q( email__iexact = identifier )
+    )
+
+
 class LoginSerizlizer( serializers.Serializer ) : 
     identifier = serializers.CharField() 
     password = serializers.CharField( write_only = True ) 
@@ -18,22 +26,19 @@ class LoginSerizlizer( serializers.Serializer ) :
        if not identifier or not password : 
            raise serializers.ValidationError({"error":"الرجاء ادخال الايميل وكلمة المرور"})
 
-       user = User.objects.filter(
-           Q( username__iexact = identifier) | Q( email__iexact = identifier )
-       ).first()
+       user = login_queryset( identifier ).first()
 
        if not user : 
            raise serializers.ValidationError({"error" : "الايميل او المستخدم غير موجود" })
          
-       auth_user = authenticate( username = user.username, password = password) 
-
-       if not auth_user : 
+       # نتحقق على نفس السجل بدل authenticate() الذي يعيد جلب المستخدم
+       if not user.is_active or not user.check_password( password ) : 
            raise serializers.ValidationError({"error":"اسم المستخدم او كلمة المرور غير صحيحة"})
        
-       if hasattr( auth_user , 'status') and auth_user.status == "deactive" :
+       if user.status == User.Status.DEACTIVE :
            raise serializers.ValidationError({"error" : "هذا الحساب غير مفعل"}) 
 
-       attrs['user'] = auth_user 
+       attrs['user'] = user 
        return attrs 
 
 
@@ -199,8 +204,8 @@ class AdminUserCreateSerializer(serializers.ModelSerializer):
 
             # ويجب أن تكون نفس المنطقة تبعه
             if (
-                attrs.get("governorate") != creator.governorate
-                or attrs.get("area") != creator.area
+                getattr(attrs.get("governorate"), "id", None) != creator.governorate_id
+                or getattr(attrs.get("area"), "id", None) != creator.area_id
 
             ):
                 raise serializers.ValidationError(
@@ -227,6 +232,44 @@ class AdminUserCreateSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
+class PrefetchedSlugRelatedField(serializers.SlugRelatedField):
+    """SlugRelatedField يبحث في dict محمل مسبقاً (context["slugs"][اسم الحقل]) بدل استعلام لكل قيمة"""
+
+    def to_internal_value(self, data):
+        slugs = self.context.get("slugs", {}).get(self.field_name)
+        if slugs is None:
+            return super().to_internal_value(data)
+        try:
+            return slugs[str(data)]
+        except KeyError:
+            self.fail("does_not_exist", slug_name=self.slug_field, value=data)
+
+
+class AdminUserBulkCreateSerializer(AdminUserCreateSerializer):
+    """
+    نفس قواعد AdminUserCreateSerializer للإنشاء دفعة واحدة بدون استعلام لكل سطر:
+    الأدوار والمحافظات والمناطق من context["slugs"]، وتفرد الاسم والايميل يُفحص للدفعة كلها باستعلام واحد.
+    """
+
+    role = PrefetchedSlugRelatedField(slug_field="name", queryset=Role.objects.all())
+    governorate = PrefetchedSlugRelatedField(slug_field="name", queryset=Governorate.objects.all())
+    area = PrefetchedSlugRelatedField(slug_field="name", queryset=Area.objects.all())
+
+    class Meta(AdminUserCreateSerializer.Meta):
+        extra_kwargs = {
+            "username": {"validators": [UnicodeUsernameValidator()]},
+            "email": {"validators": []},
+        }
+
+    @staticmethod
+    def prefetch_slugs() -> dict:
+        return {
+            "role": {role.name: role for role in Role.objects.all()},
+            "governorate": {governorate.name: governorate for governorate in Governorate.objects.all()},
+            "area": {area.name: area for area in Area.objects.all()},
+        }
+
+
 class AdminUserUpdateSerializer(serializers.ModelSerializer):
     role = serializers.SlugRelatedField(
         slug_field="name",
@@ -288,23 +331,23 @@ class AdminUserUpdateSerializer(serializers.ModelSerializer):
 
             # يجب أن يكون المستخدم ضمن نفس منطقته
             if (
-                instance.governorate != editor.governorate
-                or instance.area != editor.area
-                or instance.subarea != editor.subarea
+                instance.governorate_id != editor.governorate_id
+                or instance.area_id != editor.area_id
+                or instance.subarea_id != editor.subarea_id
             ):
                 raise serializers.ValidationError(
                     {"location": "لا يمكنك تعديل مستخدمين خارج منطقتك"}
                 )
 
             # بالنسبة للموقع: لو حاول يغيّر governorate/area/subarea لازم يظلوا ضمن نفسه
-            new_governorate = attrs.get("governorate", instance.governorate)
-            new_area = attrs.get("area", instance.area)
-            new_subarea = attrs.get("subarea", instance.subarea)
+            new_governorate_id = getattr(attrs["governorate"], "id", None) if "governorate" in attrs else instance.governorate_id
+            new_area_id = getattr(attrs["area"], "id", None) if "area" in attrs else instance.area_id
+            new_subarea_id = getattr(attrs["subarea"], "id", None) if "subarea" in attrs else instance.subarea_id
 
             if (
-                new_governorate != editor.governorate
-                or new_area != editor.area
-                or new_subarea != editor.subarea
+                new_governorate_id != editor.governorate_id
+                or new_area_id != editor.area_id
+                or new_subarea_id != editor.subarea_id
             ):
                 raise serializers.ValidationError(
                     {"location": "لا يمكنك نقل المستخدم إلى منطقة أخرى غير منطقتك"}
@@ -313,3 +356,27 @@ class AdminUserUpdateSerializer(serializers.ModelSerializer):
         return attrs  
          
 
+
+class ModificationRequestSerializer(serializers.ModelSerializer):
+    requested_by_username = serializers.CharField(source="requested_by.username", read_only=True)
+
+    class Meta:
+        model = ModificationRequest
+        fields = [
+            "id", "name", "entity_type", "entity_id", "action",
+            "requested_by", "requested_by_username", "old_data", "new_data",
+            "status", "reviewed_by", "reviewed_at", "created_at",
+        ]
+        read_only_fields = fields
+
+
+class AuditLogSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source="user.username", read_only=True)
+
+    class Meta:
+        model = AuditLog
+        fields = [
+            "id", "user", "username", "entity_type", "entity_id", "action",
+            "old_data", "new_data", "created_at",
+        ]
+        read_only_fields = fields
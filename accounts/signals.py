@@ -0,0 +1,130 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import dedup, key_figures, payloads, rollups, search, sync
+from .authentication import set_token_epoch
+from .models import AuditLog, DemographicData, ModificationRequest, Permission, PermissionRole, Person, Role, User
+from .rbac import permission_matrix
+
+# أي تغيير على هذه الحقول يبطل التوكنات الصادرة سابقاً (كلها منسوخة في claims التوكن)
+TOKEN_SENSITIVE_FIELDS = ( "role_id" , "status" , "governorate_id" , "area_id" , "subarea_id" )
+
+
+@receiver( pre_save , sender = User )
+def detect_token_sensitive_change( sender , instance , **kwargs ) :
+    instance._revoke_tokens = False
+    if not instance.pk :
+        return
+
+    # set_password() يترك كلمة المرور الخام في _password حتى الحفظ،
+    # أما ترقية الـ hash عند تسجيل الدخول فتمسحها، فلا تبطل الجلسات
+    if instance._password is not None :
+        instance._revoke_tokens = True
+        return
+
+    old = User.objects.filter( pk = instance.pk ).values( *TOKEN_SENSITIVE_FIELDS ).first()
+    if old is None :
+        return
+
+    instance._revoke_tokens = any(
+        old[field] != getattr( instance , field ) for field in TOKEN_SENSITIVE_FIELDS
+    )
+
+
+@receiver( post_save , sender = User )
+def bump_token_epoch( sender , instance , created , **kwargs ) :
+    if created or not getattr( instance , "_revoke_tokens" , False ) :
+        return
+
+    User.objects.filter( pk = instance.pk ).update( token_epoch = F( "token_epoch" ) + 1 )
+    instance.token_epoch = User.objects.values_list( "token_epoch" , flat = True ).get( pk = instance.pk )
+    instance._revoke_tokens = False
+    user_id , epoch = instance.pk , instance.token_epoch
+    transaction.on_commit( lambda : set_token_epoch( user_id , epoch ) )
+
+
+@receiver( post_save , sender = PermissionRole )
+@receiver( post_delete , sender = PermissionRole )
+@receiver( post_save , sender = Permission )
+@receiver( post_delete , sender = Permission )
+@receiver( post_save , sender = Role )
+@receiver( post_delete , sender = Role )
+def invalidate_permission_matrix( sender , **kwargs ) :
+    permission_matrix.invalidate()
+
+
+@receiver( pre_save , sender = DemographicData )
+def remember_demographic_row( sender , instance , **kwargs ) :
+    instance._rollup_old_row = None
+    if instance.pk :
+        instance._rollup_old_row = (
+            DemographicData.objects.filter( pk = instance.pk ).values( *rollups.ROW_FIELDS ).first()
+        )
+
+
+@receiver( post_save , sender = DemographicData )
+def update_demographic_rollups( sender , instance , **kwargs ) :
+    rollups.apply_change( getattr( instance , "_rollup_old_row" , None ) , rollups.row_values( instance ) )
+    instance._rollup_old_row = None
+
+
+@receiver( post_delete , sender = DemographicData )
+def remove_demographic_rollups( sender , instance , **kwargs ) :
+    rollups.apply_change( rollups.row_values( instance ) , None )
+
+
+@receiver( post_save , sender = Person )
+def index_person( sender , instance , **kwargs ) :
+    # الحذف يتم تلقائياً (CASCADE على PersonSearchToken و PersonBlockKey)
+    search.reindex( [instance.pk] )
+    dedup.refresh_block_keys( [instance.pk] )
+
+
+def index_key_figure_link( sender , instance , **kwargs ) :
+    key_figures.sync_links( key_figures.LINK_DIMENSIONS[sender] , [instance.pk] )
+
+
+def unindex_key_figure_link( sender , instance , **kwargs ) :
+    key_figures.remove_links( key_figures.LINK_DIMENSIONS[sender] , [instance.pk] )
+
+
+def reindex_key_figure_parent( sender , instance , created , **kwargs ) :
+    if not created :
+        key_figures.sync_parent( key_figures.PARENT_DIMENSIONS[sender] , instance )
+
+
+for link_model in key_figures.LINK_DIMENSIONS :
+    post_save.connect( index_key_figure_link , sender = link_model )
+    post_delete.connect( unindex_key_figure_link , sender = link_model )
+
+for parent_model in key_figures.PARENT_DIMENSIONS :
+    post_save.connect( reindex_key_figure_parent , sender = parent_model )
+
+
+@receiver( pre_save , sender = AuditLog )
+@receiver( pre_save , sender = ModificationRequest )
+def compact_payload( sender , instance , **kwargs ) :
+    # الصفوف الجديدة فقط، الدفعات (bulk_create) تستدعي payloads.prepare مباشرة
+    if instance._state.adding :
+        payloads.prepare( sender , [instance] )
+
+
+def record_sync_tombstone( sender , instance , **kwargs ) :
+    sync.record_deletion( instance )
+
+
+def remember_sync_village( sender , instance , **kwargs ) :
+    instance._sync_old_village = sync.stored_village( sender , instance.pk ) if instance.pk else None
+
+
+def record_sync_move( sender , instance , created , **kwargs ) :
+    if not created :
+        sync.record_moves( sender , [instance] , { instance.pk : getattr( instance , "_sync_old_village" , None ) } )
+
+
+for sync_model in sync.SYNC_MODELS.values() :
+    post_delete.connect( record_sync_tombstone , sender = sync_model )
+    pre_save.connect( remember_sync_village , sender = sync_model )
+    post_save.connect( record_sync_move , sender = sync_model )
@@ -0,0 +1,176 @@
+import base64
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import IntegerField, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .exporter import EXPORT_MODELS
+from .models import SyncTombstone
+
+# نفس الجداول القابلة للتصدير: كل ما يرتبط بقرية
+SYNC_MODELS = EXPORT_MODELS
+SYNC_ENTITY_TYPES = { model : entity_type for entity_type , model in SYNC_MODELS.items() }
+
+# الصفوف الأحدث من هذا لا تُرسل بعد: updated_at يُضبط قبل الـ commit،
+# فصف بتاريخ أقدم قد يظهر بعد صف أحدث منه ويفوت العميل لو أرسلنا حتى اللحظة الحالية.
+# هذا هو الضمان الوحيد: معاملة كتابة أطول من SYNC_LAG (دفعة استيراد كبيرة، approve لآلاف الطلبات)
+# قد تثبت صفوفاً بتاريخ أقدم من علامة عميل زامن أثناءها، فلا يستلمها حتى تتعدل مجدداً أو يعيد التحميل.
+# يجب أن تكون SYNC_LAG_SECONDS أكبر من أطول معاملة كتابة متوقعة على هذه الجداول.
+SYNC_LAG = timedelta( seconds = getattr( settings , "SYNC_LAG_SECONDS" , 5 ) )
+# مدة الاحتفاظ بسجلات الحذف؛ العميل الأقدم منها يعيد التحميل كاملاً
+TOMBSTONE_RETENTION = timedelta( days = getattr( settings , "SYNC_TOMBSTONE_RETENTION_DAYS" , 90 ) )
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+
+class InvalidToken( Exception ) :
+    pass
+
+
+def village_of( instance ) :
+    """village_id للصف عبر مسار القرية في مديره (village أو agricultural_status__village ...)"""
+    path = type( instance )._default_manager.all().village_field.split( "__" )
+    try :
+        for name in path[:-1] :
+            instance = getattr( instance , name )
+    except ObjectDoesNotExist :
+        return None
+    return getattr( instance , f"{path[-1]}_id" )
+
+
+def stored_village( model , pk ) :
+    """village_id المحفوظ في القاعدة حالياً للصف (قبل حفظ التعديل)"""
+    village_field = model._default_manager.all().village_field
+    return model._base_manager.filter( pk = pk ).values_list( f"{village_field}_id" , flat = True ).first()
+
+
+def old_villages( model , old_rows ) -> dict :
+    """{pk: village_id} من نسخ الصفوف قبل bulk_update (snapshot بأسماء attname)"""
+    if not old_rows :
+        return {}
+    path = model._default_manager.all().village_field.split( "__" )
+    first = model._meta.get_field( path[0] )
+    parent_ids = { pk : row.get( first.attname ) for pk , row in old_rows.items() }
+    if len( path ) == 1 :
+        return parent_ids
+
+    villages = dict( first.related_model._base_manager.filter( pk__in = set( parent_ids.values() ) ).values_list(
+        "pk" , "__".join( path[1:] ) + "_id"
+    ) )
+    return { pk : villages.get( parent_id ) for pk , parent_id in parent_ids.items() }
+
+
+def record_deletion( instance , village_id = None ) :
+    SyncTombstone.objects.create(
+        entity_type = SYNC_ENTITY_TYPES[type( instance )] , entity_id = instance.pk ,
+        village_id = village_id if village_id is not None else village_of( instance ) ,
+    )
+
+
+def record_moves( model , instances , old_village_ids : dict ) :
+    """
+    صف انتقل إلى قرية أخرى يختفي من نطاق عملاء القرية القديمة دون حذف:
+    سجل حذف على القرية القديمة يجعلهم يحذفونه (ومن بقي الصف ضمن نطاقه يستلمه من جديد، انظر changes).
+    """
+    moved = []
+    for instance in instances :
+        old_village_id = old_village_ids.get( instance.pk )
+        if old_village_id is not None and old_village_id != village_of( instance ) :
+            moved.append( SyncTombstone(
+                entity_type = SYNC_ENTITY_TYPES[model] , entity_id = instance.pk , village_id = old_village_id ,
+            ) )
+    SyncTombstone.objects.bulk_create( moved )
+
+
+def encode_token( row_mark , tombstone_id , synced_at , scope = None ) -> str :
+    updated_at , row_id = row_mark if row_mark else ( None , 0 )
+    if hasattr( updated_at , "isoformat" ) :
+        updated_at = updated_at.isoformat()
+    data = { "r" : [ updated_at , row_id ] , "t" : tombstone_id , "s" : synced_at.isoformat() , "v" : scope }
+    return base64.urlsafe_b64encode( json.dumps( data , separators = ( "," , ":" ) ).encode() ).decode()
+
+
+def decode_token( token : str , int_timestamps : bool ) :
+    """(row_mark أو None, tombstone_id, synced_at, scope)"""
+    try :
+        data = json.loads( base64.urlsafe_b64decode( token.encode() ) )
+        updated_at , row_id = data["r"]
+        synced_at = parse_datetime( data["s"] )
+        if updated_at is not None and not int_timestamps :
+            updated_at = parse_datetime( updated_at )
+        if synced_at is None or ( updated_at is None and row_id ) :
+            raise ValueError
+        row_mark = ( updated_at , int( row_id ) ) if updated_at is not None else None
+        return row_mark , int( data["t"] ) , synced_at , data.get( "v" )
+    except ( ValueError , TypeError , KeyError , AttributeError ) :
+        raise InvalidToken()
+
+
+def _uses_int_timestamps( model ) -> bool :
+    # IndustrialZone.updated_at رقم (timestamp)
+    return isinstance( model._meta.get_field( "updated_at" ) , IntegerField )
+
+
+def changes( entity_type , rows , village_ids , token = None , limit = DEFAULT_LIMIT , scope = None ) -> dict :
+    """
+    الصفوف المتغيرة والمحذوفة بعد علامة token لنوع كيان واحد.
+    rows: QuerySet مفلتر على نطاق المستخدم، village_ids: قرى النطاق لسجلات الحذف (None = الكل).
+    scope: نطاق المستخدم الحالي كنص ("area:3"، None للكل)، يُحفظ في العلامة؛ تغيره يعني reset
+    لأن الصفوف التي خرجت من النطاق لا سجلات حذف لها.
+    كل استعلام مسح محدود على فهرس (village, updated_at, id) أو (entity_type, village_id, id).
+    """
+    model = rows.model
+    int_timestamps = _uses_int_timestamps( model )
+    now = timezone.now()
+    cutoff = now - SYNC_LAG
+    row_cutoff = int( time.time() - SYNC_LAG.total_seconds() ) if int_timestamps else cutoff
+
+    tombstones = SyncTombstone.objects.filter( entity_type = entity_type , deleted_at__lte = cutoff )
+    if village_ids is not None :
+        tombstones = tombstones.filter( village_id__in = village_ids )
+
+    if token :
+        row_mark , tombstone_id , synced_at , token_scope = decode_token( token , int_timestamps )
+        if synced_at < now - TOMBSTONE_RETENTION or token_scope != scope :
+            # سجلات الحذف بعد آخر مزامنة ربما حُذفت، أو تغير نطاق المستخدم:
+            # البيانات المحلية لا يمكن تصحيحها تدريجياً
+            return { "reset" : True , "rows" : [] , "deleted" : [] , "next" : None , "has_more" : False }
+    else :
+        # أول مزامنة: كل الصفوف، ولا حاجة لسجلات الحذف السابقة
+        row_mark , synced_at = None , now
+        tombstone_id = SyncTombstone.objects.aggregate( last = Max( "id" ) )["last"] or 0
+
+    scoped = rows
+    rows = rows.filter( updated_at__lte = row_cutoff )
+    if row_mark :
+        updated_at , row_id = row_mark
+        rows = rows.filter( Q( updated_at__gt = updated_at ) | Q( updated_at = updated_at , id__gt = row_id ) )
+
+    fields = [field.attname for field in model._meta.concrete_fields]
+    page = list( rows.order_by( "updated_at" , "id" ).values( *fields )[:limit + 1] )
+    deleted = list( tombstones.filter( id__gt = tombstone_id ).order_by( "id" ).values_list( "id" , "entity_id" )[:limit + 1] )
+
+    has_more = len( page ) > limit or len( deleted ) > limit
+    page , deleted = page[:limit] , deleted[:limit]
+    if page :
+        row_mark = ( page[-1]["updated_at"] , page[-1]["id"] )
+    if deleted :
+        tombstone_id = deleted[-1][0]
+        # سجل حذف لصف نُقل بين قريتين كلتاهما ضمن النطاق: الصف ما زال عند العميل ويصله تعديله مع rows
+        visible = set( scoped.filter( pk__in = [entity_id for _ , entity_id in deleted] ).values_list( "pk" , flat = True ) )
+        deleted = [( tombstone , entity_id ) for tombstone , entity_id in deleted if entity_id not in visible]
+
+    return {
+        "reset" : False ,
+        "rows" : page ,
+        "deleted" : [entity_id for _ , entity_id in deleted] ,
+        # synced_at يتقدم فقط عندما يصل العميل لآخر التغييرات
+        "next" : encode_token( row_mark , tombstone_id , synced_at if has_more else now , scope ) ,
+        "has_more" : has_more ,
+    }
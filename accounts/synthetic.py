@@ -0,0 +1,667 @@
+import math
+import random
+from array import array
+from collections import Counter, defaultdict
+from itertools import accumulate
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from . import payloads
+from .entities import ENTITY_MODELS
+from .models import (
+    AgriculturalCrop,
+    AgriculturalStatus,
+    ArchaeologicalSite,
+    Area,
+    AuditLog,
+    CommercialActivity,
+    Crop,
+    DemographicData,
+    Ethnicity,
+    EthnicityKeyFigure,
+    Governorate,
+    GovernmentDepartment,
+    IndustrialFacility,
+    IndustrialZone,
+    Livestock,
+    ModificationRequest,
+    NaturalAsset,
+    Person,
+    Role,
+    Sect,
+    SubArea,
+    TourismFacility,
+    Tribe,
+    User,
+    UserHistory,
+    Village,
+    VillageEthnicity,
+    VillageSect,
+    VillageSectKeyFigure,
+    VillageTribe,
+    VillageTribeKeyFigure,
+)
+
+EntityType = ModificationRequest.EntityType
+ENTITY_TYPES = { model : entity_type for entity_type , model in ENTITY_MODELS.items() }
+# جداول old_data / new_data: تمر دفعاتها على payloads.prepare قبل الكتابة
+PAYLOAD_MODELS = ( AuditLog , ModificationRequest )
+
+# متوسط عدد القرى في الناحية والنواحي في المنطقة، وأقصى عدد محافظات
+VILLAGES_PER_SUBAREA = 25
+SUBAREAS_PER_AREA = 5
+MAX_GOVERNORATES = 14
+
+# عدد الأشخاص المحفوظين لكل قرية للربط كشخصيات مؤثرة أو مالكين
+PERSONS_PER_VILLAGE_POOL = 8
+# نسبة الأشخاص المولدين كنسخة مكررة بتهجئة مختلفة (لاختبار كشف التكرار)
+DUPLICATE_RATE = 0.02
+
+FIRST_NAMES = (
+    "محمد" , "أحمد" , "علي" , "حسن" , "حسين" , "خالد" , "عمر" , "يوسف" , "إبراهيم" , "مصطفى" ,
+    "عبد الله" , "عبد الرحمن" , "سليمان" , "جاسم" , "ياسر" , "سامر" , "ماهر" , "فادي" , "رامي" , "وائل" ,
+    "بسام" , "نزار" , "هيثم" , "طارق" , "زياد" , "منذر" , "غسان" , "عدنان" , "فيصل" , "ناصر" ,
+    "فاطمة" , "مريم" , "خديجة" , "زينب" , "عائشة" , "رنا" , "هدى" , "سلمى" , "ليلى" , "نور" ,
+)
+FAMILY_NAMES = (
+    "الحسن" , "العلي" , "الأحمد" , "الخطيب" , "الشامي" , "المصري" , "الحمصي" , "الزعبي" , "العمر" , "السليمان" ,
+    "النجار" , "الحداد" , "الخياط" , "الدباغ" , "العطار" , "القاسم" , "الصالح" , "الجاسم" , "المحمد" , "الحسين" ,
+    "الرفاعي" , "الشيخ" , "الدرويش" , "البكري" , "الحلبي" , "الإدلبي" , "الحموي" , "العبد الله" , "الخليل" , "الموسى" ,
+)
+VILLAGE_PREFIXES = ( "تل" , "عين" , "كفر" , "دير" , "بيت" , "أم" , "خربة" , "مزرعة" , "جب" , "قصر" )
+VILLAGE_ROOTS = (
+    "الزيتون" , "النخيل" , "الرمان" , "العنب" , "الورد" , "الصفصاف" , "البلوط" , "الحجر" , "الماء" , "الريح" ,
+    "الغنطو" , "الدار" , "النهر" , "الجسر" , "البرج" , "الطاحون" , "السنديان" , "التين" , "القمح" , "الشعير" ,
+)
+SECTS = ( "طائفة 1" , "طائفة 2" , "طائفة 3" , "طائفة 4" , "طائفة 5" , "طائفة 6" )
+ETHNICITIES = ( "عرب" , "كرد" , "تركمان" , "شركس" , "أرمن" , "سريان" )
+CROPS = (
+    "قمح" , "شعير" , "عدس" , "حمص" , "قطن" , "شوندر سكري" , "زيتون" , "تفاح" , "عنب" , "رمان" ,
+    "بطاطا" , "بندورة" , "خيار" , "فول" , "ذرة" ,
+)
+DEPARTMENTS = ( "البلدية" , "المدرسة" , "المركز الصحي" , "مركز البريد" , "الوحدة الإرشادية" , "مخفر الشرطة" )
+FEEDS = ( "شعير" , "تبن" , "نخالة" , "ذرة علفية" )
+MILK_PRODUCTS = ( "حليب" , "لبن" , "جبن" , "سمن" )
+WATER_RESOURCES = ( "آبار" , "ينابيع" , "قنوات ري" , "سدود" )
+
+# تغييرات تهجئة شائعة بين الإدخالات المكررة
+SPELLING_VARIANTS = ( ( "أ" , "ا" ) , ( "ة" , "ه" ) , ( "ى" , "ي" ) , ( "إ" , "ا" ) )
+
+
+class GenerationFailed( Exception ) :
+    pass
+
+
+def _choices_values( choices_class ) :
+    return [value for value , _ in choices_class.choices]
+
+
+class SyntheticDataGenerator :
+    """
+    بيانات تجريبية لكل الجداول بحجم قابل للتعديل (مثلاً 20k قرية، 1M شخص، 10 سنوات) لاختبار الأداء.
+    التوليد بترتيب المفاتيح الخارجية (الحسابات -> التسلسل الإداري -> الأشخاص -> البيانات السنوية -> السجلات)،
+    وكل جدول يُكتب بـ bulk_create على دفعات. لكل جدول مولد عشوائي مستقل مشتق من seed واسم الجدول،
+    فنفس الخيارات تعطي نفس البيانات، وتغيير حجم جدول لا يغير محتوى الجداول الأخرى.
+    الجداول المشتقة (المجاميع، فهرس البحث، ...) لا تُحدث هنا لأن bulk_create لا يطلق الإشارات؛ انظر rebuild_derived.
+    """
+
+    def __init__(
+        self , seed = 1 , villages = 200 , persons = 10000 , years = 3 , end_year = None ,
+        users = 20 , audit_logs = None , modification_requests = None , batch_size = 5000 , log = None ,
+    ) :
+        self.seed = seed
+        self.payload_fields = {}
+        self.village_count = villages
+        self.person_count = persons
+        self.end_year = end_year or date.today().year
+        self.years = list( range( self.end_year - years + 1 , self.end_year + 1 ) )
+        self.user_count = users
+        # الافتراضي: سجل تدقيق لكل شخص تقريباً، وطلب تعديل لكل عشرة
+        self.audit_log_count = persons if audit_logs is None else audit_logs
+        self.modification_request_count = persons // 10 if modification_requests is None else modification_requests
+        self.batch_size = batch_size
+        self.log = log or ( lambda message : None )
+
+        self.counts = {}
+        # ids المولدة لكل نوع كيان، لربط سجلات التدقيق وطلبات التعديل بصفوف موجودة
+        self.ids = defaultdict( lambda : array( "q" ) )
+        self.user_ids = []
+        self.villages = []
+        self.village_weights = {}
+        self.village_persons = defaultdict( list )
+
+    def rng( self , name : str ) -> random.Random :
+        return random.Random( f"{self.seed}:{name}" )
+
+    def moment( self , rng , year ) -> datetime :
+        start = datetime( year , 1 , 1 , tzinfo = dt_timezone.utc )
+        return start + timedelta( seconds = rng.randrange( 365 * 24 * 3600 ) )
+
+    def write( self , model , objects , collect = None ) -> int :
+        """bulk_create على دفعات بحجم batch_size، كل دفعة في معاملة. collect تستقبل كل دفعة بعد تعبئة pk"""
+        total = 0
+        batch = []
+        for instance in objects :
+            batch.append( instance )
+            if len( batch ) >= self.batch_size :
+                total += self._flush( model , batch , collect )
+                batch = []
+        if batch :
+            total += self._flush( model , batch , collect )
+
+        self.counts[model.__name__] = self.counts.get( model.__name__ , 0 ) + total
+        self.log( f"{model.__name__}: {total}" )
+        return total
+
+    def _flush( self , model , batch , collect ) -> int :
+        with transaction.atomic() :
+            if model in PAYLOAD_MODELS :
+                # نفس صيغة التخزين التي يكتبها التطبيق (فروقات فوق آخر صف للكيان)، انظر payloads.prepare.
+                # prepare لا يربط صفين لنفس الكيان في دفعة واحدة، فالدفعة تُكتب على أجيال:
+                # أول ظهور لكل كيان، ثم الثاني فوقه، وهكذا
+                for generation in self._payload_generations( batch ) :
+                    payloads.prepare( model , generation )
+                    model._base_manager.bulk_create( generation , batch_size = self.batch_size )
+            else :
+                model._base_manager.bulk_create( batch , batch_size = self.batch_size )
+
+        entity_type = ENTITY_TYPES.get( model )
+        if entity_type :
+            self.ids[entity_type].extend( instance.pk for instance in batch )
+        if collect :
+            collect( batch )
+        return len( batch )
+
+    @staticmethod
+    def _payload_generations( batch ) -> list :
+        seen = Counter()
+        generations = []
+        for row in batch :
+            key = ( row.entity_type , row.entity_id )
+            if seen[key] == len( generations ) :
+                generations.append( [] )
+            generations[seen[key]].append( row )
+            seen[key] += 1
+        return generations
+
+    def lookup( self , model , names , **extra ) -> list :
+        """ids جداول الأسماء الصغيرة: الموجود يُستخدم كما هو والناقص يُنشأ"""
+        existing = dict( model._base_manager.filter( name__in = names ).values_list( "name" , "id" ) )
+        missing = [model( name = name , **extra ) for name in names if name not in existing]
+        model._base_manager.bulk_create( missing )
+        existing.update( { instance.name : instance.pk for instance in missing } )
+        self.counts[model.__name__] = self.counts.get( model.__name__ , 0 ) + len( missing )
+        return [existing[name] for name in names]
+
+    def run( self ) -> dict :
+        if not connection.features.can_return_rows_from_bulk_insert :
+            raise GenerationFailed( "قاعدة البيانات لا ترجع ids من bulk_create (مطلوب PostgreSQL أو SQLite حديث)" )
+
+        self.generate_users()
+        self.generate_hierarchy()
+        self.generate_persons()
+        self.generate_village_groups()
+        self.generate_yearly_data()
+        self.generate_user_history()
+        self.generate_audit_logs()
+        self.generate_modification_requests()
+        return self.counts
+
+    def generate_users( self ) :
+        prefix = f"synthetic{self.seed}_"
+        if User.objects.filter( username__startswith = prefix ).exists() :
+            raise GenerationFailed( f"بيانات هذا الـ seed مولدة مسبقاً ({prefix}*)، استخدم seed آخر" )
+
+        roles = self.lookup( Role , [ "data_entry" , "area_manager" ] )
+        rng = self.rng( "users" )
+        # كلمة مرور غير صالحة لتسجيل الدخول، محسوبة مرة واحدة بدل hash لكل مستخدم
+        password = make_password( None )
+        users = [
+            User(
+                username = f"{prefix}{index}" , email = f"{prefix}{index}@example.com" , password = password ,
+                first_name = rng.choice( FIRST_NAMES ) , last_name = rng.choice( FAMILY_NAMES ) ,
+                role_id = rng.choice( roles ) ,
+            )
+            for index in range( max( self.user_count , 1 ) )
+        ]
+        self.write( User , users )
+        self.user_ids = [user.pk for user in users]
+
+    def generate_hierarchy( self ) :
+        rng = self.rng( "hierarchy" )
+        subarea_count = max( 1 , math.ceil( self.village_count / VILLAGES_PER_SUBAREA ) )
+        area_count = max( 1 , math.ceil( subarea_count / SUBAREAS_PER_AREA ) )
+        governorate_count = min( MAX_GOVERNORATES , area_count )
+
+        governorates = [Governorate( name = f"محافظة {self.seed}-{index + 1}" ) for index in range( governorate_count )]
+        self.write( Governorate , governorates )
+        areas = [
+            Area( name = f"منطقة {self.seed}-{index + 1}" , governorate_id = governorates[index % governorate_count].pk )
+            for index in range( area_count )
+        ]
+        self.write( Area , areas )
+        subareas = [
+            SubArea( name = f"ناحية {self.seed}-{index + 1}" , area_id = rng.choice( areas ).pk )
+            for index in range( subarea_count )
+        ]
+        self.write( SubArea , subareas )
+        area_of = { subarea.pk : subarea.area_id for subarea in subareas }
+
+        village_types = _choices_values( Village.VillageType )
+        villages = []
+        for index in range( self.village_count ) :
+            village_type = rng.choices( village_types , weights = ( 6 , 2 , 1 , 1 ) )[0]
+            name = f"{rng.choice( VILLAGE_PREFIXES )} {rng.choice( VILLAGE_ROOTS )}"
+            villages.append( Village(
+                name = name if rng.random() < 0.7 else f"{name} {index}" ,
+                subarea_id = subareas[index % subarea_count].pk ,
+                type = village_type ,
+                parent_name = rng.choice( VILLAGE_ROOTS ) if village_type.startswith( "village_under" ) else None ,
+            ) )
+        self.write( Village , villages )
+
+        for village in villages :
+            self.villages.append( ( village.pk , area_of[village.subarea_id] ) )
+            # أحجام القرى غير متساوية: قلة من المدن الكبيرة والباقي قرى صغيرة
+            weight = rng.lognormvariate( 0 , 0.9 ) * ( 5 if village.type == Village.VillageType.CITY else 1 )
+            self.village_weights[village.pk] = weight
+
+    def person_name( self , rng ) -> str :
+        return f"{rng.choice( FIRST_NAMES )} {rng.choice( FIRST_NAMES[:30] )} {rng.choice( FAMILY_NAMES )}"
+
+    def misspell( self , rng , name : str ) -> str :
+        for old , new in rng.sample( SPELLING_VARIANTS , len( SPELLING_VARIANTS ) ) :
+            if old in name :
+                return name.replace( old , new , 1 )
+        return name[:-1]
+
+    def generate_persons( self ) :
+        rng = self.rng( "persons" )
+        sects = self.lookup( Sect , list( SECTS ) )
+        ethnicities = self.lookup( Ethnicity , list( ETHNICITIES ) )
+        tribes = self.lookup( Tribe , [f"عشيرة {name.removeprefix( 'ال' )}" for name in FAMILY_NAMES] )
+        self.sects , self.ethnicities , self.tribes = sects , ethnicities , tribes
+
+        village_ids = [village_id for village_id , _ in self.villages]
+        weights = [self.village_weights[village_id] for village_id in village_ids]
+        per_village = Counter( rng.choices( village_ids , weights = weights , k = self.person_count ) )
+        area_of = dict( self.villages )
+
+        def persons() :
+            # مرتبة حسب القرية كما في الإدخال الفعلي (دفعة لكل قرية)
+            for village_id in village_ids :
+                previous = None
+                for _ in range( per_village[village_id] ) :
+                    if previous and rng.random() < DUPLICATE_RATE :
+                        name , phone = self.misspell( rng , previous.name ) , previous.phone
+                    else :
+                        name = self.person_name( rng )
+                        phone = f"09{rng.randrange( 10 ** 8 ):08d}" if rng.random() < 0.7 else None
+                    person = Person(
+                        name = name , phone = phone , village_id = village_id , area_id = area_of[village_id] ,
+                        sect_id = rng.choice( sects ) if rng.random() < 0.8 else None ,
+                        ethnicity_id = rng.choice( ethnicities ) if rng.random() < 0.8 else None ,
+                        tribe_id = rng.choice( tribes ) if rng.random() < 0.5 else None ,
+                        work = rng.choice( ( "مزارع" , "موظف" , "تاجر" , "مدرس" , "طبيب" , "حرفي" , None ) ) ,
+                        created_by_id = rng.choice( self.user_ids ) ,
+                        created_at = self.moment( rng , rng.choice( self.years ) ) ,
+                    )
+                    previous = person
+                    yield person
+
+        def collect( batch ) :
+            for person in batch :
+                pool = self.village_persons[person.village_id]
+                if len( pool ) < PERSONS_PER_VILLAGE_POOL :
+                    pool.append( person.pk )
+
+        self.write( Person , persons() , collect )
+
+    def key_figures( self , rng , village_id ) -> list :
+        pool = self.village_persons.get( village_id , [] )
+        return rng.sample( pool , min( len( pool ) , rng.randint( 0 , 3 ) ) )
+
+    def generate_village_groups( self ) :
+        """الطوائف (لكل قرية) والأعراق والعشائر (لكل قرية وسنة) مع الشخصيات المؤثرة"""
+        rng = self.rng( "village_groups" )
+        users = self.user_ids
+
+        village_sects = (
+            VillageSect(
+                village_id = village_id , sect_id = sect_id , created_by_id = rng.choice( users ) ,
+                family_count = rng.randint( 5 , 500 ) , individual_count = rng.randint( 20 , 3000 ) ,
+            )
+            for village_id , _ in self.villages for sect_id in rng.sample( self.sects , rng.randint( 1 , 3 ) )
+        )
+        sect_links = []
+        self.write( VillageSect , village_sects , lambda batch : sect_links.extend(
+            ( row.pk , row.village_id ) for row in batch
+        ) )
+        self.write( VillageSectKeyFigure , (
+            VillageSectKeyFigure( village_sect_id = row_id , person_id = person_id , created_by_id = rng.choice( users ) )
+            for row_id , village_id in sect_links for person_id in self.key_figures( rng , village_id )
+        ) )
+
+        # نفس مجموعات القرية كل سنة مع تغير الأعداد، والشخصيات المؤثرة لآخر سنة فقط
+        groups = {
+            village_id : (
+                rng.sample( self.ethnicities , rng.randint( 1 , 2 ) ) , rng.sample( self.tribes , rng.randint( 1 , 3 ) ) ,
+            )
+            for village_id , _ in self.villages
+        }
+        latest = self.years[-1]
+
+        ethnicity_links = []
+        self.write( VillageEthnicity , (
+            VillageEthnicity(
+                village_id = village_id , ethnicity_id = ethnicity_id , year = year ,
+                family_count = rng.randint( 5 , 500 ) , individual_count = rng.randint( 20 , 3000 ) ,
+            )
+            for year in self.years for village_id , ( ethnicity_ids , _ ) in groups.items() for ethnicity_id in ethnicity_ids
+        ) , lambda batch : ethnicity_links.extend( ( row.pk , row.village_id ) for row in batch if row.year == latest ) )
+        self.write( EthnicityKeyFigure , (
+            EthnicityKeyFigure( village_ethnicity_id = row_id , person_id = person_id , created_by_id = rng.choice( users ) )
+            for row_id , village_id in ethnicity_links for person_id in self.key_figures( rng , village_id )
+        ) )
+
+        tribe_links = []
+        self.write( VillageTribe , (
+            VillageTribe( village_id = village_id , tribe_id = tribe_id , year = year , individual_count = rng.randint( 20 , 3000 ) )
+            for year in self.years for village_id , ( _ , tribe_ids ) in groups.items() for tribe_id in tribe_ids
+        ) , lambda batch : tribe_links.extend( ( row.pk , row.village_id ) for row in batch if row.year == latest ) )
+        self.write( VillageTribeKeyFigure , (
+            VillageTribeKeyFigure( village_tribe_id = row_id , person_id = person_id , created_by_id = rng.choice( users ) )
+            for row_id , village_id in tribe_links for person_id in self.key_figures( rng , village_id )
+        ) )
+
+    def percentage( self , rng , low = 0 , high = 100 ) -> Decimal :
+        return Decimal( rng.uniform( low , high ) ).quantize( Decimal( "0.01" ) )
+
+    def owner( self , rng , village_id ) :
+        pool = self.village_persons.get( village_id )
+        return rng.choice( pool ) if pool and rng.random() < 0.5 else None
+
+    def generate_yearly_data( self ) :
+        rng = self.rng( "yearly" )
+        users = self.user_ids
+        village_years = [( village_id , year ) for year in self.years for village_id , _ in self.villages]
+
+        self.write( Livestock , (
+            Livestock(
+                village_id = village_id , year = year , created_by_id = rng.choice( users ) ,
+                cows_count = rng.randint( 0 , 2000 ) , sheep_count = rng.randint( 0 , 10000 ) ,
+                poultry_count = rng.randint( 0 , 50000 ) , camels_count = rng.randint( 0 , 50 ) , fish_count = rng.randint( 0 , 1000 ) ,
+                feeds = { feed : rng.randint( 1 , 500 ) for feed in rng.sample( FEEDS , 2 ) } ,
+                milk_products = { product : rng.randint( 1 , 1000 ) for product in rng.sample( MILK_PRODUCTS , 2 ) } ,
+                grazing_areas = rng.randint( 0 , 20 ) , grazing_areas_size = rng.randint( 0 , 5000 ) ,
+                meat_production = rng.randint( 0 , 500 ) , egg_production = rng.randint( 0 , 100000 ) ,
+                breeders_count = rng.randint( 0 , 300 ) , veterinarians_count = rng.randint( 0 , 5 ) ,
+                created_at = self.moment( rng , year ) ,
+            )
+            for village_id , year in village_years
+        ) )
+
+        def demographic( village_id , year ) :
+            population = int( self.village_weights[village_id] * rng.uniform( 800 , 1200 ) * ( 1 + ( year - self.years[0] ) * 0.02 ) )
+            male = self.percentage( rng , 45 , 55 )
+            return DemographicData(
+                village_id = village_id , year = year , created_by_id = rng.choice( users ) ,
+                area = Decimal( rng.uniform( 1 , 50 ) ).quantize( Decimal( "0.01" ) ) ,
+                population = population , number_of_families = population // rng.randint( 4 , 7 ) ,
+                male_percentage = male , female_percentage = Decimal( 100 ) - male ,
+                number_of_martyrs = rng.randint( 0 , 50 ) , number_of_injured = rng.randint( 0 , 100 ) ,
+                number_of_detainees = rng.randint( 0 , 50 ) ,
+                displaced_percentage = self.percentage( rng , 0 , 60 ) , returned_percentage = self.percentage( rng , 0 , 60 ) ,
+                unemployment_percentage = self.percentage( rng , 5 , 50 ) , poverty_percentage = self.percentage( rng , 10 , 80 ) ,
+                wealth_percentage = self.percentage( rng , 0 , 20 ) ,
+                government_workers_percentage = self.percentage( rng , 0 , 40 ) ,
+                private_sector_workers_percentage = self.percentage( rng , 0 , 40 ) ,
+                elderly_percentage = self.percentage( rng , 5 , 25 ) , farmers_percentage = self.percentage( rng , 0 , 70 ) ,
+                industrial_workers_percentage = self.percentage( rng , 0 , 30 ) , traders_percentage = self.percentage( rng , 0 , 30 ) ,
+                craftsmen_percentage = self.percentage( rng , 0 , 20 ) , expatriates_percentage = self.percentage( rng , 0 , 30 ) ,
+                created_at = self.moment( rng , year ) ,
+            )
+
+        self.write( DemographicData , ( demographic( village_id , year ) for village_id , year in village_years ) )
+
+        self.write( IndustrialZone , (
+            IndustrialZone(
+                village_id = village_id , year = year , created_by_id = rng.choice( users ) ,
+                number_of_facilities = rng.randint( 0 , 50 ) , number_of_shops = rng.randint( 0 , 200 ) ,
+                number_of_workers = rng.randint( 0 , 2000 ) , annual_revenue = rng.randint( 0 , 10 ** 8 ) ,
+                # IndustrialZone يخزن الوقت كـ timestamp
+                created_at = int( self.moment( rng , year ).timestamp() ) , updated_at = int( self.moment( rng , year ).timestamp() ) ,
+            )
+            for village_id , year in village_years if rng.random() < 0.3
+        ) )
+
+        self.generate_agriculture( rng , village_years )
+
+        self.write( GovernmentDepartment , (
+            GovernmentDepartment(
+                village_id = village_id , year = year , department_name = name ,
+                ministry_name = rng.choice( _choices_values( GovernmentDepartment.MinistryName ) ) ,
+                director_name = self.person_name( rng ) , staff_count = rng.randint( 1 , 80 ) ,
+                created_at = self.moment( rng , year ) ,
+            )
+            for village_id , year in village_years for name in rng.sample( DEPARTMENTS , rng.randint( 0 , 3 ) )
+        ) )
+
+        self.generate_facilities( rng , village_years )
+
+    def generate_agriculture( self , rng , village_years ) :
+        """تقرير سنوي (season = NULL) لكل قرية وسنة وأحياناً تقارير فصلية، مع 1-4 محاصيل لكل تقرير"""
+        users = self.user_ids
+        crops = self.lookup( Crop , list( CROPS ) , created_by_id = users[0] )
+        seasons = _choices_values( AgriculturalStatus.Season )
+
+        def statuses() :
+            for village_id , year in village_years :
+                for season in [None] + ( rng.sample( seasons , rng.randint( 1 , 2 ) ) if rng.random() < 0.2 else [] ) :
+                    irrigated = self.percentage( rng , 0 , 100 )
+                    yield AgriculturalStatus(
+                        village_id = village_id , year = year , season = season , created_by_id = rng.choice( users ) ,
+                        total_agricultural_area = Decimal( rng.uniform( 10 , 5000 ) ).quantize( Decimal( "0.01" ) ) ,
+                        irrigated_land_percentage = irrigated , rainfed_land_percentage = Decimal( 100 ) - irrigated ,
+                        critical_land_percentage = self.percentage( rng , 0 , 30 ) ,
+                        state_owned_land_percentage = self.percentage( rng , 0 , 50 ) ,
+                        water_resources = { source : rng.randint( 1 , 30 ) for source in rng.sample( WATER_RESOURCES , 2 ) } ,
+                        created_at = self.moment( rng , year ) ,
+                    )
+
+        status_ids = []
+        self.write( AgriculturalStatus , statuses() , lambda batch : status_ids.extend( row.pk for row in batch ) )
+        self.write( AgriculturalCrop , (
+            AgriculturalCrop(
+                agricultural_status_id = status_id , crop_id = crop_id , created_by_id = rng.choice( users ) ,
+                area = Decimal( rng.uniform( 1 , 200 ) ).quantize( Decimal( "0.01" ) ) ,
+                is_strategic = rng.random() < 0.3 ,
+            )
+            for status_id in status_ids for crop_id in rng.sample( crops , rng.randint( 1 , 4 ) )
+        ) )
+
+    def generate_facilities( self , rng , village_years ) :
+        """المنشآت والأنشطة: عدد قليل لكل قرية وسنة، وأغلب القرى بدون أي منها"""
+        users = self.user_ids
+
+        self.write( NaturalAsset , (
+            NaturalAsset(
+                village_id = village_id , year = year , name = f"{rng.choice( VILLAGE_ROOTS )} {index + 1}" ,
+                type = rng.choice( _choices_values( NaturalAsset.AssetType ) ) ,
+                classification = rng.choice( _choices_values( NaturalAsset.Classification ) ) ,
+                important_level = rng.choice( _choices_values( NaturalAsset.ImportantLevel ) ) ,
+                ownership = rng.choice( _choices_values( NaturalAsset.Ownership ) ) ,
+                person_id_owner_name_id = self.owner( rng , village_id ) ,
+                average_visitors = rng.randint( 0 , 5000 ) , annual_revenue = rng.randint( 0 , 10 ** 7 ) ,
+                created_at = self.moment( rng , year ) ,
+            )
+            for village_id , year in village_years for index in range( rng.choices( ( 0 , 1 , 2 ) , weights = ( 8 , 2 , 1 ) )[0] )
+        ) )
+
+        self.write( IndustrialFacility , (
+            IndustrialFacility(
+                village_id = village_id , year = year , name = f"منشأة {index + 1}" , created_by_id = rng.choice( users ) ,
+                type = rng.choice( _choices_values( IndustrialFacility.FacilityType ) ) ,
+                person_id = self.owner( rng , village_id ) , number_of_workers = rng.randint( 1 , 300 ) ,
+                has_license = rng.random() < 0.6 , created_at = self.moment( rng , year ) ,
+            )
+            for village_id , year in village_years for index in range( rng.choices( ( 0 , 1 , 3 ) , weights = ( 6 , 3 , 1 ) )[0] )
+        ) )
+
+        self.write( ArchaeologicalSite , (
+            ArchaeologicalSite(
+                village_id = village_id , year = year , name = f"موقع {rng.choice( VILLAGE_ROOTS )}" , created_by_id = rng.choice( users ) ,
+                is_registered = rng.random() < 0.4 , average_visitors = rng.randint( 0 , 2000 ) ,
+                created_at = self.moment( rng , year ) ,
+            )
+            for village_id , year in village_years if rng.random() < 0.1
+        ) )
+
+        self.write( TourismFacility , (
+            TourismFacility(
+                village_id = village_id , year = year , created_by_id = rng.choice( users ) ,
+                type = rng.choice( _choices_values( TourismFacility.FacilityType ) ) ,
+                person_id_owner_name_id = self.owner( rng , village_id ) ,
+                average_visitors = rng.randint( 0 , 10000 ) , annual_revenue = rng.randint( 0 , 10 ** 7 ) ,
+                created_at = self.moment( rng , year ) ,
+            )
+            for village_id , year in village_years if rng.random() < 0.15
+        ) )
+
+        self.write( CommercialActivity , (
+            CommercialActivity(
+                village_id = village_id , year = year , name = f"محل {index + 1}" , created_by_id = rng.choice( users ) ,
+                activity_type = rng.choice( _choices_values( CommercialActivity.ActivityType ) ) ,
+                person_id = self.owner( rng , village_id ) , is_licensed = rng.random() < 0.7 ,
+                created_at = self.moment( rng , year ) ,
+            )
+            for village_id , year in village_years for index in range( rng.randint( 0 , 4 ) )
+        ) )
+
+    def generate_user_history( self ) :
+        """فترات مسؤولية متتالية لكل مستخدم على نواحٍ أو قرى، آخرها مفتوحة"""
+        rng = self.rng( "user_history" )
+        start = datetime( self.years[0] , 1 , 1 , tzinfo = dt_timezone.utc )
+        end = datetime( self.end_year + 1 , 1 , 1 , tzinfo = dt_timezone.utc )
+        village_ids = self.ids[EntityType.VILLAGES]
+        subarea_ids = self.ids[EntityType.SUBAREA]
+
+        def intervals() :
+            for user_id in self.user_ids :
+                moment = start
+                while True :
+                    finish = moment + timedelta( days = rng.randint( 60 , 720 ) )
+                    entity_type , ids = rng.choice( ( ( EntityType.VILLAGES , village_ids ) , ( EntityType.SUBAREA , subarea_ids ) ) )
+                    yield UserHistory(
+                        user_id = user_id , entity_type = entity_type , entity_id = rng.choice( ids ) ,
+                        active = finish >= end , start_date = moment , end_date = None if finish >= end else finish ,
+                    )
+                    if finish >= end :
+                        break
+                    moment = finish
+
+        self.write( UserHistory , intervals() )
+
+    def entity_picker( self , rng ) :
+        """دالة ترجع (entity_type, entity_id) لصف مولد فعلاً، بنسبة عدد صفوف كل نوع"""
+        types = [entity_type for entity_type , ids in self.ids.items() if ids]
+        cum_weights = list( accumulate( len( self.ids[entity_type] ) for entity_type in types ) )
+
+        def pick() :
+            entity_type = rng.choices( types , cum_weights = cum_weights )[0]
+            ids = self.ids[entity_type]
+            return entity_type , ids[rng.randrange( len( ids ) )]
+        return pick
+
+    def payload_pair( self , rng , entity_type , entity_id ) :
+        """
+        (old_data, new_data) بشكل snapshot حقيقي لجدول الكيان: حالة ثابتة لكل كيان (مشتقة من seed)
+        يتغير فيها حقل أو اثنان، فحجم الفروقات وعمق السلاسل يشبه ما يكتبه التطبيق.
+        """
+        fields = self.payload_fields.get( entity_type )
+        if fields is None :
+            fields = self.payload_fields[entity_type] = [
+                field.attname for field in ENTITY_MODELS[entity_type]._meta.concrete_fields if not field.primary_key
+            ]
+        state_rng = random.Random( f"{self.seed}:payload:{entity_type}:{entity_id}" )
+        old_data = { name : state_rng.randint( 0 , 1000 ) for name in fields }
+        old_data[rng.choice( fields )] = rng.randint( 0 , 1000 )
+        new_data = dict( old_data )
+        new_data[rng.choice( fields )] = rng.randint( 0 , 1000 )
+        return old_data , new_data
+
+    def generate_audit_logs( self ) :
+        rng = self.rng( "audit_logs" )
+        actions = ( AuditLog.Action.CREATE , AuditLog.Action.UPDATE , AuditLog.Action.UPDATE )
+        entity_ref = self.entity_picker( rng )
+
+        def logs() :
+            for _ in range( self.audit_log_count ) :
+                entity_type , entity_id = entity_ref()
+                action = rng.choice( actions )
+                old_data , new_data = self.payload_pair( rng , entity_type , entity_id )
+                yield AuditLog(
+                    user_id = rng.choice( self.user_ids ) , entity_type = entity_type , entity_id = entity_id , action = action ,
+                    old_data = None if action == AuditLog.Action.CREATE else old_data , new_data = new_data ,
+                    created_at = self.moment( rng , rng.choice( self.years ) ) ,
+                )
+
+        self.write( AuditLog , logs() )
+
+    def generate_modification_requests( self ) :
+        rng = self.rng( "modification_requests" )
+        Status = ModificationRequest.Status
+        entity_ref = self.entity_picker( rng )
+
+        def requests() :
+            for index in range( self.modification_request_count ) :
+                entity_type , entity_id = entity_ref()
+                status = rng.choices( ( Status.PENDING , Status.APPROVED , Status.REJECTED ) , weights = ( 2 , 6 , 2 ) )[0]
+                created_at = self.moment( rng , rng.choice( self.years ) )
+                reviewed = status != Status.PENDING
+                old_data , new_data = self.payload_pair( rng , entity_type , entity_id )
+                yield ModificationRequest(
+                    name = f"طلب تعديل {index + 1}" , entity_type = entity_type , entity_id = entity_id ,
+                    action = ModificationRequest.Action.UPDATE if rng.random() < 0.9 else ModificationRequest.Action.DELETE ,
+                    requested_by_id = rng.choice( self.user_ids ) ,
+                    old_data = old_data , new_data = new_data ,
+                    status = status , created_at = created_at ,
+                    reviewed_by_id = rng.choice( self.user_ids ) if reviewed else None ,
+                    reviewed_at = created_at + timedelta( days = rng.randint( 0 , 30 ) ) if reviewed else None ,
+                )
+
+        self.write( ModificationRequest , requests() )
+
+
+def rebuild_derived( log = None ) -> dict :
+    """
+    إعادة بناء كل الجداول المشتقة بعد التوليد: جدول الإغلاق للتسلسل، مجاميع الديموغرافيا،
+    فهرس بحث الأشخاص، فهرس الشخصيات المؤثرة، ومفاتيح وأزواج كشف التكرار.
+    """
+    from locations import closure
+    from locations.hierarchy import bump_hierarchy_version
+
+    from . import dedup, key_figures, rollups, search
+
+    log = log or ( lambda message : None )
+    counts = {}
+
+    counts["LocationClosure"] = closure.rebuild()
+    # شجرة المواقع المخزنة بالكاش تُبنى من جديد مع تغير النسخة
+    bump_hierarchy_version()
+    log( f"LocationClosure: {counts['LocationClosure']}" )
+
+    counts["DemographicRollup"] = rollups.rebuild()
+    log( f"DemographicRollup: {counts['DemographicRollup']}" )
+    counts["PersonSearchToken"] = search.rebuild()
+    log( f"PersonSearchToken: {counts['PersonSearchToken']}" )
+    counts["KeyFigureIndex"] = key_figures.rebuild()
+    log( f"KeyFigureIndex: {counts['KeyFigureIndex']}" )
+
+    dedup_run = dedup.run( full = True )
+    counts["PersonDuplicateCandidate"] = dedup_run.candidates
+    log( f"PersonDuplicateCandidate: {dedup_run.candidates} (processed {dedup_run.processed} persons)" )
+    return counts
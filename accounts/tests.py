@@ -1,3 +1,1245 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, Sum
+from django.http import StreamingHttpResponse
+from django.contrib.auth.hashers import check_password
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from locations.closure import descendant_ids
+from locations.hierarchy import AREA, GOVERNORATE, SUBAREA, VILLAGE, hierarchy_version
+
+from . import (
+    assignments, audit, exporter, key_figures, metrics, payloads, pivots, rbac, review, revocation, rollups, sync, timeseries, versions,
+)
+from .Permission import HasEntityPermission
+from .dedup import jaro_winkler, run as run_dedup
+from .importer import Importer, VillageDirectory
+from .authentication import ScopedJWTAuthentication, TokenPrincipal
+from .middleware import MetricsMiddleware
+from .passwords import hash_passwords
+from .revocation import RevocationIndex
+from .tokens import ScopedRefreshToken
+from .models import (
+    AgriculturalCrop, AgriculturalStatus, Area, AuditLog, Crop, DemographicData, DemographicRollup, Governorate,
+    KeyFigureIndex, Livestock, ModificationRequest, PayloadFormat, Permission, PermissionRole, Person,
+    PersonDuplicateCandidate, Role, Sect, SubArea, Tribe, User, UserHistory, Village, VillageSect, VillageSectKeyFigure,
+    VillageTribe, VillageTribeKeyFigure,
+)
+from .search import normalize, search
+from .synthetic import SyntheticDataGenerator, rebuild_derived
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class LoginTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="data_entry")
+        cls.user = User(username="entry", email="entry@example.com", role=role)
+        cls.user.set_password("secret-123")
+        cls.user.save()
+        cls.inactive = User(username="old", email="old@example.com", role=role, status=User.Status.DEACTIVE)
+        cls.inactive.set_password("secret-123")
+        cls.inactive.save()
+
+    def login(self, identifier, password, url="/api/auth/login/"):
+        return self.client.post(url, {"identifier": identifier, "password": password}, content_type="application/json")
+
+    def test_single_user_query(self):
+        # المستخدم مع دوره باستعلام واحد، ثم كتابة OutstandingToken
+        with CaptureQueriesContext(connection) as queries, self.assertNumQueries(2):
+            response = self.login("ENTRY@example.com", "secret-123")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["role"], "data_entry")
+        self.assertIn("refresh_token", response.cookies)
+        self.assertIn("accounts_role", queries[0]["sql"])
+
+    def test_rejections(self):
+        for url in ("/api/auth/login/", "/api/auth/login/async/"):
+            for identifier, password in (("entry", "wrong"), ("nobody", "secret-123"), ("old", "secret-123")):
+                response = self.login(identifier, password, url)
+                self.assertEqual(response.status_code, 400, (url, identifier))
+                self.assertIn("error", response.json())
+
+    def test_async_view_matches_sync_view(self):
+        sync_response = self.login("entry", "secret-123")
+        async_response = self.login("entry", "secret-123", "/api/auth/login/async/")
+        self.assertEqual(async_response.status_code, 200)
+        sync_body, async_body = sync_response.json(), async_response.json()
+        self.assertEqual(sync_body.keys(), async_body.keys())
+        self.assertEqual((async_body["Message"], async_body["user"]), (sync_body["Message"], sync_body["user"]))
+        self.assertEqual(
+            {name: morsel["httponly"] for name, morsel in async_response.cookies.items()},
+            {name: morsel["httponly"] for name, morsel in sync_response.cookies.items()},
+        )
+        for identifier, password in (("entry", "wrong"), ("old", "secret-123")):
+            self.assertEqual(
+                self.login(identifier, password).json(), self.login(identifier, password, "/api/auth/login/async/").json(),
+            )
+
+
+class AccountManagementListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.super_admin_role = Role.objects.create(name="super_admin")
+        cls.area_manager_role = Role.objects.create(name="area_manager")
+        cls.data_entry_role = Role.objects.create(name="data_entry")
+
+        cls.governorate = Governorate.objects.create(name="حمص")
+        cls.area = Area.objects.create(name="الرستن", governorate=cls.governorate)
+        cls.other_area = Area.objects.create(name="تلكلخ", governorate=cls.governorate)
+
+        cls.admin = User.objects.create(
+            username="admin", email="admin@example.com", role=cls.super_admin_role,
+        )
+        cls.manager = User.objects.create(
+            username="manager", email="manager@example.com", role=cls.area_manager_role,
+            governorate=cls.governorate, area=cls.area,
+        )
+
+        User.objects.bulk_create([
+            User(
+                username=f"entry{i}",
+                email=f"entry{i}@example.com",
+                role=cls.data_entry_role,
+                governorate=cls.governorate,
+                area=cls.area if i % 2 else cls.other_area,
+                status=User.Status.DEACTIVE if i % 5 == 0 else User.Status.ACTIVE,
+            )
+            for i in range(40)
+        ])
+
+    def list_accounts(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client.get("/api/auth/accounts/", params)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        counts = []
+        for page_size in (5, 40):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.list_accounts(self.admin, page_size=page_size)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data["results"]), page_size)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_cursor_walks_every_user_once(self):
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+
+        seen = []
+        url = "/api/auth/accounts/?page_size=15"
+        while url:
+            response = client.get(url)
+            seen.extend(row["id"] for row in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(len(seen), User.objects.count())
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_filters(self):
+        response = self.list_accounts(self.admin, status="deactive", page_size=100)
+        self.assertEqual(len(response.data["results"]), 8)
+
+        response = self.list_accounts(self.admin, role="area_manager")
+        self.assertEqual([row["username"] for row in response.data["results"]], ["manager"])
+
+        response = self.list_accounts(self.admin, area=self.other_area.id, page_size=100)
+        self.assertEqual(len(response.data["results"]), 20)
+
+        response = self.list_accounts(self.admin, search="entry1")
+        self.assertEqual(
+            {row["username"] for row in response.data["results"]},
+            {"entry1"} | {f"entry{i}" for i in range(10, 20)},
+        )
+
+    def test_area_manager_sees_only_own_area(self):
+        response = self.list_accounts(self.manager, page_size=100)
+        areas = {row["area"] for row in response.data["results"]}
+        self.assertEqual(areas, {self.area.name})
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class BulkUserCreateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="admin", email="admin@example.com", role=Role.objects.create(name="super_admin"))
+        Role.objects.create(name="data_entry")
+        governorate = Governorate.objects.create(name="حمص")
+        Area.objects.create(name="الرستن", governorate=governorate)
+
+    def bulk(self, usernames):
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        rows = [
+            {
+                "username": username, "email": f"{username}@example.com", "role": "data_entry",
+                "governorate": "حمص", "area": "الرستن", "password": "Kx9!pLm2#qRt", "confirm_password": "Kx9!pLm2#qRt",
+            }
+            for username in usernames
+        ]
+        return client.post("/api/auth/accounts/bulk/", {"users": rows}, format="json")
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.bulk(["a1", "a2"]).status_code, 201)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.bulk([f"b{i}" for i in range(6)]).status_code, 201)
+        self.assertEqual(len(small), len(large))
+        self.assertTrue(User.objects.get(username="b5").check_password("Kx9!pLm2#qRt"))
+
+    def test_existing_and_repeated_accounts_are_rejected(self):
+        response = self.bulk(["c1", "ADMIN", "c1"])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [2, 3])
+        self.assertFalse(User.objects.filter(username="c1").exists())
+
+    def test_hash_passwords_in_pool(self):
+        raw = [f"password-{i}" for i in range(10)]
+        self.assertTrue(all(check_password(password, hashed) for password, hashed in zip(raw, hash_passwords(raw))))
+
+
+class ScopeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="super_admin")
+        cls.admin = User.objects.create(username="admin", role=role)
+
+        governorate = Governorate.objects.create(name="حمص")
+        cls.area = Area.objects.create(name="الرستن", governorate=governorate)
+        cls.other_area = Area.objects.create(name="تلكلخ", governorate=governorate)
+        cls.subarea = SubArea.objects.create(name="تلبيسة", area=cls.area)
+        other_subarea = SubArea.objects.create(name="الحواش", area=cls.other_area)
+        village = Village.objects.create(name="الغنطو", subarea=cls.subarea, type=Village.VillageType.CITY)
+        other_village = Village.objects.create(name="الناصرة", subarea=other_subarea, type=Village.VillageType.CITY)
+        cls.row = Livestock.objects.create(village=village, year=2024, created_by=cls.admin)
+        Livestock.objects.create(village=other_village, year=2024, created_by=cls.admin)
+
+    def test_in_scope_is_one_query_and_follows_moves(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(Livestock.objects.in_scope(AREA, self.area.id))
+        self.assertEqual(rows, [self.row])
+        self.assertEqual(len(queries), 1)
+
+        self.subarea.area = self.other_area
+        self.subarea.save()
+        self.assertEqual(list(Livestock.objects.in_scope(AREA, self.area.id)), [])
+        self.assertEqual(Livestock.objects.in_scope(AREA, self.other_area.id).count(), 2)
+
+    # الرقم المقروء في العملية قد يبقى من اختبار سابق تراجعت معاملته، فنقرأ الصف المشترك دائماً
+    @mock.patch.object(versions, "CHECK_INTERVAL", 0)
+    def test_hierarchy_version_changes_only_after_commit(self):
+        version = hierarchy_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subarea.name = "تلبيسة الجديدة"
+            self.subarea.save()
+            self.assertEqual(hierarchy_version(), version)
+        self.assertNotEqual(hierarchy_version(), version)
+
+
+class PermissionMatrixTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(name="data_entry")
+        cls.user = User.objects.create(username="entry", role=cls.role)
+        for action in (rbac.VIEW, rbac.CREATE):
+            permission = Permission.objects.create(action=action, entity="livestock")
+            PermissionRole.objects.create(role=cls.role, permission=permission)
+
+    def setUp(self):
+        # المصفوفة مشتركة في العملية: البدء من بيانات هذا الاختبار
+        with self.captureOnCommitCallbacks(execute=True):
+            rbac.permission_matrix.invalidate()
+
+    def allowed(self, method, entity="livestock", **view_attrs):
+        request = getattr(APIRequestFactory(), method.lower())("/")
+        request.user = self.user
+        view = type("View", (), {"permission_entity": entity, **view_attrs})()
+        return HasEntityPermission().has_permission(request, view)
+
+    def test_method_and_view_actions(self):
+        self.assertTrue(self.allowed("GET"))
+        self.assertTrue(self.allowed("POST"))
+        self.assertFalse(self.allowed("PATCH"))
+        self.assertFalse(self.allowed("DELETE"))
+        self.assertFalse(self.allowed("GET", entity="persons"))
+        self.assertFalse(self.allowed("GET", entity=None))
+        self.assertFalse(self.allowed("GET", action="approve", permission_actions={"approve": rbac.REVIEW}))
+
+    def test_changes_apply_only_after_commit(self):
+        permission = Permission.objects.create(action=rbac.DELETE, entity="*")
+        self.assertFalse(self.allowed("DELETE"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PermissionRole.objects.create(role=self.role, permission=permission)
+            self.assertFalse(self.allowed("DELETE"))
+        self.assertTrue(self.allowed("DELETE"))
+        self.assertTrue(self.allowed("DELETE", entity="persons"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PermissionRole.objects.filter(permission=permission).delete()
+        self.assertFalse(self.allowed("DELETE"))
+
+
+class ReviewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="area_manager")
+        permission = Permission.objects.create(action=rbac.REVIEW, entity="livestock")
+        PermissionRole.objects.create(role=role, permission=permission)
+
+        area = Area.objects.create(name="الرستن", governorate=Governorate.objects.create(name="حمص"))
+        other_area = Area.objects.create(name="محردة", governorate=Governorate.objects.create(name="حماة"))
+        cls.manager = User.objects.create(username="manager", email="manager@example.com", role=role, area=area)
+        cls.entry = User.objects.create(
+            username="entry", email="entry@example.com", role=Role.objects.create(name="data_entry"), area=area,
+        )
+
+        village = Village.objects.create(
+            name="الغنطو", subarea=SubArea.objects.create(name="تلبيسة", area=area), type=Village.VillageType.CITY,
+        )
+        cls.other_village = Village.objects.create(
+            name="كفرنبودة", subarea=SubArea.objects.create(name="كفرنبودة", area=other_area),
+            type=Village.VillageType.CITY,
+        )
+        cls.livestock = Livestock.objects.create(village=village, year=2024, cows_count=1, created_by=cls.entry)
+        cls.other_livestock = Livestock.objects.create(
+            village=cls.other_village, year=2024, cows_count=1, created_by=cls.entry,
+        )
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            rbac.permission_matrix.invalidate()
+
+    def request(self, target, new_data=None, action=ModificationRequest.Action.UPDATE):
+        return ModificationRequest.objects.create(
+            name="تعديل", entity_type="livestock", entity_id=target.pk, action=action,
+            requested_by=self.entry, old_data={}, new_data=new_data or {},
+        )
+
+    def approve(self, *requests):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = review.approve([request.id for request in requests], self.manager)
+        return result["approved_ids"], {error["id"]: error["error"] for error in result["errors"]}
+
+    def test_apply_and_conflict(self):
+        update = self.request(self.livestock, {"cows_count": 7})
+        approved, errors = self.approve(update)
+        self.assertEqual(approved, [update.id])
+        self.livestock.refresh_from_db()
+        self.assertEqual(self.livestock.cows_count, 7)
+        self.assertEqual(ModificationRequest.objects.get(pk=update.id).status, ModificationRequest.Status.APPROVED)
+
+        delete = self.request(self.livestock, action=ModificationRequest.Action.DELETE)
+        late = self.request(self.livestock, {"cows_count": 9})
+        invalid = self.request(self.livestock, {"unknown": 1})
+        approved, errors = self.approve(delete, late, invalid)
+        self.assertEqual(approved, [delete.id])
+        self.assertEqual(set(errors), {late.id, invalid.id})
+        self.assertFalse(Livestock.objects.filter(pk=self.livestock.pk).exists())
+
+    def test_targets_and_moves_outside_reviewer_scope_are_rejected(self):
+        foreign = self.request(self.other_livestock, {"cows_count": 7})
+        moved = self.request(self.livestock, {"village": self.other_village.id})
+        approved, errors = self.approve(foreign, moved)
+
+        self.assertEqual(approved, [])
+        self.assertEqual(errors, {
+            foreign.id: "السجل خارج نطاقك الجغرافي", moved.id: "لا يمكن نقل السجل خارج نطاقك الجغرافي",
+        })
+        self.other_livestock.refresh_from_db()
+        self.livestock.refresh_from_db()
+        self.assertEqual(self.other_livestock.cows_count, 1)
+        self.assertNotEqual(self.livestock.village_id, self.other_village.id)
+
+    def test_timeline_requires_entity_in_scope(self):
+        client = APIClient()
+        client.force_authenticate(user=self.manager)
+        timeline = "/api/data/audit/livestock/{}/timeline/"
+        self.assertEqual(client.get(timeline.format(self.livestock.pk)).status_code, 200)
+        self.assertEqual(client.get(timeline.format(self.other_livestock.pk)).status_code, 403)
+
+    def test_reject(self):
+        request = self.request(self.livestock, {"cows_count": 7})
+        self.assertEqual(review.reject([request.id], self.manager), 1)
+        request.refresh_from_db()
+        self.assertEqual(request.status, ModificationRequest.Status.REJECTED)
+        self.assertEqual(request.reviewed_by, self.manager)
+        self.assertEqual(review.reject([request.id], self.manager), 0)
+
+
+class DemographicRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="super_admin")
+        cls.admin = User.objects.create(username="admin", role=role)
+
+        cls.governorate = Governorate.objects.create(name="حمص")
+        cls.other_governorate = Governorate.objects.create(name="حماة")
+        cls.area = Area.objects.create(name="الرستن", governorate=cls.governorate)
+        cls.other_area = Area.objects.create(name="محردة", governorate=cls.other_governorate)
+        cls.subarea = SubArea.objects.create(name="تلبيسة", area=cls.area)
+        cls.other_subarea = SubArea.objects.create(name="كفرنبودة", area=cls.other_area)
+        cls.village = Village.objects.create(name="الغنطو", subarea=cls.subarea, type=Village.VillageType.CITY)
+        cls.neighbour = Village.objects.create(name="الزعفرانة", subarea=cls.subarea, type=Village.VillageType.CITY)
+
+    def population(self, level, node_id, year=2024):
+        rollup = DemographicRollup.objects.filter(level=level, node_id=node_id, year=year).first()
+        return rollup and rollup.population
+
+    def create(self, village, population):
+        return DemographicData.objects.create(
+            village=village, year=2024, population=population, number_of_families=10, created_by=self.admin,
+        )
+
+    def test_insert_update_delete(self):
+        row = self.create(self.village, 100)
+        self.create(self.neighbour, 50)
+        self.assertEqual(self.population(AREA, self.area.id), 150)
+
+        row.population = 120
+        row.save()
+        self.assertEqual(self.population(SUBAREA, self.subarea.id), 170)
+
+        row.delete()
+        self.assertEqual(self.population(AREA, self.area.id), 50)
+        DemographicData.objects.filter(village=self.neighbour).get().delete()
+        self.assertFalse(DemographicRollup.objects.exists())
+
+    def test_unknown_village_is_an_error(self):
+        with self.assertRaises(Village.DoesNotExist):
+            rollups.node_keys(0)
+
+    def test_moves_recompute_old_and_new_ancestors(self):
+        self.create(self.village, 100)
+        self.create(self.neighbour, 50)
+
+        self.village.subarea = self.other_subarea
+        self.village.save()
+        self.assertEqual(self.population(AREA, self.area.id), 50)
+        self.assertEqual(self.population(AREA, self.other_area.id), 100)
+
+        self.subarea.area = self.other_area
+        self.subarea.save()
+        self.assertIsNone(self.population(AREA, self.area.id))
+        self.assertEqual(self.population(AREA, self.other_area.id), 150)
+        self.assertEqual(self.population(SUBAREA, self.subarea.id), 50)
+        self.assertIsNone(self.population(GOVERNORATE, self.governorate.id))
+
+
+class CropPivotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="admin", role=Role.objects.create(name="super_admin"))
+        governorate = Governorate.objects.create(name="حمص")
+        area = Area.objects.create(name="الرستن", governorate=governorate)
+        cls.subarea = SubArea.objects.create(name="تلبيسة", area=area)
+        cls.other_subarea = SubArea.objects.create(name="الحولة", area=area)
+        cls.village = Village.objects.create(name="الغنطو", subarea=cls.subarea, type=Village.VillageType.CITY)
+        cls.neighbour = Village.objects.create(name="الزعفرانة", subarea=cls.subarea, type=Village.VillageType.CITY)
+        cls.wheat = Crop.objects.create(name="قمح", created_by=cls.admin)
+        cls.olive = Crop.objects.create(name="زيتون", created_by=cls.admin)
+
+        cls.wheat_row = cls.grow(cls.village, cls.wheat, 10, season=AgriculturalStatus.Season.WINTER, is_strategic=True)
+        cls.grow(cls.village, cls.olive, 4)
+        cls.grow(cls.neighbour, cls.wheat, 6, season=AgriculturalStatus.Season.WINTER)
+
+    @classmethod
+    def grow(cls, village, crop, area, season=None, is_strategic=False):
+        status, _ = AgriculturalStatus.objects.get_or_create(village=village, year=2024, season=season, defaults={"created_by": cls.admin})
+        return AgriculturalCrop.objects.create(
+            agricultural_status=status, crop=crop, area=area, is_strategic=is_strategic, created_by=cls.admin,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def pivot(self, group_by="subarea"):
+        return pivots.crop_pivot(AgriculturalCrop.objects.all(), "all", 2024, group_by)
+
+    def cell(self, pivot, node_id, crop, season, key="area"):
+        nodes = [node["id"] for node in pivot["nodes"]]
+        crops = [row["id"] for row in pivot["crops"]]
+        return pivot[key][nodes.index(node_id)][crops.index(crop.id)][pivot["seasons"].index(season)]
+
+    def test_totals(self):
+        pivot = pivots.build_pivot(AgriculturalCrop.objects.all(), "village")
+        self.assertEqual([crop["name"] for crop in pivot["crops"]], ["زيتون", "قمح"])
+        self.assertEqual(self.cell(pivot, self.village.id, self.wheat, "winter"), 10)
+        self.assertEqual(self.cell(pivot, self.village.id, self.wheat, "winter", "strategic_area"), 10)
+        self.assertEqual(self.cell(pivot, self.neighbour.id, self.wheat, "winter", "strategic_area"), 0)
+        self.assertEqual(self.cell(pivot, self.village.id, self.olive, pivots.ANNUAL), 4)
+
+        pivot = pivots.build_pivot(AgriculturalCrop.objects.all(), "subarea")
+        self.assertEqual(self.cell(pivot, self.subarea.id, self.wheat, "winter"), 16)
+
+    def test_cache_hit(self):
+        first = self.pivot()
+        with mock.patch.object(pivots, "build_pivot") as build:
+            self.assertEqual(self.pivot(), first)
+        build.assert_not_called()
+
+    def test_crop_edit_invalidates(self):
+        self.pivot()
+        self.wheat_row.area = 12
+        self.wheat_row.save()
+        self.assertEqual(self.cell(self.pivot(), self.subarea.id, self.wheat, "winter"), 18)
+
+    def test_village_move_invalidates(self):
+        self.pivot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.neighbour.subarea = self.other_subarea
+            self.neighbour.save()
+
+        pivot = self.pivot()
+        self.assertEqual(self.cell(pivot, self.subarea.id, self.wheat, "winter"), 10)
+        self.assertEqual(self.cell(pivot, self.other_subarea.id, self.wheat, "winter"), 6)
+
+
+class LivestockTimeSeriesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="admin", role=Role.objects.create(name="super_admin"))
+        subarea = SubArea.objects.create(name="تلبيسة", area=Area.objects.create(name="الرستن", governorate=Governorate.objects.create(name="حمص")))
+        cls.village, cls.neighbour, cls.single = (
+            Village.objects.create(name=name, subarea=subarea, type=Village.VillageType.CITY) for name in ("الغنطو", "الزعفرانة", "الحصن")
+        )
+        # 2021 بدون أي سطر، والقرية الثالثة في 2022 فقط
+        for village, year, cows, sheep in (
+            (cls.village, 2020, 10, 100), (cls.neighbour, 2020, 5, None),
+            (cls.village, 2022, 20, 150), (cls.neighbour, 2022, None, None), (cls.single, 2022, 7, 30),
+            (cls.village, 2023, 16, 120),
+        ):
+            Livestock.objects.create(village=village, year=year, cows_count=cows, sheep_count=sheep, created_by=cls.admin)
+        for village, year, population in ((cls.village, 2020, 1000), (cls.neighbour, 2020, 500), (cls.village, 2022, 2000)):
+            DemographicData.objects.create(village=village, year=year, population=population, number_of_families=1, created_by=cls.admin)
+
+    def series(self, livestock=None, start=2019, end=2023):
+        livestock = Livestock.objects.all() if livestock is None else livestock
+        return timeseries.livestock_series(livestock, DemographicData.objects.all(), start, end)
+
+    def test_year_gaps(self):
+        series = self.series()
+        self.assertEqual(series["years"], [2019, 2020, 2021, 2022, 2023])
+        self.assertEqual(series["villages_reporting"], [0, 2, 0, 3, 1])
+        self.assertEqual(series["totals"]["cows_count"], [None, 15, None, 27, 16])
+        # الفرق والنمو يحتاجان السنة السابقة، فلا يُحسبان بعد سنة فارغة
+        self.assertEqual(series["yoy_delta"]["cows_count"], [None, None, None, None, -11])
+        self.assertEqual(series["growth_rate"]["sheep_count"], [None, None, None, None, -0.3333])
+        self.assertEqual(series["population"], [None, 1500, None, 2000, None])
+        self.assertEqual(series["per_1000_people"]["cows_count"], [None, 10, None, 13.5, None])
+
+    def test_single_year_village(self):
+        series = self.series(Livestock.objects.filter(village=self.single), 2022, 2022)
+        self.assertEqual(series["totals"]["sheep_count"], [30])
+        self.assertEqual(series["yoy_delta"]["sheep_count"], [None])
+        self.assertEqual(series["totals"]["camels_count"], [None])
+
+    def test_matches_orm_aggregate(self):
+        series = self.series()
+        fields = timeseries.LIVESTOCK_FIELDS
+        expected = {
+            row["year"]: row
+            for row in Livestock.objects.values("year").annotate(villages=Count("id"), **{field: Sum(field) for field in fields})
+        }
+        for index, year in enumerate(series["years"]):
+            row = expected.get(year, {})
+            self.assertEqual(series["villages_reporting"][index], row.get("villages", 0))
+            for field in fields:
+                self.assertEqual(series["totals"][field][index], row.get(field), (year, field))
+
+
+class PersonSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="super_admin")
+        cls.admin = User.objects.create(username="admin", role=role)
+
+        governorate = Governorate.objects.create(name="حمص")
+        area = Area.objects.create(name="الرستن", governorate=governorate)
+        subarea = SubArea.objects.create(name="تلبيسة", area=area)
+        cls.village = Village.objects.create(name="الغنطو", subarea=subarea, type=Village.VillageType.CITY)
+        cls.other_village = Village.objects.create(name="الزعفرانة", subarea=subarea, type=Village.VillageType.CITY)
+
+        cls.ahmad = Person.objects.create(name="أحمد عبدالله", work="مهندس زراعي", village=cls.village, created_by=cls.admin)
+        cls.fatima = Person.objects.create(name="فاطمة الأسعد", village=cls.other_village, created_by=cls.admin)
+        cls.worker = Person.objects.create(name="خالد", work="يعمل مع احمد", village=cls.village, created_by=cls.admin)
+
+    def test_normalize_unifies_spelling_variants(self):
+        self.assertEqual(normalize("أَحْمَد"), normalize("احمد"))
+        self.assertEqual(normalize("فاطمة"), normalize("فاطمه"))
+        self.assertEqual(normalize("مصطفى"), normalize("مصطفي"))
+
+    def test_variants_match_and_name_ranks_first(self):
+        ranked = [person_id for person_id, _ in search("إحمد")]
+        self.assertEqual(ranked, [self.ahmad.id, self.worker.id])
+        self.assertEqual([person_id for person_id, _ in search("فاطمه الاسع")], [self.fatima.id])
+
+    def test_scope_and_reindex_on_save(self):
+        self.assertEqual(search("فاطمة", village_ids={self.village.id}), [])
+
+        self.fatima.village = self.village
+        self.fatima.save()
+        self.assertEqual([person_id for person_id, _ in search("فاطمة", village_ids={self.village.id})], [self.fatima.id])
+
+
+class KeyFigureIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="area_manager")
+        PermissionRole.objects.create(role=role, permission=Permission.objects.create(action=rbac.VIEW, entity="persons"))
+        cls.admin = User.objects.create(username="admin", email="admin@example.com", role=Role.objects.create(name="super_admin"))
+
+        governorate = Governorate.objects.create(name="حمص")
+        area = Area.objects.create(name="الرستن", governorate=governorate)
+        cls.manager = User.objects.create(username="manager", email="manager@example.com", role=role, area=area)
+        cls.village = Village.objects.create(
+            name="الغنطو", subarea=SubArea.objects.create(name="تلبيسة", area=area), type=Village.VillageType.CITY,
+        )
+        cls.other_village = Village.objects.create(
+            name="الحصن", subarea=SubArea.objects.create(name="الناصرة", area=Area.objects.create(name="تلكلخ", governorate=governorate)),
+            type=Village.VillageType.CITY,
+        )
+        cls.person = Person.objects.create(name="محمد أحمد", village=cls.village, created_by=cls.admin)
+        cls.sect = VillageSect.objects.create(village=cls.village, sect=Sect.objects.create(name="سنة"), created_by=cls.admin)
+        cls.tribe = VillageTribe.objects.create(village=cls.other_village, tribe=Tribe.objects.create(name="الفواعرة"), year=2023)
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            rbac.permission_matrix.invalidate()
+
+    def indexed(self):
+        return set(KeyFigureIndex.objects.values_list("dimension", "village_id", "dimension_id", "year", "person_id"))
+
+    def link(self):
+        sect_link = VillageSectKeyFigure.objects.create(village_sect=self.sect, person=self.person, created_by=self.admin)
+        tribe_link = VillageTribeKeyFigure.objects.create(village_tribe=self.tribe, person=self.person, created_by=self.admin)
+        return sect_link, tribe_link
+
+    def test_create_move_delete(self):
+        sect_link, _ = self.link()
+        self.assertEqual(self.indexed(), {
+            ("sect", self.village.id, self.sect.sect_id, None, self.person.id),
+            ("tribe", self.other_village.id, self.tribe.tribe_id, 2023, self.person.id),
+        })
+
+        self.sect.village = self.other_village
+        self.sect.save()
+        self.tribe.year = 2024
+        self.tribe.save()
+        self.assertEqual(self.indexed(), {
+            ("sect", self.other_village.id, self.sect.sect_id, None, self.person.id),
+            ("tribe", self.other_village.id, self.tribe.tribe_id, 2024, self.person.id),
+        })
+
+        sect_link.delete()
+        self.tribe.delete()
+        self.assertFalse(KeyFigureIndex.objects.exists())
+
+    def test_rebuild_matches_signals(self):
+        self.link()
+        indexed = self.indexed()
+        self.assertEqual(key_figures.rebuild(), 2)
+        self.assertEqual(self.indexed(), indexed)
+
+    def test_endpoints(self):
+        self.link()
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        response = client.get(f"/api/data/villages/{self.other_village.id}/key-figures/", {"dimension": "tribe", "year": 2023})
+        self.assertEqual([(row["dimension"], row["person"]) for row in response.data], [("tribe", "محمد أحمد")])
+        response = client.get(f"/api/data/villages/{self.other_village.id}/key-figures/", {"dimension": "clan"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(client.get(f"/api/data/persons/{self.person.id}/key-figures/").data), 2)
+
+        client.force_authenticate(user=self.manager)
+        self.assertEqual(client.get(f"/api/data/villages/{self.other_village.id}/key-figures/").status_code, 403)
+        self.assertEqual(len(client.get(f"/api/data/villages/{self.village.id}/key-figures/").data), 1)
+        response = client.get(f"/api/data/persons/{self.person.id}/key-figures/")
+        self.assertEqual([row["village_id"] for row in response.data], [self.village.id])
+
+
+class PersonDedupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="super_admin")
+        cls.admin = User.objects.create(username="admin", role=role)
+
+        governorate = Governorate.objects.create(name="حمص")
+        area = Area.objects.create(name="الرستن", governorate=governorate)
+        subarea = SubArea.objects.create(name="تلبيسة", area=area)
+        cls.village = Village.objects.create(name="الغنطو", subarea=subarea, type=Village.VillageType.CITY)
+        cls.other_village = Village.objects.create(name="الزعفرانة", subarea=subarea, type=Village.VillageType.CITY)
+
+    def create_person(self, name, village, phone=None):
+        return Person.objects.create(name=name, village=village, phone=phone, created_by=self.admin)
+
+    def test_jaro_winkler(self):
+        self.assertAlmostEqual(jaro_winkler("martha", "marhta"), 0.9611, places=4)
+        self.assertEqual(jaro_winkler("احمد", "احمد"), 1.0)
+
+    def test_incremental_run_clusters_new_duplicates_only(self):
+        first = self.create_person("أحمد محمد الحمصي", self.village)
+        self.create_person("أحمد مصطفى الحمصي", self.village)
+        self.create_person("خالد العلي", self.village)
+        self.assertEqual(run_dedup().candidates, 0)
+
+        second = self.create_person("احمد محمد الحمصى", self.other_village, phone="+963 933 111 222")
+        third = self.create_person("أحمد  محمد الحمصي", self.village, phone="0933111222")
+        dedup_run = run_dedup()
+
+        self.assertEqual(dedup_run.processed, 2)
+        pairs = PersonDuplicateCandidate.objects.values_list("person_a_id", "person_b_id", "cluster_id")
+        self.assertEqual(
+            set(pairs),
+            {(first.id, second.id, first.id), (first.id, third.id, first.id), (second.id, third.id, first.id)},
+        )
+        self.assertTrue(PersonDuplicateCandidate.objects.get(person_a=second, person_b=third).reasons["phone"])
+        self.assertEqual(run_dedup().processed, 0)
+
+
+class AuditWriterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="admin", role=Role.objects.create(name="super_admin"))
+
+    def setUp(self):
+        # بدون خيط الكتابة: اتصاله المنفصل لا يرى معاملة الاختبار
+        self.writer = audit.AuditWriter(queue_size=2)
+        patcher = mock.patch.object(self.writer, "_ensure_thread")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def entries(self, count):
+        return [
+            AuditLog(user=self.user, entity_type="livestock", entity_id=i, action=AuditLog.Action.UPDATE, new_data={"i": i})
+            for i in range(count)
+        ]
+
+    def test_queued_after_commit_then_flushed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.writer.log(*self.entries(2))
+            self.assertEqual(self.writer.stats()["queued"], 0)
+        self.assertEqual((self.writer.stats()["queued"], AuditLog.objects.count()), (2, 0))
+
+        self.writer.flush()
+        self.assertEqual((self.writer.stats()["queued"], AuditLog.objects.count()), (0, 2))
+
+    def test_full_queue_writes_synchronously(self):
+        self.writer._enqueue(self.entries(3))
+        self.assertEqual(AuditLog.objects.count(), 1)
+        self.assertEqual(self.writer.stats()["sync_fallbacks"], 1)
+
+    def test_failed_bulk_write_retries_row_by_row(self):
+        with mock.patch.object(AuditLog.objects, "bulk_create", side_effect=DatabaseError), \
+                self.assertLogs("accounts.audit", "ERROR"):
+            self.writer._write(self.entries(2))
+        self.assertEqual(AuditLog.objects.count(), 2)
+        self.assertEqual(self.writer.stats()["failed"], 0)
+
+
+class PayloadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="admin", role=Role.objects.create(name="super_admin"))
+
+    def history(self, count):
+        state = {"name": "محمد", "father": "أحمد", "village": 7, "phone": "0991000000", "age": 30, "notes": "", "status": "active"}
+        for i in range(count):
+            new = dict(state, age=30 + i, notes=f"تعديل {i}")
+            yield state, new
+            state = new
+
+    def write(self, count):
+        originals = []
+        for old, new in self.history(count):
+            # save() يمر على pre_save -> payloads.prepare
+            AuditLog(user=self.user, entity_type="person", entity_id=1, action=AuditLog.Action.UPDATE, old_data=old, new_data=new).save()
+            originals.append((old, new))
+        return originals
+
+    def stored(self):
+        return list(AuditLog.objects.filter(entity_type="person", entity_id=1).order_by("id"))
+
+    def test_diff_chain_round_trips_past_snapshot_interval(self):
+        count = 2 * payloads.SNAPSHOT_INTERVAL + 5
+        originals = self.write(count)
+        rows = self.stored()
+
+        formats = {row.id: row.payload_format for row in rows}
+        snapshots = [row for row in rows if row.payload_format == PayloadFormat.FULL]
+        self.assertGreaterEqual(len(snapshots), 3)
+        for row in rows:
+            if row.payload_format == PayloadFormat.DIFF:
+                self.assertEqual(formats[row.base_id], PayloadFormat.FULL)
+                self.assertLess(row.snapshot_depth, payloads.SNAPSHOT_INTERVAL)
+
+        self.assertEqual([(row.old_data, row.new_data) for row in payloads.expand(rows)], originals)
+
+    def test_insert_query_count_does_not_grow_with_chain(self):
+        self.write(payloads.SNAPSHOT_INTERVAL - 2)
+        old, new = list(self.history(payloads.SNAPSHOT_INTERVAL))[-1]
+        # ثلاثة استعلامات لـ prepare ثم الإدخال
+        with self.assertNumQueries(4):
+            AuditLog(user=self.user, entity_type="person", entity_id=1, action=AuditLog.Action.UPDATE, old_data=old, new_data=new).save()
+        self.assertEqual(self.stored()[-1].snapshot_depth, payloads.SNAPSHOT_INTERVAL - 2)
+
+    def test_compact_rewrites_legacy_chain(self):
+        with mock.patch.object(payloads, "STORAGE_MODE", PayloadFormat.FULL):
+            originals = self.write(6)
+        rows = self.stored()
+        # سلسلة بالصيغة القديمة: كل فرق فوق الصف الذي قبله
+        for depth, (base, row) in enumerate(zip(rows, rows[1:]), start=1):
+            row.old_data = payloads.make_patch(originals[depth - 1][1], row.old_data)
+            row.new_data = payloads.make_patch(originals[depth][0], row.new_data)
+            row.payload_format, row.base_id, row.snapshot_depth = PayloadFormat.DIFF, base.id, depth
+        AuditLog.objects.bulk_update(rows[1:], ["old_data", "new_data", "payload_format", "base", "snapshot_depth"])
+
+        call_command("compact_audit_payloads", model="auditlog", stdout=io.StringIO())
+
+        rows = self.stored()
+        self.assertEqual({row.base_id for row in rows[1:]}, {rows[0].id})
+        self.assertEqual([row.snapshot_depth for row in rows], list(range(6)))
+        self.assertEqual([(row.old_data, row.new_data) for row in payloads.expand(rows)], originals)
+
+
+class AssignmentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="admin", email="admin@example.com", role=Role.objects.create(name="super_admin"))
+        governorate = Governorate.objects.create(name="حمص")
+        cls.area = Area.objects.create(name="الرستن", governorate=governorate)
+        other_area = Area.objects.create(name="تلكلخ", governorate=governorate)
+        cls.village = Village.objects.create(
+            name="الغنطو", subarea=SubArea.objects.create(name="تلبيسة", area=cls.area), type=Village.VillageType.CITY,
+        )
+        cls.other_village = Village.objects.create(
+            name="الحصن", subarea=SubArea.objects.create(name="الناصرة", area=other_area), type=Village.VillageType.CITY,
+        )
+        cls.manager = User.objects.create(
+            username="manager", email="manager@example.com", role=Role.objects.create(name="area_manager"),
+            governorate=governorate, area=cls.area,
+        )
+        cls.first, cls.second = (
+            User.objects.create(username=f"entry{i}", email=f"entry{i}@example.com", role=cls.manager.role) for i in range(2)
+        )
+
+        cls.jan, cls.mar, cls.jun = (timezone.make_aware(datetime(2024, month, 1)) for month in (1, 3, 6))
+        # first: [يناير، آذار)، second: من آذار بلا نهاية
+        cls.closed = cls.assign(cls.first, cls.village, cls.jan, cls.mar)
+        cls.open = cls.assign(cls.second, cls.village, cls.mar, None)
+        cls.assign(cls.first, cls.other_village, cls.jan, None)
+
+    @classmethod
+    def assign(cls, user, village, start, end):
+        return UserHistory.objects.create(
+            user=user, entity_type="villages", entity_id=village.id, start_date=start, end_date=end, active=end is None,
+        )
+
+    def test_overlap_boundaries(self):
+        intervals = lambda start, end: list(assignments.entity_intervals("villages", self.village.id, start, end))
+        # الفترة [start, end): النهاية غير مشمولة من الطرفين
+        self.assertEqual(intervals(self.mar, self.jun), [self.open])
+        self.assertEqual(intervals(None, self.mar), [self.closed])
+        self.assertEqual(intervals(self.mar - timedelta(seconds=1), self.mar + timedelta(seconds=1)), [self.closed, self.open])
+        self.assertEqual(intervals(None, None), [self.closed, self.open])
+
+    def test_covering_and_open_intervals(self):
+        rows = assignments.entity_intervals("villages", self.village.id)
+        self.assertEqual(list(assignments.covering(rows, self.mar)), [self.open])
+        self.assertEqual(list(assignments.covering(rows, self.jan)), [self.closed])
+        self.assertEqual(list(assignments.covering(rows, self.jan - timedelta(days=1))), [])
+        self.assertEqual(list(assignments.covering(rows, timezone.make_aware(datetime(2030, 1, 1)))), [self.open])
+        self.assertEqual(assignments.current_users("villages", self.village.id), [self.second.id])
+
+    def test_user_intervals(self):
+        self.assertEqual(len(assignments.user_intervals(self.first.id)), 2)
+        self.assertEqual(len(assignments.user_intervals(self.first.id, self.jun, None)), 1)
+
+    def test_batch_resolve_matches_covering(self):
+        moments = [self.jan - timedelta(days=1), self.jan, self.mar - timedelta(seconds=1), self.mar, self.jun]
+        lookups = [("villages", village.id, moment) for village in (self.village, self.other_village) for moment in moments]
+        expected = [
+            list(assignments.covering(assignments.entity_intervals(entity_type, entity_id), moment).values_list("user_id", flat=True))
+            for entity_type, entity_id, moment in lookups
+        ]
+        with self.assertNumQueries(1):
+            self.assertEqual(assignments.resolve(lookups), expected)
+
+    def test_views_reject_entities_outside_scope(self):
+        client = APIClient()
+        client.force_authenticate(user=self.manager)
+        url = "/api/data/audit/assignments/?entity_type=villages&entity_id={}"
+        self.assertEqual(len(client.get(url.format(self.village.id)).data), 2)
+        self.assertEqual(client.get(url.format(self.other_village.id)).status_code, 403)
+        self.assertEqual(client.get("/api/data/audit/assignments/?entity_type=unknown&entity_id=1").status_code, 403)
+
+        lookups = [{"entity_type": "villages", "entity_id": village.id, "at": "2024-04-01"} for village in (self.village, self.other_village)]
+        response = client.post("/api/data/audit/assignments/resolve/", {"lookups": lookups[:1]}, format="json")
+        self.assertEqual(response.data["results"][0]["user_ids"], [self.second.id])
+        response = client.post("/api/data/audit/assignments/resolve/", {"lookups": lookups}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+        client.force_authenticate(user=self.admin)
+        response = client.post("/api/data/audit/assignments/resolve/", {"lookups": lookups}, format="json")
+        self.assertEqual([row["user_ids"] for row in response.data["results"]], [[self.second.id], [self.first.id]])
+
+
+class ExporterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="area_manager")
+        PermissionRole.objects.create(role=role, permission=Permission.objects.create(action=rbac.VIEW, entity="livestock"))
+        cls.admin = User.objects.create(username="admin", email="admin@example.com", role=Role.objects.create(name="super_admin"))
+
+        governorate = Governorate.objects.create(name="حمص")
+        area = Area.objects.create(name="الرستن", governorate=governorate)
+        cls.manager = User.objects.create(username="manager", email="manager@example.com", role=role, area=area)
+        cls.village = Village.objects.create(
+            name="الغنطو", subarea=SubArea.objects.create(name="تلبيسة", area=area), type=Village.VillageType.CITY,
+        )
+        cls.other_village = Village.objects.create(
+            name="الحصن", subarea=SubArea.objects.create(name="الناصرة", area=Area.objects.create(name="تلكلخ", governorate=governorate)),
+            type=Village.VillageType.CITY,
+        )
+        Livestock.objects.bulk_create([
+            Livestock(
+                village=cls.village if year % 2 else cls.other_village, year=year, cows_count=year - 2000,
+                feeds={"شعير": year - 2000}, created_by=cls.admin,
+            )
+            for year in range(2010, 2017)
+        ])
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            rbac.permission_matrix.invalidate()
+
+    def export(self, user, output="csv"):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get("/api/data/exports/livestock/", {"output": output})
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        content = self.export(self.admin)
+        self.assertTrue(content.startswith("\ufeff"))
+        rows = list(csv.DictReader(io.StringIO(content[1:])))
+        self.assertEqual(len(rows), 7)
+        first = rows[0]
+        self.assertEqual((first["year"], first["village_name"], first["created_by_name"]), ("2010", "الحصن", "admin"))
+        self.assertEqual(json.loads(first["feeds"]), {"شعير": 10})
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export(self.admin, "ndjson").splitlines()]
+        self.assertEqual([row["year"] for row in rows], list(range(2010, 2017)))
+        self.assertEqual((rows[1]["village_id"], rows[1]["village_name"], rows[1]["feeds"]), (self.village.id, "الغنطو", {"شعير": 11}))
+
+    def test_scope(self):
+        rows = [json.loads(line) for line in self.export(self.manager, "ndjson").splitlines()]
+        self.assertEqual({row["village_id"] for row in rows}, {self.village.id})
+        self.assertEqual(len(rows), Livestock.objects.for_user(self.manager).count())
+
+    def test_multiple_batches(self):
+        rows = Livestock.objects.filter(cows_count__gte=11)
+        chunks = list(exporter.stream_export(rows, "csv", chunk_size=2))
+        # العناوين ثم دفعة لكل صفين
+        self.assertEqual(len(chunks), 1 + 3)
+        self.assertEqual(len(list(csv.reader(io.StringIO("".join(chunks)[1:])))) - 1, rows.count())
+
+
+@mock.patch.object(audit, "ASYNC_ENABLED", False)
+class ImporterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="admin", role=Role.objects.create(name="super_admin"))
+        area = Area.objects.create(name="الرستن", governorate=Governorate.objects.create(name="حمص"))
+        subarea = SubArea.objects.create(name="تلبيسة", area=area)
+        cls.village = Village.objects.create(name="الغنطو", subarea=subarea, type=Village.VillageType.CITY)
+        cls.other_village = Village.objects.create(name="الزعفرانة", subarea=subarea, type=Village.VillageType.CITY)
+
+    def run_import(self, entity_type, text, allowed=None):
+        importer = Importer(entity_type, user_id=self.admin.id, allowed_village_ids=allowed)
+        with self.captureOnCommitCallbacks(execute=True):
+            return importer.run(io.StringIO(text), "csv")
+
+    def test_reimport_updates_row_and_is_audited(self):
+        self.run_import("livestock", f"village_id,year,cows_count,sheep_count\n{self.village.id},2024,5,1\n")
+        result = self.run_import("livestock", "village,year,cows_count\nالغنطو,2024,9\n")
+
+        self.assertEqual((result["written"], result["invalid"]), (1, 0))
+        row = Livestock.objects.get()
+        self.assertEqual((row.cows_count, row.sheep_count), (9, 1))
+        self.assertEqual(AuditLog.objects.filter(entity_type="livestock", entity_id=0).count(), 2)
+
+    def test_null_season_rows_are_upserted(self):
+        text = f"village_id,year,season,total_agricultural_area\n{self.village.id},2024,,10\n{self.village.id},2024,winter,3\n"
+        self.run_import("agricultural_status", text)
+        self.run_import("agricultural_status", text.replace(",10", ",12"))
+
+        self.assertEqual(
+            dict(AgriculturalStatus.objects.values_list("season", "total_agricultural_area")), {None: 12, "winter": 3},
+        )
+
+    def test_rows_outside_scope_are_rejected(self):
+        text = f"village_id,year\n{self.village.id},2024\n{self.other_village.id},2024\n"
+        result = self.run_import("livestock", text, allowed={self.village.id})
+
+        self.assertEqual((result["written"], result["invalid"]), (1, 1))
+        self.assertEqual(result["errors"], [{"row": 3, "error": "القرية خارج نطاقك"}])
+        self.assertFalse(Livestock.objects.filter(village=self.other_village).exists())
+
+    def test_float_village_ids_from_xlsx(self):
+        self.assertEqual(VillageDirectory().resolve({"village_id": float(self.village.id)}), (self.village.id, None))
+
+
+@mock.patch.object(sync, "SYNC_LAG", timedelta(0))
+class SyncTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="super_admin")
+        cls.admin = User.objects.create(username="admin", role=role)
+
+        governorate = Governorate.objects.create(name="حمص")
+        cls.area = Area.objects.create(name="الرستن", governorate=governorate)
+        subarea = SubArea.objects.create(name="تلبيسة", area=cls.area)
+        cls.village = Village.objects.create(name="الغنطو", subarea=subarea, type=Village.VillageType.CITY)
+        cls.neighbour = Village.objects.create(name="الزعفرانة", subarea=subarea, type=Village.VillageType.CITY)
+        other_subarea = SubArea.objects.create(
+            name="الحواش", area=Area.objects.create(name="تلكلخ", governorate=governorate),
+        )
+        cls.other_village = Village.objects.create(name="الناصرة", subarea=other_subarea, type=Village.VillageType.CITY)
+
+    def changes(self, token=None, limit=10):
+        return sync.changes("livestock", Livestock.objects.all(), None, token, limit)
+
+    def area_changes(self, token=None, scope=None):
+        return sync.changes(
+            "livestock", Livestock.objects.in_scope(AREA, self.area.id), descendant_ids(AREA, self.area.id, VILLAGE),
+            token, scope=scope or f"area:{self.area.id}",
+        )
+
+    def test_pages_then_returns_only_changes_and_deletions(self):
+        rows = [Livestock.objects.create(village=self.village, year=2000 + i, created_by=self.admin) for i in range(3)]
+
+        first = self.changes(limit=2)
+        self.assertTrue(first["has_more"])
+        second = self.changes(first["next"], limit=2)
+        self.assertFalse(second["has_more"])
+        self.assertEqual([row["id"] for row in first["rows"] + second["rows"]], [row.id for row in rows])
+
+        rows[0].cows_count = 5
+        rows[0].save()
+        deleted_id = rows[1].id
+        rows[1].delete()
+
+        delta = self.changes(second["next"])
+        self.assertEqual([row["id"] for row in delta["rows"]], [rows[0].id])
+        self.assertEqual(delta["deleted"], [deleted_id])
+        self.assertEqual(self.changes(delta["next"])["rows"], [])
+
+    def test_rows_moved_out_of_scope_are_deleted_for_that_scope(self):
+        row = Livestock.objects.create(village=self.village, year=2024, created_by=self.admin)
+        area_token = self.area_changes()["next"]
+        token = self.changes()["next"]
+
+        row.village = self.neighbour
+        row.save()
+        delta = self.area_changes(area_token)
+        self.assertEqual(([r["id"] for r in delta["rows"]], delta["deleted"]), ([row.id], []))
+
+        row.village = self.other_village
+        row.save()
+        self.assertEqual(self.area_changes(delta["next"])["deleted"], [row.id])
+        delta = self.changes(token)
+        self.assertEqual(([r["id"] for r in delta["rows"]], delta["deleted"]), ([row.id], []))
+
+    def test_scope_change_resets(self):
+        token = self.area_changes()["next"]
+        self.assertFalse(self.area_changes(token)["reset"])
+        self.assertTrue(self.area_changes(token, scope="area:0")["reset"])
+
+
+class TokenAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.governorate = Governorate.objects.create(name="حمص")
+        cls.area = Area.objects.create(name="الرستن", governorate=cls.governorate)
+        cls.user = User.objects.create(
+            username="manager", role=Role.objects.create(name="area_manager"),
+            governorate=cls.governorate, area=cls.area,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def authenticate(self, token):
+        auth = ScopedJWTAuthentication()
+        return auth.get_user(auth.get_validated_token(str(token.access_token)))
+
+    def test_user_is_built_from_claims(self):
+        token = ScopedRefreshToken.for_user(self.user)
+        self.authenticate(token)
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertIsInstance(user, TokenPrincipal)
+        self.assertEqual((user.pk, user.role.name, user.area_id), (self.user.pk, "area_manager", self.area.id))
+
+    def test_role_status_and_scope_changes_revoke_tokens_after_commit(self):
+        for field, value in (
+            ("role", Role.objects.create(name="data_entry")),
+            ("area", Area.objects.create(name="تلكلخ", governorate=self.governorate)),
+            ("status", "deactive"),
+        ):
+            with self.subTest(field=field):
+                token = ScopedRefreshToken.for_user(self.user)
+                self.authenticate(token)
+                with self.captureOnCommitCallbacks(execute=True):
+                    setattr(self.user, field, value)
+                    self.user.save()
+                    self.authenticate(token)
+                with self.assertRaises(AuthenticationFailed):
+                    self.authenticate(token)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_epoch, 3)
+
+
+class RevocationIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="entry", role=Role.objects.create(name="data_entry"))
+
+    def jti(self, token):
+        return token.payload["jti"]
+
+    def test_revoked_tokens_and_other_workers(self):
+        index = RevocationIndex()
+        revoked, live = ScopedRefreshToken.for_user(self.user), ScopedRefreshToken.for_user(self.user)
+        revoked.blacklist()
+        self.assertTrue(index.is_revoked(self.jti(revoked)))
+        self.assertFalse(index.is_revoked(self.jti(live)))
+
+        # blacklist() يضيف إلى فهرس العملية العام، فهذا الفهرس يعرفه من القاعدة بعد SYNC_INTERVAL
+        other = ScopedRefreshToken.for_user(self.user)
+        other.blacklist()
+        with mock.patch.object(revocation, "SYNC_INTERVAL", 0):
+            self.assertTrue(index.is_revoked(self.jti(other)))
+
+    def test_rebuild_runs_outside_the_lock(self):
+        index = RevocationIndex()
+        index.is_revoked("unknown")
+        build = index._build
+
+        def check_unlocked():
+            self.assertFalse(index._lock.locked())
+            return build()
+
+        with mock.patch.object(revocation, "REBUILD_INTERVAL", 0), \
+                mock.patch.object(index, "_build", side_effect=check_unlocked) as patched:
+            token = ScopedRefreshToken.for_user(self.user)
+            token.blacklist()
+            self.assertTrue(index.is_revoked(self.jti(token)))
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(index.stats()["rebuilds"], 2)
+
+    def blacklist(self, row_id):
+        token = ScopedRefreshToken.for_user(self.user)
+        BlacklistedToken.objects.create(id=row_id, token=OutstandingToken.objects.get(jti=self.jti(token)))
+        return self.jti(token)
+
+    @mock.patch.object(revocation, "SYNC_INTERVAL", 0)
+    def test_lower_id_committed_after_higher_id(self):
+        index = RevocationIndex()
+        index.is_revoked("unknown")
+        # 11 حُجز قبل 12 لكن معاملته انتهت بعد أن قرأ الفهرس 12
+        later = self.blacklist(12)
+        self.assertTrue(index.is_revoked(later))
+        earlier = self.blacklist(11)
+        self.assertTrue(index.is_revoked(earlier))
+
+        # بعد SYNC_GRACE لا تُعاد قراءة ما تحت آخر id مقروء
+        with mock.patch.object(revocation, "SYNC_GRACE", 0):
+            index.is_revoked("unknown")
+            late = self.blacklist(10)
+            self.assertFalse(index.is_revoked(late))
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.registry.reset()
+
+    def test_streaming_response_is_recorded_when_iteration_ends(self):
+        def body():
+            yield b"id,name\n"
+            Role.objects.count()
+            yield b"1,x\n"
+
+        middleware = MetricsMiddleware(lambda request: StreamingHttpResponse(body()))
+        response = middleware(RequestFactory().get("/export/"))
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertEqual(metrics.registry.snapshot(), {})
+
+        self.assertEqual(b"".join(response.streaming_content), b"id,name\n1,x\n")
+        series = metrics.registry.snapshot()[("unmatched", "GET")]
+        self.assertEqual((series.count, series.response_bytes, series.queries), (1, 12, 1))
+
+    def test_endpoint_requires_token_even_from_localhost(self):
+        client = APIClient(REMOTE_ADDR="127.0.0.1")
+        self.assertEqual(client.get("/metrics").status_code, 403)
+        with mock.patch.object(metrics, "TOKEN", "secret"):
+            self.assertEqual(client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+
+class SyntheticDataTests(TestCase):
+    def generate(self):
+        SyntheticDataGenerator(seed=7, villages=30, persons=300, years=2, end_year=2024, users=3).run()
+        return list(Person.objects.order_by("id").values_list("name", "phone", "village__name", "created_at"))
+
+    def test_same_seed_generates_same_data(self):
+        with transaction.atomic():
+            first = self.generate()
+            transaction.set_rollback(True)
+
+        second = self.generate()
+        self.assertEqual(len(second), 300)
+        self.assertEqual(first, second)
+        self.assertEqual(Livestock.objects.count(), 60)
+
+        counts = rebuild_derived()
+        self.assertGreater(counts["PersonSearchToken"], 0)
+        self.assertGreater(counts["DemographicRollup"], 0)
@@ -0,0 +1,98 @@
+import numpy as np
+
+from .models import DemographicData, Livestock
+
+LIVESTOCK_FIELDS = (
+    "cows_count",
+    "sheep_count",
+    "poultry_count",
+    "camels_count",
+    "fish_count",
+    "meat_production",
+    "egg_production",
+    "grazing_areas",
+    "grazing_areas_size",
+    "breeders_count",
+    "veterinarians_count",
+)
+
+# أقصى عدد سنوات بطلب واحد
+MAX_YEARS = 50
+
+
+def column_list( values ) -> list :
+    """مصفوفة -> قائمة JSON، NaN تصبح null"""
+    return [None if np.isnan( value ) else round( float( value ) , 4 ) for value in values]
+
+
+def year_totals( rows , start_year : int , year_count : int , width : int ) :
+    """
+    rows: [(year, v1, v2, ...)] -> (مجاميع لكل سنة وعمود، عدد القيم المبلغ عنها، عدد الأسطر لكل سنة)
+    القيم الفارغة (None) لا تدخل بالمجموع.
+    """
+    totals = np.zeros( ( year_count , width ) )
+    reported = np.zeros( ( year_count , width ) )
+    row_counts = np.zeros( year_count )
+    if not rows :
+        return totals , reported , row_counts
+
+    data = np.array( rows , dtype = float )
+    year_index = data[:, 0].astype( int ) - start_year
+    values = data[:, 1:]
+    present = ~np.isnan( values )
+
+    np.add.at( totals , year_index , np.where( present , values , 0.0 ) )
+    np.add.at( reported , year_index , present )
+    row_counts = np.bincount( year_index , minlength = year_count ).astype( float )
+    return totals , reported , row_counts
+
+
+def livestock_series( livestock , demographics , start_year : int , end_year : int ) -> dict :
+    """
+    سلاسل زمنية للثروة الحيوانية لنطاق معين، محسوبة بشكل متجه:
+    المجموع لكل سنة، الفرق عن السنة السابقة، نسبة النمو، والمعدل لكل 1000 نسمة.
+    livestock / demographics: QuerySets مفلترة على النطاق مسبقاً.
+    """
+    years = np.arange( start_year , end_year + 1 )
+    year_count = len( years )
+
+    livestock_rows = list(
+        livestock.filter( year__gte = start_year , year__lte = end_year ).values_list( "year" , *LIVESTOCK_FIELDS )
+    )
+    population_rows = list(
+        demographics.filter( year__gte = start_year , year__lte = end_year ).values_list( "year" , "population" )
+    )
+
+    totals , reported , villages = year_totals( livestock_rows , start_year , year_count , len( LIVESTOCK_FIELDS ) )
+    population , population_reported , _ = year_totals( population_rows , start_year , year_count , 1 )
+    population = np.where( population_reported[:, 0] > 0 , population[:, 0] , np.nan )
+
+    # سنة بدون أي قيمة مبلغ عنها = NaN (وليس صفر)
+    totals = np.where( reported > 0 , totals , np.nan )
+
+    previous = np.vstack( [np.full( ( 1 , totals.shape[1] ) , np.nan ) , totals[:-1]] )
+    deltas = totals - previous
+    with np.errstate( divide = "ignore" , invalid = "ignore" ) :
+        growth = np.where( previous > 0 , deltas / previous , np.nan )
+        per_thousand = totals / population[:, None] * 1000
+
+    return {
+        "years" : years.tolist() ,
+        "fields" : list( LIVESTOCK_FIELDS ) ,
+        "villages_reporting" : villages.astype( int ).tolist() ,
+        "population" : column_list( population ) ,
+        "totals" : { field : column_list( totals[:, i] ) for i , field in enumerate( LIVESTOCK_FIELDS ) } ,
+        "yoy_delta" : { field : column_list( deltas[:, i] ) for i , field in enumerate( LIVESTOCK_FIELDS ) } ,
+        "growth_rate" : { field : column_list( growth[:, i] ) for i , field in enumerate( LIVESTOCK_FIELDS ) } ,
+        "per_1000_people" : { field : column_list( per_thousand[:, i] ) for i , field in enumerate( LIVESTOCK_FIELDS ) } ,
+    }
+
+
+def scoped_livestock_series( user , level , node_id , start_year : int , end_year : int ) -> dict :
+    if level :
+        livestock = Livestock.objects.in_scope( level , node_id )
+        demographics = DemographicData.objects.in_scope( level , node_id )
+    else :
+        livestock = Livestock.objects.for_user( user )
+        demographics = DemographicData.objects.for_user( user )
+    return livestock_series( livestock , demographics , start_year , end_year )
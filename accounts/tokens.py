@@ -0,0 +1,36 @@
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .revocation import revocation_index
+
+
+class ScopedRefreshToken( RefreshToken ) :
+    """
+    RefreshToken يحمل الدور والنطاق الجغرافي وحالة الحساب.
+    التوكن access الناتج عنه ينسخ هذه القيم، فيُبنى المستخدم من التوكن دون استعلام.
+    فحص الحظر يمر عبر revocation_index بدل استعلام BlacklistedToken عند كل تحديث.
+    """
+
+    @classmethod
+    def for_user( cls , user ) :
+        token = super().for_user( user )
+
+        role = getattr( user , "role" , None )
+        token["username"] = user.username
+        token["role"] = getattr( role , "name" , None )
+        token["governorate_id"] = user.governorate_id
+        token["area_id"] = user.area_id
+        token["subarea_id"] = user.subarea_id
+        token["status"] = user.status
+        token["epoch"] = user.token_epoch
+        return token
+
+    def check_blacklist( self ) :
+        if revocation_index.is_revoked( self.payload[api_settings.JTI_CLAIM] ) :
+            raise TokenError( "Token is blacklisted" )
+
+    def blacklist( self ) :
+        result = super().blacklist()
+        revocation_index.add( self.payload[api_settings.JTI_CLAIM] )
+        return result
@@ -1,5 +1,5 @@
 from django.urls import path , include
-from .views import LoginView, RefreshView, LogoutView, MeView , ChangePasswordView , ProfileView , AccountManagementViewSet
+from .views import LoginView, AsyncLoginView, RefreshView, LogoutView, MeView , ChangePasswordView , ProfileView , AccountManagementViewSet
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -7,6 +7,7 @@ router.register("accounts", AccountManagementViewSet, basename="accounts-managem
 
 urlpatterns = [
     path("login/", LoginView.as_view(), name="login"),
+    path("login/async/", AsyncLoginView.as_view(), name="login_async"),
     path("refresh/", RefreshView.as_view(), name="refresh"),
     path("logout/", LogoutView.as_view(), name="logout"),
     path("me/", MeView.as_view(), name="me"),
@@ -17,3 +17,39 @@ def is_area_manager(user) -> bool:
 
 def is_data_entry(user) -> bool:
     return get_role_name(user) == "data_entry"
+
+
+def has_entity_permission(user, action: str, entity: str) -> bool:
+    from .rbac import permission_matrix
+
+    if is_super_admin(user):
+        return True
+    return permission_matrix.has_permission(get_role_name(user), action, entity)
+
+
+def reviewable_entity_types(user) -> list:
+    from . import rbac
+    from .models import ModificationRequest
+
+    return [
+        entity_type for entity_type in ModificationRequest.EntityType.values
+        if has_entity_permission(user, rbac.REVIEW, entity_type)
+    ]
+
+
+def user_scope(user):
+    """
+    النطاق الجغرافي للمستخدم كـ (level, node_id):
+    مدير المنطقة -> منطقته، وغيره -> أدق مستوى محدد له (ناحية ثم منطقة ثم محافظة).
+    """
+    subarea_id = getattr(user, "subarea_id", None)
+    area_id = getattr(user, "area_id", None)
+    governorate_id = getattr(user, "governorate_id", None)
+
+    if is_area_manager(user) and area_id:
+        return "area", area_id
+    if subarea_id:
+        return "subarea", subarea_id
+    if area_id:
+        return "area", area_id
+    return "governorate", governorate_id
@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import CacheVersion
+
+# أقصى مدة (ثوان) تعتمد فيها العملية على الرقم المقروء قبل قراءته من القاعدة مجدداً
+CHECK_INTERVAL = getattr( settings , "CACHE_VERSION_CHECK_SECONDS" , 1.0 )
+
+
+class SharedVersion :
+    """
+    رقم نسخة مشترك بين كل العمليات (workers) محفوظ في صف CacheVersion، وليس في كاش العملية الواحدة.
+    كل عملية تعيد قراءته مرة كل CHECK_INTERVAL على الأكثر، فالتغيير يصل لكل العمليات خلال هذه المدة.
+    الزيادة تتم بعد نجاح المعاملة (on_commit): التراجع لا يبطل شيئاً، ولا تُبنى نسخة من بيانات غير مثبتة.
+    """
+
+    def __init__( self , key : str ) :
+        self.key = key
+        self._value = None
+        self._checked_at = 0.0
+
+    def get( self ) -> int :
+        now = time.monotonic()
+        if self._value is None or now - self._checked_at >= CHECK_INTERVAL :
+            self._value = CacheVersion.objects.filter( key = self.key ).values_list( "value" , flat = True ).first() or 0
+            self._checked_at = now
+        return self._value
+
+    def bump( self ) :
+        transaction.on_commit( self._increment )
+
+    def _increment( self ) :
+        if not CacheVersion.objects.filter( key = self.key ).update( value = F( "value" ) + 1 ) :
+            _ , created = CacheVersion.objects.get_or_create( key = self.key , defaults = { "value" : 1 } )
+            if not created :
+                CacheVersion.objects.filter( key = self.key ).update( value = F( "value" ) + 1 )
+        # هذه العملية ترى التغيير فوراً بدون انتظار CHECK_INTERVAL
+        self._value = None
@@ -1,17 +1,53 @@
+import csv
+import io
+import json
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Upper
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions , viewsets
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework.generics import RetrieveUpdateAPIView 
+from . import metrics
+from .audit import audit_writer
+from .entities import snapshot
+from .models import AuditLog
 from .Permission import CanManageAccounts
+from .pagination import CreatedAtCursorPagination
+from .passwords import acheck_user_password, hash_passwords
+from .tokens import ScopedRefreshToken
 from .utils import * 
 from .serializers import * 
 from .helper import *
 
 User = get_user_model() 
 
+# الحقول المسجلة في AuditLog عند تعديل الحسابات (بدون كلمة المرور)
+AUDITED_USER_FIELDS = (
+    "username", "email", "first_name", "last_name", "phone", "gender", "birth_date",
+    "role_id", "governorate_id", "area_id", "subarea_id", "status",
+)
+
+def user_audit_entry(actor, user, action, old_data=None):
+    return AuditLog(
+        user_id=actor.id,
+        entity_type="users",
+        entity_id=user.pk,
+        action=action,
+        old_data=old_data,
+        new_data=snapshot(user, AUDITED_USER_FIELDS),
+    )
+
 def user_payload(user) :
     return {
         "id": user.id,
@@ -33,7 +69,7 @@ class LoginView( APIView ) :
        serializer.is_valid( raise_exception = True )
        user = serializer.validated_data["user"]
 
-       refresh = RefreshToken.for_user(user) 
+       refresh = ScopedRefreshToken.for_user(user) 
        access = str(refresh.access_token)
 
        response = Response(
@@ -46,6 +82,62 @@ class LoginView( APIView ) :
        
        set_refresh_cookie( response , str(refresh) ) 
        return response
+
+
+class MetricsView( View ) :
+    """مقاييس الطلبات بصيغة Prometheus، من العناوين المسموحة أو بتوكن METRICS_TOKEN"""
+
+    def get( self , request ) :
+        if not metrics.is_authorized( request ) :
+            return HttpResponse( status = status.HTTP_403_FORBIDDEN )
+        return HttpResponse( metrics.render() , content_type = "text/plain; version=0.0.4; charset=utf-8" )
+
+
+@method_decorator( csrf_exempt , name = "dispatch" )
+class AsyncLoginView( View ) :
+    """
+    نسخة غير متزامنة من LoginView لخوادم ASGI:
+    التحقق من كلمة المرور يتم في pool محدود (passwords.py) فلا يُحجز العامل أثناء موجة تسجيل الدخول.
+    """
+
+    def error( self , message ) :
+        return JsonResponse( {"error" : [message]} , status = status.HTTP_400_BAD_REQUEST )
+
+    async def post( self , request ) :
+        try :
+            data = json.loads( request.body or b"{}" )
+        except ValueError :
+            data = {}
+        if not isinstance( data , dict ) :
+            data = {}
+
+        identifier = str( data.get( "identifier" ) or "" ).strip()
+        password = str( data.get( "password" ) or "" )
+
+        if not identifier or not password :
+            return self.error( "الرجاء ادخال الايميل وكلمة المرور" )
+
+        user = await login_queryset( identifier ).afirst()
+        if not user :
+            return self.error( "الايميل او المستخدم غير موجود" )
+
+        if not user.is_active or not await acheck_user_password( user , password ) :
+            return self.error( "اسم المستخدم او كلمة المرور غير صحيحة" )
+
+        if user.status == User.Status.DEACTIVE :
+            return self.error( "هذا الحساب غير مفعل" )
+
+        refresh = await sync_to_async( ScopedRefreshToken.for_user )( user )
+
+        response = JsonResponse(
+            {
+                "Message" : "تم تسجيل الدخول بنجاح" ,
+                "access" : str( refresh.access_token ) ,
+                "user" : user_payload( user ) ,
+            } , status = status.HTTP_200_OK
+        )
+        set_refresh_cookie( response , str( refresh ) )
+        return response
    
 
 class RefreshView( APIView ) : 
@@ -59,7 +151,7 @@ class RefreshView( APIView ) :
             } , status = status.HTTP_401_UNAUTHORIZED)
 
         try : 
-            old_refresh = RefreshToken(refresh_token) 
+            old_refresh = ScopedRefreshToken(refresh_token) 
             user_id = old_refresh.get("user_id") 
         except TokenError : 
             return Response(
@@ -67,16 +159,20 @@ class RefreshView( APIView ) :
                 status = status.HTTP_401_UNAUTHORIZED
             )    
         
-        user = User.objects.filter( id = user_id ).first()
+        user = User.objects.select_related("role").filter( id = user_id ).first()
         if not user : 
            return Response({"error": "User not found"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        # الحساب تعطّل أو تغيّر دوره/كلمة مروره بعد إصدار هذا التوكن
+        if user.status == User.Status.DEACTIVE or old_refresh.get("epoch", user.token_epoch) != user.token_epoch :
+            return Response({"error": "refresh token revoked"}, status=status.HTTP_401_UNAUTHORIZED)
         
         try:
             old_refresh.blacklist()
         except Exception:
             pass
 
-        new_refresh = RefreshToken.for_user(user)
+        new_refresh = ScopedRefreshToken.for_user(user)
         new_access = str(new_refresh.access_token)
 
         response = Response(
@@ -94,7 +190,7 @@ class LogoutView(APIView):
 
         if refresh_token:
             try:
-                RefreshToken(refresh_token).blacklist()
+                ScopedRefreshToken(refresh_token).blacklist()
             except Exception:
                 pass
 
@@ -125,7 +221,7 @@ class ChangePasswordView(APIView) :
         refresh_token = request.COOKIES.get(REFRESH_COOKIE_NAME)
         if refresh_token:
             try:
-                RefreshToken(refresh_token).blacklist()
+                ScopedRefreshToken(refresh_token).blacklist()
             except Exception:
                 pass
 
@@ -138,7 +234,7 @@ class ProfileView ( RetrieveUpdateAPIView ) :
     permission_classes = [permissions.IsAuthenticated] 
 
     def get_object(self): 
-        return self.request.user
+        return User.objects.select_related("role").get(pk=self.request.user.pk)
     
 class AccountManagementViewSet(viewsets.ModelViewSet):
     """
@@ -150,31 +246,176 @@ class AccountManagementViewSet(viewsets.ModelViewSet):
 
     queryset = User.objects.all()
     permission_classes = [ permissions.IsAuthenticated, CanManageAccounts]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         user = self.request.user
+        users = User.objects.select_related("role", "governorate", "area")
 
         if is_super_admin(user):
             # يشوف كل المستخدمين
-            return User.objects.all()
+            pass
 
-        if is_area_manager(user):
+        elif is_area_manager(user):
             # يرى فقط مستخدمين من نفس منطقته
-            return User.objects.filter(
-                governorate=user.governorate,
-                area=user.area
+            users = users.filter(
+                governorate_id=user.governorate_id,
+                area_id=user.area_id
+            )
+
+        else:
+            # مدخل بيانات أصلاً permission ما راح يسمح له يوصل لهون
+            return User.objects.none()
+
+        return self.filter_users(users)
+
+    def filter_users(self, users):
+        """
+        فلترة من طرف السيرفر: ?status=active&role=data_entry&area=3&search=ahmad
+        """
+        params = self.request.query_params
+
+        status_param = params.get("status")
+        if status_param:
+            users = users.filter(status=status_param)
+
+        role = params.get("role")
+        if role:
+            users = users.filter(role__name__iexact=role)
+
+        area = params.get("area")
+        if area:
+            users = users.filter(area_id=area) if area.isdigit() else users.filter(area__name=area)
+
+        search = (params.get("search") or "").strip()
+        if search:
+            users = users.filter(
+                Q(username__icontains=search)
+                | Q(email__icontains=search)
+                | Q(first_name__icontains=search)
+                | Q(last_name__icontains=search)
+                | Q(phone__icontains=search)
             )
 
-        # مدخل بيانات أصلاً permission ما راح يسمح له يوصل لهون
-        return User.objects.none()
+        return users
+
+    def perform_create(self, serializer):
+        user = serializer.save()
+        audit_writer.log(user_audit_entry(self.request.user, user, AuditLog.Action.CREATE))
+
+    def perform_update(self, serializer):
+        old_data = snapshot(serializer.instance, AUDITED_USER_FIELDS)
+        user = serializer.save()
+        audit_writer.log(user_audit_entry(self.request.user, user, AuditLog.Action.UPDATE, old_data))
 
     def get_serializer_class(self):
-        if self.action == "create":
+        if self.action in ["create", "bulk"]:
             return AdminUserCreateSerializer
         if self.action in ["update", "partial_update"]:
             return AdminUserUpdateSerializer
         return AdminUserListSerializer
 
+    def read_bulk_rows(self, request):
+        """
+        الدفعة إما JSON (قائمة أو {"users": [...]}) أو ملف CSV مرفوع باسم file.
+        """
+        upload = request.FILES.get("file")
+        if upload is not None:
+            text = io.TextIOWrapper(upload.file, encoding="utf-8-sig")
+            # الخلايا الفارغة بالـ CSV تعني حقل غير مرسل
+            return [
+                {key: value for key, value in row.items() if key and value not in (None, "")}
+                for row in csv.DictReader(text)
+            ]
+
+        data = request.data
+        if isinstance(data, dict):
+            data = data.get("users")
+        return data if isinstance(data, list) else None
+
+    @action(detail=False, methods=["post"], url_path="bulk", parser_classes=[JSONParser, MultiPartParser])
+    def bulk(self, request):
+        """
+        إنشاء مستخدمين دفعة واحدة بنفس قواعد AdminUserCreateSerializer.
+        إذا فشل أي سطر لا يُنشأ أحد، ويُعاد تقرير بالأخطاء لكل سطر.
+        """
+        rows = self.read_bulk_rows(request)
+        if not rows:
+            return Response({"error": "الرجاء إرسال قائمة مستخدمين أو ملف CSV"}, status=status.HTTP_400_BAD_REQUEST)
+
+        errors = []
+        valid = []
+        seen_usernames = set()
+        seen_emails = set()
+        context = {**self.get_serializer_context(), "slugs": AdminUserBulkCreateSerializer.prefetch_slugs()}
+
+        for index, row in enumerate(rows, start=1):
+            serializer = AdminUserBulkCreateSerializer(data=row, context=context)
+            if not serializer.is_valid():
+                errors.append({"row": index, "errors": serializer.errors})
+                continue
+
+            data = serializer.validated_data
+            username = data["username"].upper()
+            email = data["email"].upper()
+            if username in seen_usernames or email in seen_emails:
+                errors.append({"row": index, "errors": {"error": ["اسم المستخدم أو الايميل مكرر ضمن الدفعة"]}})
+                continue
+
+            seen_usernames.add(username)
+            seen_emails.add(email)
+            valid.append((index, data))
+
+        # التفرد مع الحسابات الموجودة: استعلام واحد للدفعة على فهارس UPPER(username) / UPPER(email)
+        taken_usernames, taken_emails = set(), set()
+        for username, email in (
+            User.objects.alias(upper_username=Upper("username"), upper_email=Upper("email"))
+            .filter(Q(upper_username__in=seen_usernames) | Q(upper_email__in=seen_emails))
+            .values_list("username", "email")
+        ):
+            taken_usernames.add(username.upper())
+            taken_emails.add(email.upper())
+
+        for index, data in valid:
+            if data["username"].upper() in taken_usernames or data["email"].upper() in taken_emails:
+                errors.append({"row": index, "errors": {"error": ["اسم المستخدم أو الايميل مستخدم مسبقاً"]}})
+        valid = [data for _, data in valid]
+
+        if errors:
+            errors.sort(key=lambda error: error["row"])
+            return Response(
+                {"error": "لم يتم إنشاء أي حساب", "errors": errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        hashes = hash_passwords([data["password"] for data in valid])
+
+        users = []
+        for data, password_hash in zip(valid, hashes):
+            fields = {key: value for key, value in data.items() if key not in ("password", "confirm_password")}
+            users.append(User(password=password_hash, **fields))
+
+        try:
+            with transaction.atomic():
+                created = User.objects.bulk_create(users, batch_size=500)
+                audit_writer.log(*[
+                    user_audit_entry(request.user, user, AuditLog.Action.CREATE) for user in created
+                ])
+        except IntegrityError:
+            return Response(
+                {"error": "اسم المستخدم أو الايميل مستخدم مسبقاً"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            {
+                "message": f"تم إنشاء {len(created)} حساب",
+                "created": len(created),
+                "ids": [user.id for user in created],
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
     def destroy(self, request, *args, **kwargs):
         """
         لا نحذف المستخدم فعليًا، نعمل له deactive فقط.
@@ -192,8 +433,10 @@ class AccountManagementViewSet(viewsets.ModelViewSet):
                 )
 
         if hasattr(instance, "status"):
+            old_data = snapshot(instance, AUDITED_USER_FIELDS)
             instance.status = "deactive"
             instance.save(update_fields=["status"])
+            audit_writer.log(user_audit_entry(request.user, instance, AuditLog.Action.UPDATE, old_data))
             return Response(
                 {"message": "تم تعطيل الحساب (بدلاً من حذفه)"},
                 status=status.HTTP_200_OK,
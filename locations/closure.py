@@ -0,0 +1,184 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import Area, Governorate, SubArea, Village
+
+from .hierarchy import AREA, GOVERNORATE, LEVELS, SUBAREA, VILLAGE
+from .models import LocationClosure
+
+MODEL_LEVELS = {
+    Governorate : GOVERNORATE ,
+    Area : AREA ,
+    SubArea : SUBAREA ,
+    Village : VILLAGE ,
+}
+
+# المستوى -> حقل الأب في الجدول
+PARENT_FIELDS = {
+    AREA : "governorate_id" ,
+    SUBAREA : "area_id" ,
+    VILLAGE : "subarea_id" ,
+}
+
+BATCH_SIZE = 5000
+
+
+def parent_level( level : str ) :
+    index = LEVELS.index( level )
+    return LEVELS[index - 1] if index else None
+
+
+def ancestors( level : str , node_id , include_self : bool = False ) :
+    """أسلاف العقدة من الأقرب إلى الأبعد: QuerySet على LocationClosure"""
+    rows = LocationClosure.objects.filter( descendant_level = level , descendant_id = node_id )
+    if not include_self :
+        rows = rows.filter( depth__gt = 0 )
+    return rows.order_by( "depth" )
+
+
+def descendants( level : str , node_id , of_level : str = None , max_depth : int = None , include_self : bool = False ) :
+    """خلفاء العقدة، اختيارياً من مستوى معين أو حتى عمق معين"""
+    rows = LocationClosure.objects.filter( ancestor_level = level , ancestor_id = node_id )
+    if of_level :
+        rows = rows.filter( descendant_level = of_level )
+    if max_depth is not None :
+        rows = rows.filter( depth__lte = max_depth )
+    if not include_self :
+        rows = rows.filter( depth__gt = 0 )
+    return rows.order_by( "depth" )
+
+
+def descendant_ids( level : str , node_id , of_level : str ) :
+    """
+    معرفات الخلفاء من مستوى معين كـ subquery، مثال:
+    Livestock.objects.filter(village_id__in=descendant_ids(AREA, 3, VILLAGE))
+    """
+    if level == of_level :
+        return [node_id]
+    return descendants( level , node_id , of_level = of_level ).values( "descendant_id" )
+
+
+def villages_in( level : str , node_id ) -> frozenset :
+    """ids قرى العقدة كمجموعة في الذاكرة (استعلام واحد)، حيث لا يكفي descendant_ids كـ subquery"""
+    if node_id is None :
+        return frozenset()
+    rows = descendants( level , node_id , of_level = VILLAGE , include_self = True )
+    return frozenset( rows.values_list( "descendant_id" , flat = True ) )
+
+
+def governorate_of( level : str , node_id ) :
+    """المحافظة التي تقع فيها العقدة حالياً (أو None إذا لم تكن بالجدول)"""
+    return ancestors( level , node_id , include_self = True ).filter(
+        ancestor_level = GOVERNORATE
+    ).values_list( "ancestor_id" , flat = True ).first()
+
+
+def depth( level : str , node_id ) -> int :
+    """عمق العقدة في التسلسل (المحافظة = 0)"""
+    return ancestors( level , node_id ).count()
+
+
+def link_node( level : str , node_id , parent_id ) :
+    rows = [LocationClosure( ancestor_level = level , ancestor_id = node_id , descendant_level = level , descendant_id = node_id , depth = 0 )]
+    if parent_id is not None :
+        for ancestor_level , ancestor_id , ancestor_depth in ancestors(
+            parent_level( level ) , parent_id , include_self = True
+        ).values_list( "ancestor_level" , "ancestor_id" , "depth" ) :
+            rows.append( LocationClosure(
+                ancestor_level = ancestor_level , ancestor_id = ancestor_id ,
+                descendant_level = level , descendant_id = node_id ,
+                depth = ancestor_depth + 1 ,
+            ) )
+    LocationClosure.objects.bulk_create( rows , ignore_conflicts = True )
+
+
+def move_node( level : str , node_id , new_parent_id ) :
+    """نقل عقدة (مع كل ما تحتها) تحت أب جديد"""
+    subtree = list(
+        descendants( level , node_id , include_self = True ).values_list( "descendant_level" , "descendant_id" , "depth" )
+    )
+    if not subtree :
+        # العقدة غير موجودة بالجدول (مثلاً قبل أول rebuild)
+        link_node( level , node_id , new_parent_id )
+        return
+
+    by_level = defaultdict( list )
+    for sub_level , sub_id , _ in subtree :
+        by_level[sub_level].append( sub_id )
+    in_subtree = Q()
+    for sub_level , ids in by_level.items() :
+        in_subtree |= Q( descendant_level = sub_level , descendant_id__in = ids )
+
+    # أسلاف العقدة كلهم بمستويات أعلى منها، فلا يوجد أي منهم داخل الشجرة الفرعية
+    levels_above = LEVELS[:LEVELS.index( level )]
+
+    new_ancestors = []
+    if new_parent_id is not None :
+        new_ancestors = list(
+            ancestors( parent_level( level ) , new_parent_id , include_self = True )
+            .values_list( "ancestor_level" , "ancestor_id" , "depth" )
+        )
+
+    with transaction.atomic() :
+        LocationClosure.objects.filter( in_subtree , ancestor_level__in = levels_above ).delete()
+        LocationClosure.objects.bulk_create(
+            [
+                LocationClosure(
+                    ancestor_level = ancestor_level , ancestor_id = ancestor_id ,
+                    descendant_level = sub_level , descendant_id = sub_id ,
+                    depth = ancestor_depth + 1 + sub_depth ,
+                )
+                for ancestor_level , ancestor_id , ancestor_depth in new_ancestors
+                for sub_level , sub_id , sub_depth in subtree
+            ] ,
+            batch_size = BATCH_SIZE ,
+        )
+
+
+def unlink_node( level : str , node_id ) :
+    LocationClosure.objects.filter(
+        Q( descendant_level = level , descendant_id = node_id ) | Q( ancestor_level = level , ancestor_id = node_id )
+    ).delete()
+
+
+def iter_closure_rows() :
+    """كل أسطر الجدول محسوبة من الجداول الأربعة بأربعة استعلامات"""
+    paths = {}
+    for governorate_id in Governorate.objects.values_list( "id" , flat = True ) :
+        paths[( GOVERNORATE , governorate_id )] = [( GOVERNORATE , governorate_id )]
+        yield LocationClosure(
+            ancestor_level = GOVERNORATE , ancestor_id = governorate_id ,
+            descendant_level = GOVERNORATE , descendant_id = governorate_id , depth = 0 ,
+        )
+
+    for level , model in ( ( AREA , Area ) , ( SUBAREA , SubArea ) , ( VILLAGE , Village ) ) :
+        parent = parent_level( level )
+        for node_id , parent_id in model.objects.values_list( "id" , PARENT_FIELDS[level] ).iterator( chunk_size = BATCH_SIZE ) :
+            path = paths.get( ( parent , parent_id ) , [] ) + [( level , node_id )]
+            if level != VILLAGE :
+                paths[( level , node_id )] = path
+            for distance , ( ancestor_level , ancestor_id ) in enumerate( reversed( path ) ) :
+                yield LocationClosure(
+                    ancestor_level = ancestor_level , ancestor_id = ancestor_id ,
+                    descendant_level = level , descendant_id = node_id ,
+                    depth = distance ,
+                )
+
+
+@transaction.atomic
+def rebuild() -> int :
+    LocationClosure.objects.all().delete()
+    total = 0
+    batch = []
+    for row in iter_closure_rows() :
+        batch.append( row )
+        if len( batch ) >= BATCH_SIZE :
+            LocationClosure.objects.bulk_create( batch )
+            total += len( batch )
+            batch = []
+    if batch :
+        LocationClosure.objects.bulk_create( batch )
+        total += len( batch )
+    return total
@@ -0,0 +1,20 @@
+from accounts.versions import SharedVersion
+
+GOVERNORATE = "governorate"
+AREA = "area"
+SUBAREA = "subarea"
+VILLAGE = "village"
+
+# من الأعلى إلى الأسفل
+LEVELS = ( GOVERNORATE , AREA , SUBAREA , VILLAGE )
+
+# مشترك بين كل العمليات (صف في CacheVersion)، ويزداد بعد commit أي تعديل على التسلسل
+_hierarchy_version = SharedVersion( "locations:hierarchy_version" )
+
+
+def hierarchy_version() -> str:
+    return str( _hierarchy_version.get() )
+
+
+def bump_hierarchy_version() :
+    _hierarchy_version.bump()
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from locations import closure
+from locations.hierarchy import bump_hierarchy_version
+
+
+class Command( BaseCommand ) :
+    help = "إعادة بناء جدول الإغلاق (LocationClosure) من جداول المحافظات والمناطق والنواحي والقرى"
+
+    def handle( self , *args , **options ) :
+        total = closure.rebuild()
+        bump_hierarchy_version()
+        self.stdout.write( self.style.SUCCESS( f"rebuilt location closure: {total} rows" ) )
@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+def populate_closure(apps, schema_editor):
+    LocationClosure = apps.get_model('locations', 'LocationClosure')
+    levels = [
+        ('governorate', apps.get_model('accounts', 'Governorate'), None),
+        ('area', apps.get_model('accounts', 'Area'), 'governorate_id'),
+        ('subarea', apps.get_model('accounts', 'SubArea'), 'area_id'),
+        ('village', apps.get_model('accounts', 'Village'), 'subarea_id'),
+    ]
+
+    paths = {}
+    rows = []
+    parent = None
+    for level, model, parent_field in levels:
+        fields = ['id', parent_field] if parent_field else ['id']
+        for values in model.objects.values_list(*fields):
+            path = (paths.get((parent, values[1]), []) if parent_field else []) + [(level, values[0])]
+            paths[(level, values[0])] = path
+            for depth, (ancestor_level, ancestor_id) in enumerate(reversed(path)):
+                rows.append(LocationClosure(
+                    ancestor_level=ancestor_level, ancestor_id=ancestor_id,
+                    descendant_level=level, descendant_id=values[0], depth=depth,
+                ))
+        parent = level
+
+    LocationClosure.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_user_login_lookup_indexes'),
+        ('locations', '0002_remove_user_area_remove_subarea_area_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ancestor_level', models.CharField(choices=[('governorate', 'Governorate'), ('area', 'Area'), ('subarea', 'SubArea'), ('village', 'Village')], max_length=16)),
+                ('ancestor_id', models.BigIntegerField()),
+                ('descendant_level', models.CharField(choices=[('governorate', 'Governorate'), ('area', 'Area'), ('subarea', 'SubArea'), ('village', 'Village')], max_length=16)),
+                ('descendant_id', models.BigIntegerField()),
+                ('depth', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant_level', 'descendant_id', 'depth'], name='location_closure_desc_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor_level', 'ancestor_id', 'descendant_level', 'descendant_id'), name='uniq_location_closure_pair')],
+            },
+        ),
+        migrations.RunPython(populate_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import models
+
+
+class LocationClosure( models.Model ) :
+    """
+    جدول إغلاق (closure table) لتسلسل المحافظة -> المنطقة -> الناحية -> القرية.
+    سطر لكل زوج (سلف، خلف) بما فيها العقدة مع نفسها (depth = 0)،
+    فسؤال "كل قرى المنطقة X" أو "كل أسلاف القرية Y" يصبح join واحد مفهرس مهما كان المستوى.
+    """
+
+    class Level( models.TextChoices ) :
+        GOVERNORATE = "governorate", "Governorate"
+        AREA = "area", "Area"
+        SUBAREA = "subarea", "SubArea"
+        VILLAGE = "village", "Village"
+
+    ancestor_level = models.CharField( max_length = 16 , choices = Level.choices )
+    ancestor_id = models.BigIntegerField()
+    descendant_level = models.CharField( max_length = 16 , choices = Level.choices )
+    descendant_id = models.BigIntegerField()
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta :
+        constraints = [
+            models.UniqueConstraint(
+                fields = ["ancestor_level", "ancestor_id", "descendant_level", "descendant_id"] ,
+                name = "uniq_location_closure_pair" ,
+            )
+        ]
+        indexes = [
+            models.Index( fields = ["descendant_level", "descendant_id", "depth"] , name = "location_closure_desc_idx" ) ,
+        ]
+
+    def __str__( self ) :
+        return f"{self.ancestor_level}:{self.ancestor_id} -> {self.descendant_level}:{self.descendant_id} ({self.depth})"
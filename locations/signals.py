@@ -0,0 +1,53 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from accounts.models import Area, Governorate, SubArea, Village
+
+from . import closure
+from .hierarchy import bump_hierarchy_version
+
+HIERARCHY_MODELS = ( Governorate , Area , SubArea , Village )
+
+
+def old_parent_id( model , instance ) :
+    field = closure.PARENT_FIELDS.get( closure.MODEL_LEVELS[model] )
+    if not field or not instance.pk :
+        return None
+    return model.objects.filter( pk = instance.pk ).values_list( field , flat = True ).first()
+
+
+def move_and_recompute( level , node_id , parent_id ) :
+    """نقل العقدة في جدول الإغلاق ثم إعادة حساب مجاميع المحافظة القديمة والجديدة"""
+    from accounts import rollups
+
+    old_governorate_id = closure.governorate_of( level , node_id )
+    closure.move_node( level , node_id , parent_id )
+    rollups.recompute_governorates( { old_governorate_id , closure.governorate_of( level , node_id ) } )
+
+
+def on_pre_save( sender , instance , **kwargs ) :
+    instance._old_parent_id = old_parent_id( sender , instance )
+
+
+def on_post_save( sender , instance , created , **kwargs ) :
+    level = closure.MODEL_LEVELS[sender]
+    field = closure.PARENT_FIELDS.get( level )
+    parent_id = getattr( instance , field ) if field else None
+
+    if created :
+        closure.link_node( level , instance.pk , parent_id )
+    elif field and parent_id != getattr( instance , "_old_parent_id" , parent_id ) :
+        move_and_recompute( level , instance.pk , parent_id )
+
+    bump_hierarchy_version()
+
+
+def on_post_delete( sender , instance , **kwargs ) :
+    closure.unlink_node( closure.MODEL_LEVELS[sender] , instance.pk )
+    bump_hierarchy_version()
+
+
+for model in HIERARCHY_MODELS :
+    if model is not Governorate :
+        pre_save.connect( on_pre_save , sender = model , dispatch_uid = f"closure_pre_save_{model.__name__}" )
+    post_save.connect( on_post_save , sender = model , dispatch_uid = f"closure_post_save_{model.__name__}" )
+    post_delete.connect( on_post_delete , sender = model , dispatch_uid = f"closure_post_delete_{model.__name__}" )
@@ -1,3 +1,59 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts import versions
+from accounts.models import Area, Governorate, Role, SubArea, User, Village
+
+from .hierarchy import hierarchy_version
+
+
+# الرقم المقروء في العملية قد يبقى من اختبار سابق تراجعت معاملته، فنقرأ الصف المشترك دائماً
+@mock.patch.object(versions, "CHECK_INTERVAL", 0)
+class LocationTreeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="entry", role=Role.objects.create(name="data_entry"))
+        area = Area.objects.create(name="الرستن", governorate=Governorate.objects.create(name="حمص"))
+        cls.subarea = SubArea.objects.create(name="تلبيسة", area=area)
+        cls.village = Village.objects.create(name="الغنطو", subarea=cls.subarea, type=Village.VillageType.CITY)
+
+    def setUp(self):
+        # مفتاح الشجرة بالكاش هو رقم النسخة، وقد يعود نفس الرقم بعد تراجع معاملة اختبار آخر
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tree(self, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get("/api/locations/tree/", **headers)
+
+    def test_etag_and_not_modified(self):
+        response = self.tree()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"])
+        village = json.loads(response.content)["governorates"][0]["areas"][0]["subareas"][0]["villages"][0]
+        self.assertEqual(village["name"], "الغنطو")
+
+        cached = self.tree(response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], response["ETag"])
+        self.assertEqual(cached.content, b"")
+
+    def test_village_save_changes_etag(self):
+        etag = self.tree()["ETag"]
+        version = hierarchy_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.village.name = "الغنطو الجديدة"
+            self.village.save()
+        self.assertNotEqual(hierarchy_version(), version)
 
-# Create your tests here.
+        response = self.tree(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("الغنطو الجديدة", response.content.decode())
@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import LocationTreeView
+
+urlpatterns = [
+    path("tree/", LocationTreeView.as_view(), name="location_tree"),
+]
@@ -1,3 +1,82 @@
-from django.shortcuts import render
+import hashlib
+import json
 
-# Create your views here.
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+from accounts.models import Area, Governorate, SubArea, Village
+
+from .hierarchy import hierarchy_version
+
+TREE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def build_tree() -> list:
+    """
+    الشجرة كاملة بأربعة استعلامات مسطحة (استعلام لكل مستوى) بدل استعلام لكل عقدة.
+    """
+    governorates = {}
+    for governorate_id , name in Governorate.objects.order_by( "name" , "id" ).values_list( "id" , "name" ) :
+        governorates[governorate_id] = { "id" : governorate_id , "name" : name , "areas" : [] }
+
+    areas = {}
+    for area_id , name , governorate_id in Area.objects.order_by( "name" , "id" ).values_list( "id" , "name" , "governorate_id" ) :
+        areas[area_id] = { "id" : area_id , "name" : name , "subareas" : [] }
+        governorates[governorate_id]["areas"].append( areas[area_id] )
+
+    subareas = {}
+    for subarea_id , name , area_id in SubArea.objects.order_by( "name" , "id" ).values_list( "id" , "name" , "area_id" ) :
+        subareas[subarea_id] = { "id" : subarea_id , "name" : name , "villages" : [] }
+        areas[area_id]["subareas"].append( subareas[subarea_id] )
+
+    villages = Village.objects.order_by( "name" , "id" ).values_list( "id" , "name" , "type" , "parent_name" , "subarea_id" )
+    for village_id , name , village_type , parent_name , subarea_id in villages :
+        subareas[subarea_id]["villages"].append(
+            { "id" : village_id , "name" : name , "type" : village_type , "parent_name" : parent_name }
+        )
+
+    return list( governorates.values() )
+
+
+def tree_blob() :
+    """
+    (body, etag) للشجرة، محفوظة بالكاش بمفتاح نسخة التسلسل، فتُبنى مرة واحدة لكل تعديل على المواقع.
+    """
+    version = hierarchy_version()
+    key = f"locations:tree:{version}"
+    blob = cache.get( key )
+    if blob is None :
+        body = json.dumps(
+            { "version" : version , "governorates" : build_tree() } ,
+            ensure_ascii = False ,
+            separators = ( "," , ":" ) ,
+        ).encode( "utf-8" )
+        etag = '"%s"' % hashlib.sha256( body ).hexdigest()
+        blob = ( body , etag )
+        cache.set( key , blob , TREE_CACHE_TIMEOUT )
+    return blob
+
+
+class LocationTreeView( APIView ) :
+    """
+    شجرة المحافظات -> المناطق -> النواحي -> القرى لقوائم الاختيار.
+    تدعم If-None-Match: إذا لم تتغير الشجرة يرجع 304 بدون جسم.
+    """
+
+    permission_classes = [ permissions.IsAuthenticated ]
+
+    def get( self , request ) :
+        body , etag = tree_blob()
+
+        client_etags = parse_etags( request.headers.get( "If-None-Match" , "" ) )
+        if etag in client_etags or "*" in client_etags :
+            response = HttpResponseNotModified()
+        else :
+            response = HttpResponse( body , content_type = "application/json; charset=utf-8" )
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
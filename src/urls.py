@@ -16,8 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path , include 
+from accounts.views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('accounts.urls') ) ,
+    path('api/locations/', include('locations.urls') ) ,
+    path('api/data/', include('accounts.data_urls') ) ,
+    path('metrics', MetricsView.as_view() , name = "metrics" ) ,
 ]